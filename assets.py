@@ -0,0 +1,175 @@
+import io
+import os
+import re
+import random
+import asyncio
+import logging
+import discord
+import media
+from breakers import breakers, counts_as_outage
+from cache import TTLCache
+from concurrency import SingleFlight
+
+logger = logging.getLogger('prime_assets')
+
+# --- CONFIGURATION ---
+ASSET_CACHE_TTL = int(os.getenv("ASSET_CACHE_TTL", "1800"))
+ASSET_CACHE_SIZE = 64
+ASSET_MAX_BYTES = 8 * 1024 * 1024   # Discord's upload limit for unboosted servers
+POLLINATIONS_CONCURRENCY = int(os.getenv("POLLINATIONS_CONCURRENCY", "2"))
+POLLINATIONS_TIMEOUT = 30
+BROWSER_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+class Asset:
+    """
+    A generated or downloaded file for upload. Content lives in a SpooledDownload: in memory
+    while small, in a temp file past SPOOL_MEMORY_BYTES that is deleted once the asset is
+    garbage collected. One asset can be sent any number of times.
+    """
+    def __init__(self, spool, filename):
+        self.spool = spool
+        self.filename = filename
+
+    @classmethod
+    def from_bytes(cls, data, filename):
+        return cls(media.SpooledDownload.from_bytes(data), filename)
+
+    @classmethod
+    def from_text(cls, text, filename):
+        return cls.from_bytes(text.encode("utf-8"), filename)
+
+    def open(self):
+        """A fresh file object over the content."""
+        if self.spool.path is None:
+            return io.BytesIO(self.spool.read())
+        return open(self.spool.ensure_file(), "rb")
+
+    def file(self, filename=None):
+        return discord.File(self.open(), filename=filename or self.filename)
+
+    def __len__(self):
+        return len(self.spool)
+
+def text_file(text, filename):
+    """discord.File for a generated text report, without touching disk."""
+    return Asset.from_text(text, filename).file()
+
+class AssetStore:
+    """Generated and downloaded assets, cached by what was asked for. Pollinations calls are capped."""
+    def __init__(self):
+        self.cache = TTLCache(maxsize=ASSET_CACHE_SIZE, ttl=ASSET_CACHE_TTL)
+        self.flights = SingleFlight("assets")
+        self.pollinations = asyncio.Semaphore(POLLINATIONS_CONCURRENCY)
+
+    async def cached(self, key, factory):
+        asset = self.cache.get(key)
+        if asset is not None:
+            return asset
+        return await self.flights.do(key, lambda: self._fill(key, factory))
+
+    async def _fill(self, key, factory):
+        asset = await factory()
+        if asset is not None:
+            self.cache.set(key, asset)
+        return asset
+
+    async def download(self, url, filename, headers=None, min_bytes=1000, cache=True):
+        """Asset for a URL, or None if it failed, is too large or is suspiciously small.
+        Pass cache=False for URLs that return something different each time."""
+        async def fetch():
+            try:
+                spool = await media.download_media(url, ASSET_MAX_BYTES, headers=headers)
+            except Exception as e:
+                logger.warning(f"Asset download failed ({url}): {e}")
+                return None
+            if len(spool) <= min_bytes:
+                return None
+            return Asset(spool, filename)
+        if not cache:
+            return await fetch()
+        return await self.cached(("url", url), fetch)
+
+    async def generate_image(self, description):
+        """Pollinations image for a prompt; the same prompt within ASSET_CACHE_TTL is served from cache."""
+        return await self.cached(("generated", description), lambda: self._generate(description))
+
+    async def _generate(self, description):
+        url = f"https://image.pollinations.ai/prompt/{description}"
+        breaker = breakers.for_url(url, name="pollinations")
+        if not breaker.allow():
+            logger.warning("⚡ Image generation skipped: pollinations circuit open")
+            return None
+        async with self.pollinations:
+            try:
+                spool = await asyncio.wait_for(media.download_media(url, ASSET_MAX_BYTES), POLLINATIONS_TIMEOUT)
+            except Exception as e:
+                breaker.record(not counts_as_outage(e))
+                logger.error(f"Error generating image: {str(e)}")
+                return None
+        breaker.record(True)
+        return Asset(spool, "generated.png")
+
+    async def search_image(self, query, image_urls):
+        """One of image_urls (picked at random, so "Find More" varies), else Unsplash, else a placeholder."""
+        if image_urls:
+            asset = await self.download(random.choice(image_urls), "image.jpg")
+            if asset:
+                logger.info(f"✓ Downloaded image from Google for: {query}")
+                return asset
+
+        safe_query = query.replace(' ', '+')
+        asset = await self.download(f"https://source.unsplash.com/random/800x600?{safe_query}", "image.jpg", headers=BROWSER_HEADERS, cache=False)
+        if asset:
+            logger.info(f"✓ Downloaded image from Unsplash for: {query}")
+            return asset
+
+        try:
+            placeholder = await media.run_in_pool(render_placeholder, query, pool_name="cards")
+            logger.info(f"✓ Created placeholder for: {query}")
+            return Asset.from_bytes(placeholder, "image.jpg")
+        except Exception as e:
+            logger.warning(f"Placeholder creation failed: {str(e)}")
+        return None
+
+    async def find_sfx(self, query, page_urls):
+        """First MyInstants-style page in page_urls that links an mp3; cached by query."""
+        return await self.cached(("sfx", query), lambda: self._find_sfx(page_urls))
+
+    async def _find_sfx(self, page_urls):
+        session = media.session()
+        for page_url in page_urls:
+            try:
+                async with session.get(page_url, headers=BROWSER_HEADERS, timeout=10) as page_res:
+                    if page_res.status != 200:
+                        continue
+                    page_html = await page_res.text()
+            except Exception as e:
+                logger.warning(f"SFX page fetch failed ({page_url}): {e}")
+                continue
+            # Patterns common for mp3 links on myinstants
+            mp3_match = re.search(r'https?://[^\s<>"]+\.mp3', page_html)
+            if not mp3_match:
+                continue
+            download_url = mp3_match.group(0)
+            logger.info(f"Found SFX Download URL: {download_url}")
+            asset = await self.download(download_url, "sfx.mp3", headers=BROWSER_HEADERS)
+            if asset:
+                logger.info(f"✓ Downloaded SFX from {download_url}")
+                return asset
+        return None
+
+    def stats(self):
+        return {"cache": self.cache.stats(), "coalesced": self.flights.coalesced}
+
+def render_placeholder(query):
+    """A plain card with the query on it, for when no image source worked (runs in a worker)."""
+    from PIL import Image, ImageDraw
+    img = Image.new('RGB', (800, 600), color=(73, 109, 137))
+    ImageDraw.Draw(img).text((50, 250), f"Image: {query[:30]}", fill=(255, 255, 255))
+    out = io.BytesIO()
+    img.save(out, format="JPEG")
+    return out.getvalue()
+
+assets = AssetStore()
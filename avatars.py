@@ -0,0 +1,148 @@
+import io
+import os
+import asyncio
+import tempfile
+import logging
+import media
+from cache import TTLCache
+from concurrency import SingleFlight
+
+logger = logging.getLogger('prime_avatars')
+
+# --- CONFIGURATION ---
+AVATAR_MEMORY_SIZE = int(os.getenv("AVATAR_MEMORY_SIZE", "128"))    # Decoded, resized avatars kept in memory
+AVATAR_DISK_MAX_FILES = int(os.getenv("AVATAR_DISK_MAX_FILES", "2000"))
+AVATAR_CACHE_DIR = os.getenv("AVATAR_CACHE_DIR", os.path.join(tempfile.gettempdir(), "prime_avatars"))
+AVATAR_FETCH_SIZE = 256     # CDN size requested; Discord serves it pre-scaled
+AVATAR_MAX_BYTES = 4 * 1024 * 1024
+AVATAR_PRUNE_EVERY = 50     # Disk writes between prunes
+
+# --- DECODING (runs in worker processes) ---
+def decode_avatar(data, size):
+    """Raw avatar bytes -> size x size RGBA pixels, ready for Image.frombytes."""
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", (size, size))
+    img = img.convert("RGBA").resize((size, size), Image.Resampling.LANCZOS)
+    return img.tobytes()
+
+# --- DISK TIER ---
+def _read_file(path):
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)  # mtime doubles as last-used for pruning
+        return data
+    except OSError:
+        return None
+
+def _write_file(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def _prune_dir(directory, max_files):
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(".img")]
+    except OSError:
+        return 0
+    if len(entries) <= max_files:
+        return 0
+    entries.sort(key=lambda e: e.stat().st_mtime)
+    removed = 0
+    for entry in entries[:len(entries) - max_files]:
+        try:
+            os.unlink(entry.path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+class AvatarCache:
+    """
+    Avatars (and other Discord assets) keyed by their asset hash, which changes whenever the
+    image does. Memory holds decoded pixels at the sizes callers asked for; disk holds the raw
+    CDN bytes, so a restart or memory eviction costs a decode but not a round trip.
+    """
+    def __init__(self, directory=AVATAR_CACHE_DIR):
+        self.directory = directory
+        self.memory = TTLCache(maxsize=AVATAR_MEMORY_SIZE)
+        self.flights = SingleFlight("avatars")
+        self.disk_hits = 0
+        self.downloads = 0
+        self._writes = 0
+
+    def _path(self, key):
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+        return os.path.join(self.directory, f"{safe}.img")
+
+    @staticmethod
+    def asset_key(asset):
+        """Cache key for a discord Asset: its content hash, falling back to the URL path."""
+        return getattr(asset, "key", None) or asset.url.split("?")[0]
+
+    async def pixels(self, asset, size):
+        """size x size RGBA bytes for a Discord asset, or None if it can't be fetched."""
+        key = f"{self.asset_key(asset)}:{size}"
+        cached = self.memory.get(key)
+        if cached is not None:
+            return cached
+        return await self.flights.do(key, lambda: self._pixels(key, asset, size))
+
+    async def _pixels(self, key, asset, size):
+        raw = await self.raw(asset)
+        if not raw:
+            return None
+        try:
+            pixels = await media.run_in_pool(decode_avatar, raw, size, pool_name="cards")
+        except Exception as e:
+            logger.error(f"Error decoding avatar: {e}")
+            return None
+        self.memory.set(key, pixels)
+        return pixels
+
+    async def raw(self, asset):
+        """Original bytes for a Discord asset: disk tier first, then one coalesced CDN fetch."""
+        key = self.asset_key(asset)
+        return await self.flights.do(f"raw:{key}", lambda: self._raw(key, asset))
+
+    async def _raw(self, key, asset):
+        path = self._path(key)
+        data = await asyncio.to_thread(_read_file, path)
+        if data:
+            self.disk_hits += 1
+            return data
+
+        url = asset.url
+        try:
+            url = asset.with_static_format("png").with_size(AVATAR_FETCH_SIZE).url
+        except Exception:
+            pass  # Not a resizable asset; take it as is
+        try:
+            spool = await media.download_media(url, AVATAR_MAX_BYTES)
+            data = spool.read()
+        except Exception as e:
+            logger.warning(f"⚠️ Avatar fetch failed: {e}")
+            return None
+        self.downloads += 1
+
+        try:
+            await asyncio.to_thread(_write_file, path, data)
+            self._writes += 1
+            if self._writes % AVATAR_PRUNE_EVERY == 0:
+                await asyncio.to_thread(_prune_dir, self.directory, AVATAR_DISK_MAX_FILES)
+        except OSError as e:
+            logger.warning(f"⚠️ Avatar disk cache write failed: {e}")
+        return data
+
+    def stats(self):
+        return {
+            "memory": self.memory.stats(),
+            "disk_hits": self.disk_hits,
+            "downloads": self.downloads,
+            "coalesced": self.flights.coalesced,
+        }
+
+avatars = AvatarCache()
@@ -0,0 +1,273 @@
+"""
+Keyword trigger benchmark.
+
+Times the bot's compiled keyword engine against the trigger checks it replaced and checks
+that both reach the same handler decisions on every message. The old side is a frozen copy
+of the keyword lists and conditions from bot.py before the engine, so a list or rule that
+drifted while moving into the engine shows up as a mismatch.
+
+    python bench_keywords.py                                   # bench_corpus.txt
+    python bench_keywords.py --corpus messages.txt --rounds 200
+    python bench_keywords.py --fuzz 20000                      # plus generated messages, agreement only
+
+The corpus uses loadgen.py's format; its @bot/@user/[img]/[vid]/>reply prefixes are stripped.
+bench_corpus.txt is a hand-written sample of the kinds of messages the server sees (chat,
+asset and help requests, feedback posts, commands, links); a corpus exported from a real
+channel gives more representative numbers. --fuzz strings old keywords together with
+separators and partial words to probe the word-boundary and overlapping-term cases.
+"""
+import os
+import re
+import sys
+import time
+import random
+import logging
+import argparse
+
+from loadgen import prepare_environment
+
+DEFAULT_CORPUS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_corpus.txt")
+
+PREFIX = re.compile(r"^(?:@bot |@user |\[img\] |\[vid\] |>reply )+")
+
+# --- PRE-ENGINE TRIGGER CHECKS (frozen copy of bot.py before the keyword engine) ---
+RUDE_KEYWORDS = {
+    'stupid', 'dumb', 'idiot', 'trash', 'garbage', 'sucks', 'useless', 'worthless',
+    'shit bot', 'bad bot', 'fuck you', 'fuck off', 'screw you', 'go die', 'kys',
+    'annoying', 'pathetic', 'terrible', 'hate you', 'hate this', 'piss off',
+    "get lost", "gtfo", "you suck", "you're useless", "you're trash", "you're garbage"
+}
+EDITING_KEYWORDS = [
+    'after effects', 'ae', 'premiere', 'pr', 'photoshop', 'ps', 'davinci', 'resolve',
+    'final cut', 'fcp', 'media encoder', 'topaz', 'capcut', 'edit', 'editing',
+    'render', 'export', 'codec', 'h264', 'h265', 'hevc', 'prores', 'dnxhd',
+    'color', 'grade', 'grading', 'correction', 'lut', 'effect', 'transition',
+    'keyframe', 'animation', 'motion', 'graphics', 'vfx', 'composite', 'mask',
+    'layer', 'timeline', 'sequence', 'clip', 'footage', 'video', 'audio',
+    'plugin', 'preset', 'ffx', 'mogrt', 'template', 'project', 'crash',
+    'error', 'glitch', 'lag', 'slow', 'freeze', 'gpu', 'cuda', 'opencl',
+    'ram', 'preview', 'playback', 'frame', 'fps', 'resolution', '4k', '1080',
+    'aspect', 'ratio', 'crop', 'scale', 'transform', 'opacity', 'blend',
+    'tracking', 'stabilize', 'warp', 'distort', 'blur', 'sharpen', 'denoise',
+    'upscale', 'interpolate', 'slow motion', 'speed', 'ramp', 'proxy',
+    'scratch disk', 'cache', 'dynamic link', 'expression', 'script',
+    'jpg', 'png', 'tiff', 'psd', 'mp4', 'mov', 'avi', 'mkv', 'webm'
+]
+POLITICAL_KEYWORDS = {
+    'politics', 'election', 'trump', 'biden', 'government', 'senate', 'democrat', 'republican',
+    'liberal', 'conservative', 'voting', 'ballot', 'policy', 'legislation', 'protest', 'activism',
+    'israel', 'palestine', 'ukraine', 'russia', 'war', 'abortion', 'healthcare', 'taxes',
+    'communist', 'socialist', 'capitalist', 'dictator', 'parliament', 'congress'
+}
+
+def legacy_decisions(content):
+    """Every keyword decision the handlers made for one message, the way they used to make it."""
+    prompt_lower = content.lower()
+    d = {}
+
+    d['editing'] = any(keyword in prompt_lower for keyword in EDITING_KEYWORDS)
+    d['rude'] = False
+    for keyword in RUDE_KEYWORDS:
+        if keyword in prompt_lower:
+            d['rude'] = True
+            break
+    d['political'] = any(re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower) for kw in POLITICAL_KEYWORDS)
+
+    feedback_triggers = ['thoughts?', 'feedback?', 'wip', 'rate this', 'how does this look', 'opinions?', 'be honest', 'give me tips', 'rate?', 'thoughts']
+    d['feedback'] = any(trigger in prompt_lower for trigger in feedback_triggers)
+
+    resource_triggers = ['where to get', 'where can i get', 'where can i find', 'where to find', 'looking for', 'any good', 'is there a', 'need some', 'anyone got', 'get me', 'send me', 'find me', 'i need', 'i want', 'can someone send', 'anyone have', 'send over', 'gimme', 'is there a', 'looking for a', 'any', 'suggest', 'provide', 'send', 'get', 'need', 'give', 'link', 'sound']
+    resource_keywords = ['sfx', 'overlay', 'preset', 'font', 'texture', 'lut', 'vfx', 'pack', 'cc', 'brush', 'plugin', 'shake', 'quality', 'png', 'jpg', 'jpeg', 'image', 'img', 'asset', 'stock', 'clip', 'video', 'background', 'cloud', 'smoke', 'fire', 'flare', 'dust', 'grain', 'particles', 'light', 'leak', 'sound effect', 'overlay', 'background', 'gfx', 'liquid', 'glitch', 'paper', 'dust', 'mp3', 'mp4', 'mkv', 'wav']
+    d['resource_trigger'] = any(trigger in prompt_lower for trigger in resource_triggers)
+    d['resource'] = any(kw in prompt_lower for kw in resource_keywords)
+
+    software_roles = {
+        'after effects': 'AE_ROLE_ID',
+        'ae': 'AE_ROLE_ID',
+        'premiere': 'PR_ROLE_ID',
+        'photoshop': 'PS_ROLE_ID',
+        'resolve': 'OTHER_EDIT_ROLE_ID',
+        'capcut': 'CAPCUT_ROLE_ID',
+        'alight motion': 'AM_ROLE_ID',
+        'am': 'AM_ROLE_ID'
+    }
+    d['software_roles'] = [kw for kw, role_id in software_roles.items() if re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower)]
+
+    motivation_triggers = [
+        'stuck', 'burnout', 'hate my edit', 'giving up', 'cant do this',
+        'impossible', 'ugly edit', 'not good at this', 'no motivation',
+        'frustrated', 'want to quit', 'tired of this'
+    ]
+    d['motivation'] = any(trigger in prompt_lower for trigger in motivation_triggers)
+
+    council_triggers = ['council', 'review', 'deep audit', 'analyze deeply', 'expert opinion', 'shadow council']
+    is_project_req = any(kw in prompt_lower for kw in ['project', 'app', 'website', 'repository', 'system', 'build', 'architect']) and any(w in prompt_lower for w in ['make', 'generate', 'build', 'want', 'need', 'insane'])
+    d['council'] = any(kw in prompt_lower for kw in council_triggers) or (is_project_req and 'insane' in prompt_lower)
+
+    architect_keywords = ['project', 'app', 'website', 'repository', 'zip', 'framework', 'system', 'site']
+    architect_verbs = ['build', 'architect', 'generate', 'make', 'want', 'need', 'setup', 'create']
+    d['architect'] = any(v in prompt_lower for v in architect_verbs) and any(kw in prompt_lower for kw in architect_keywords)
+
+    # The attachment half of this check is the same on both sides, so only the text half is compared
+    vision_triggers = ['look', 'see', 'what', 'analyze', 'fix', 'check', 'read', 'solve', 'price', 'identify', 'where', 'tell me', 'who']
+    d['vision'] = any(kw in prompt_lower for kw in vision_triggers) or 'prime eye' in prompt_lower
+
+    search_words = ['gimme', 'give me', 'send me', 'get me', 'find me', 'show me', 'find', 'search', 'get', 'show', 'view', 'who is', 'what is', 'link']
+    image_keywords = ['png', 'jpg', 'jpeg', 'image', 'img', 'picture', 'photo', 'gif', 'webp']
+    has_search_word = any(w in prompt_lower for w in search_words)
+    d['search'] = has_search_word
+    d['image'] = any(w in prompt_lower for w in image_keywords)
+
+    pfp_keywords = ['pfp', 'avatar', 'profile picture', 'profile pic']
+    stat_keywords = ['stats', 'info', 'profile', 'bio', 'about me', 'discord acc', 'prof', 'account']
+    is_pfp_req = any(kw in prompt_lower for kw in pfp_keywords)
+    is_stat_req = any(kw in prompt_lower for kw in stat_keywords)
+    d['pfp'], d['stat'] = is_pfp_req, is_stat_req
+    d['identity'] = (is_pfp_req or is_stat_req) and any(verb in prompt_lower for verb in ['show', 'get', 'give', 'send', 'view', 'what is', 'who is', 'shoe', 'find', 'check', 'look', 'display', 'sent', 'look up'])
+
+    ae_expr_keywords = ['expression', 'ae code', 'after effects code', 'wiggle', 'bounce', 'loopout', 'posterize', 'smooth', 'velocity code', 'shake expression', 'script code']
+    d['ae_expr'] = any(kw in prompt_lower for kw in ae_expr_keywords) and ('how to' in prompt_lower or 'give' in prompt_lower or 'get' in prompt_lower or 'show' in prompt_lower or 'code' in prompt_lower or 'expression' in prompt_lower or 'script' in prompt_lower)
+
+    decision_keywords = ['decide', 'choose', 'choice', 'better', 'comparison', 'compare', 'which one', 'should i', 'buy', 'get']
+    d['decision'] = any(kw in prompt_lower for kw in decision_keywords) and ('help' in prompt_lower or 'me' in prompt_lower or 'decide' in prompt_lower or 'compare' in prompt_lower)
+
+    intel_triggers = ['leak', 'insider info', 'whispers', 'intel', 'scout info', 'research leak']
+    d['intel'] = any(kw in prompt_lower for kw in intel_triggers) and not content.startswith('!')
+
+    video_keywords = ['video', 'song', 'music', 'track', 'phonk', 'beat', 'clip', 'youtube', 'yt', 'ep', 'episode', 'series', 'part', 'movie']
+    d['video'] = (has_search_word or any(k in prompt_lower for k in ['ep', 'episode', 'part'])) and any(kw in prompt_lower for kw in video_keywords)
+
+    yt_stat_keywords = ['stats', 'analytics', 'subs', 'subscribers', 'views', 'subscriber', 'chanel', 'channel info']
+    d['yt_stat'] = any(kw in prompt_lower for kw in yt_stat_keywords) and ('yt' in prompt_lower or 'youtube' in prompt_lower or 'channel' in prompt_lower or 'chanel' in prompt_lower)
+
+    help_words = ['help', 'tutorial', 'how to', 'teach', 'guide', 'learn', 'explain', 'show me', 'assist', 'how do i', 'how can i', 'how do you', 'create', 'make', 'how do', 'show me']
+    is_help = any(re.search(r'\b' + re.escape(word) + r'\b', prompt_lower) for word in help_words)
+    editing_kws = ['edit', 'effect', 'render', 'color', 'grade', 'video', 'after effects', 'ae', 'premiere', 'pr', 'photoshop', 'ps', 'resolve', 'davinci', 'capcut', 'topaz', 'cc', 'grading', 'correction', 'effects', 'transition', 'animation', 'vfx', 'motion', 'mask', 'keyframe']
+    d['help'] = is_help
+    d['editing_help'] = is_help and any(re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower) for kw in editing_kws)
+
+    softwares = {
+        'after effects': 'After Effects', 'ae': 'After Effects', 'afterffeffects': 'After Effects',
+        'premiere': 'Premiere Pro', 'pr': 'Premiere Pro',
+        'photoshop': 'Photoshop', 'ps': 'Photoshop',
+        'resolve': 'DaVinci Resolve', 'davinci': 'DaVinci Resolve',
+        'capcut': 'CapCut', 'topaz': 'Topaz',
+        'final cut': 'Final Cut Pro', 'fcp': 'Final Cut Pro',
+        'alight motion': 'Alight Motion', 'am': 'Alight Motion'
+    }
+    mentioned_software = None
+    for kw, name in softwares.items():
+        if re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower):
+            mentioned_software = name
+            break
+    d['software'] = mentioned_software
+    return d
+
+# --- ENGINE SIDE (the same decisions, written the way the handlers in bot.py make them now) ---
+def engine_decisions(botmod, content, scan):
+    prompt_lower = content.lower()
+    hits = scan(prompt_lower)
+    d = {}
+
+    d['editing'] = 'editing' in hits
+    d['rude'] = 'rude' in hits
+    d['political'] = 'political' in hits
+    d['feedback'] = 'feedback' in hits
+    d['resource_trigger'] = 'resource_trigger' in hits
+    d['resource'] = 'resource' in hits
+
+    mentioned = hits.get('software_role', ())
+    d['software_roles'] = [kw for kw in botmod.SOFTWARE_ROLES if kw in mentioned]
+
+    d['motivation'] = 'motivation' in hits
+    is_project_req = 'project_noun' in hits and 'project_verb' in hits
+    d['council'] = 'council' in hits or (is_project_req and 'insane' in prompt_lower)
+    d['architect'] = 'architect_verb' in hits and 'architect' in hits
+    d['vision'] = 'vision' in hits
+
+    has_search_word = 'search' in hits
+    d['search'] = has_search_word
+    d['image'] = 'image' in hits
+    d['pfp'], d['stat'] = 'pfp' in hits, 'stat' in hits
+    d['identity'] = (d['pfp'] or d['stat']) and 'identity_verb' in hits
+    d['ae_expr'] = 'ae_expr' in hits and ('how to' in prompt_lower or 'give' in prompt_lower or 'get' in prompt_lower or 'show' in prompt_lower or 'code' in prompt_lower or 'expression' in prompt_lower or 'script' in prompt_lower)
+    d['decision'] = 'decision' in hits and ('help' in prompt_lower or 'me' in prompt_lower or 'decide' in prompt_lower or 'compare' in prompt_lower)
+    d['intel'] = 'intel' in hits and not content.startswith('!')
+    d['video'] = (has_search_word or 'episode' in hits) and 'video' in hits
+    d['yt_stat'] = 'yt_stat' in hits and ('yt' in prompt_lower or 'youtube' in prompt_lower or 'channel' in prompt_lower or 'chanel' in prompt_lower)
+
+    is_help = 'help' in hits
+    d['help'] = is_help
+    d['editing_help'] = is_help and 'editing_help' in hits
+    mentioned = hits.get('software', ())
+    d['software'] = next((name for kw, name in botmod.SOFTWARE_NAMES.items() if kw in mentioned), None)
+    return d
+
+def fuzz_messages(count, seed=1):
+    """Messages built from the old keywords, glued with spaces, punctuation and word fragments."""
+    src = open(__file__, encoding="utf-8").read()
+    legacy_src = src[src.index("# --- PRE-ENGINE"):src.index("# --- ENGINE SIDE")]
+    terms = sorted(set(re.findall(r"'([^'\n]{1,40})'", legacy_src)) | RUDE_KEYWORDS)
+    pieces = terms + ["x", "_", "1", "-", "'", "?", "!", "é", "aa", "ing", "s", "!cmd"]
+    rnd = random.Random(seed)
+    return [
+        "".join(rnd.choice(pieces) + rnd.choice(["", " ", " ", "-", "s", ". "]) for _ in range(rnd.randint(0, 8)))
+        for _ in range(count)
+    ]
+
+def time_per_message(func, texts, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for text in texts:
+            func(text)
+    return (time.perf_counter() - started) / (rounds * len(texts)) * 1e6
+
+def compare(botmod, texts, show=5):
+    mismatches = 0
+    for text in texts:
+        expected = legacy_decisions(text)
+        got = engine_decisions(botmod, text, botmod.triggers.match)
+        if got != expected:
+            mismatches += 1
+            if mismatches <= show:
+                diff = {k: (expected[k], got[k]) for k in expected if expected[k] != got[k]}
+                print(f"  ✗ {text!r}\n      (legacy, engine): {diff}")
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword engine vs the per-list trigger checks it replaced.")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS_FILE, help="text file, one message per line")
+    parser.add_argument("--rounds", type=int, default=100, help="passes over the corpus per timing")
+    parser.add_argument("--fuzz", type=int, default=0, help="also check agreement on this many generated messages")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    prepare_environment(argparse.Namespace(standin=None))
+    import bot as botmod
+    engine = botmod.triggers
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = [line.rstrip("\n") for line in f if line.strip()]
+    texts = [PREFIX.sub("", line) for line in corpus]
+
+    mismatches = compare(botmod, texts)
+    fuzz_mismatches = compare(botmod, fuzz_messages(args.fuzz)) if args.fuzz else 0
+
+    terms = sum(len(t) for t, _ in engine.categories.values())
+    legacy_us = time_per_message(legacy_decisions, texts, args.rounds)
+    engine_us = time_per_message(lambda t: engine_decisions(botmod, t, engine.match), texts, args.rounds)
+    cached_us = time_per_message(lambda t: engine_decisions(botmod, t, engine.scan), texts, args.rounds)
+
+    print(f"📊 {os.path.basename(args.corpus)}: {len(texts)} messages x {args.rounds} rounds, {len(engine.categories)} categories, {terms} terms")
+    print(f"  per-list checks : {legacy_us:8.1f} µs/message")
+    print(f"  keyword engine  : {engine_us:8.1f} µs/message  ({legacy_us / engine_us:.1f}x)")
+    print(f"  engine (cached) : {cached_us:8.1f} µs/message  (scan already done by an earlier stage)")
+    print(f"  agreement       : {len(texts) - mismatches}/{len(texts)} messages")
+    if args.fuzz:
+        print(f"  fuzz agreement  : {args.fuzz - fuzz_mismatches}/{args.fuzz} generated messages")
+    return 1 if mismatches or fuzz_mismatches else 0
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    sys.exit(main())
@@ -10,25 +10,31 @@ from discord.ext import commands, tasks
 from discord import app_commands
 from config import load_config
 import glob
-from google import genai
 from google.genai import types
 from database import db_manager
 import aiohttp
 import io
-from PIL import Image, ImageDraw, ImageFont
 import random
-import string
-import tempfile
 import brain
+from brain import safe_generate_content
+from concurrency import FairQueue, LaneFull
+from breakers import breakers
+import metrics
+import media
+from perceptual import near_dupes
+from prescreen import prescreen
+from cards import cards
+from captcha import captcha_pool
+from assets import assets, text_file
+from pipeline import MessagePipeline
+from keywords import KeywordEngine
 
 from datetime import datetime, timedelta, timezone
 import asyncio
 import re
 import requests
 from typing import Dict, List, Set, Tuple, Optional
-import hashlib
 import json
-import yt_dlp
 import zipfile
 
 # Set up logger with console output
@@ -86,7 +92,6 @@ def find_keys():
     return list(dict.fromkeys(found))
 
 GEMINI_KEYS = find_keys()
-current_key_index = 0
 
 if GEMINI_KEYS:
     logger.info(f"✅ SYSTEM: Detected {len(GEMINI_KEYS)} Gemini API Key(s).")
@@ -106,22 +111,12 @@ OTHER_EDIT_EMOJI_ID = get_env_int("OTHER_EDIT_EMOJI_ID", 0)
 YOUTUBER_EMOJI_ID = get_env_int("YOUTUBER_EMOJI_ID", 0)
 LEGENDARY_EMOJI_ID = get_env_int("LEGENDARY_EMOJI_ID", 0)
 
-if not GEMINI_KEYS:
-    gemini_client = None
-else:
-    gemini_client = genai.Client(api_key=GEMINI_KEYS[current_key_index], http_options={'api_version': 'v1beta'})
-
-def rotate_gemini_key():
-    """Rotate to the next available API key."""
-    global current_key_index, gemini_client
-    if len(GEMINI_KEYS) <= 1: return False
-    current_key_index = (current_key_index + 1) % len(GEMINI_KEYS)
-    gemini_client = genai.Client(api_key=GEMINI_KEYS[current_key_index], http_options={'api_version': 'v1beta'})
-    return True
+# Gemini clients and key rotation live in brain.py (one client, one breaker, one base URL)
 
 
 # State tracking
 user_states = {}
+user_levels = db_manager.get_levels()
 user_warnings = db_manager.get_warnings()
 yt_cooldowns = db_manager.get_yt_cooldowns()
 active_captchas = db_manager.get_active_captchas()
@@ -209,96 +204,8 @@ def save_portfolios(portfolios_data):
         db_manager.save_portfolio(uid, data)
 
 async def generate_portfolio_card(member, level_data, work_link=None):
-    """Generate an ultra-premium, modern portfolio image card."""
-    width, height = 900, 500
-    # Base dark background
-    bg = Image.new('RGB', (width, height), (10, 10, 12))
-    draw = ImageDraw.Draw(bg, 'RGBA')
-    
-    # 1. Background "Mesh" Glows (Premium effect)
-    def draw_glow(center, radius, color):
-        for r in range(radius, 0, -5):
-            alpha = int(80 * (1 - (r / radius))**2)
-            draw.ellipse([center[0]-r, center[1]-r, center[0]+r, center[1]+r], 
-                         fill=(color[0], color[1], color[2], alpha))
-
-    draw_glow((100, 100), 300, (50, 0, 150)) # Purple glow top left
-    draw_glow((width-100, height-100), 300, (0, 80, 150)) # Blue glow bottom right
-    draw_glow((width//2, height//2), 400, (20, 20, 30)) # Center deep glow
-
-    # 2. Main Glassmorphism Panel
-    # Draw a rounded rectangle with semi-transparent white
-    panel_padding = 40
-    panel_shape = [panel_padding, panel_padding, width - panel_padding, height - panel_padding]
-    draw.rounded_rectangle(panel_shape, radius=30, fill=(255, 255, 255, 5), outline=(255, 255, 255, 20), width=2)
-    
-    # Add a "gloss" streak
-    draw.polygon([(panel_padding, panel_padding), (400, panel_padding), (100, height-panel_padding), (panel_padding, height-panel_padding)], 
-                 fill=(255, 255, 255, 5))
-
-    # 3. Avatar Processing
-    avatar_url = member.display_avatar.url
-    async with aiohttp.ClientSession() as session:
-        async with session.get(avatar_url) as resp:
-            if resp.status == 200:
-                avatar_bytes = await resp.read()
-                avatar_img = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA")
-                avatar_size = 220
-                avatar_img = avatar_img.resize((avatar_size, avatar_size), Image.Resampling.LANCZOS)
-                
-                # Circular mask
-                mask = Image.new('L', (avatar_size, avatar_size), 0)
-                mask_draw = ImageDraw.Draw(mask)
-                mask_draw.ellipse((0, 0, avatar_size, avatar_size), fill=255)
-                
-                avatar_pos = (80, 120)
-                bg.paste(avatar_img, avatar_pos, mask)
-                
-                # Glowing outer rings
-                for i in range(1, 6):
-                    alpha = int(200 / i)
-                    draw.ellipse([avatar_pos[0]-i*2, avatar_pos[1]-i*2, avatar_pos[0]+avatar_size+i*2, avatar_pos[1]+avatar_size+i*2], 
-                                 outline=(0, 255, 200, alpha), width=2)
-
-    # 4. Typography (Using semi-bold system fonts)
-    try:
-        font_name = ImageFont.truetype("arialbd.ttf", 60) # Bold
-        font_stat_val = ImageFont.truetype("arialbd.ttf", 45)
-        font_stat_lbl = ImageFont.truetype("arial.ttf", 25)
-        font_link = ImageFont.truetype("arial.ttf", 30)
-    except:
-        font_name = font_stat_val = font_stat_lbl = font_link = ImageFont.load_default()
-
-    # Name and Premium Badge
-    draw.text((340, 120), member.display_name.upper(), font=font_name, fill=(255, 255, 255, 255))
-    draw.rectangle([340, 195, 480, 225], fill=(0, 255, 180, 40), outline=(0, 255, 180, 150))
-    draw.text((355, 198), "VERIFIED EDITOR", font=font_stat_lbl, fill=(0, 255, 180, 255))
-
-    # Stats Section (Grid Layout)
-    # Level
-    draw.text((340, 260), "LEVEL", font=font_stat_lbl, fill=(180, 180, 200, 255))
-    draw.text((340, 290), f"{level_data.get('level', 0)}", font=font_stat_val, fill=(255, 255, 255, 255))
-    
-    # XP
-    draw.text((500, 260), "TOTAL XP", font=font_stat_lbl, fill=(180, 180, 200, 255))
-    draw.text((500, 290), f"{level_data.get('xp', 0)}", font=font_stat_val, fill=(255, 255, 255, 255))
-
-    # Portfolio Link (Lower Glass Box)
-    link_y = 380
-    if work_link:
-        draw.rounded_rectangle([340, link_y, 820, link_y + 60], radius=15, fill=(0, 150, 255, 30), outline=(0, 150, 255, 100))
-        # Draw small link icon (simple shape)
-        draw.text((360, link_y + 15), "🔗", font=font_link, fill=(255, 255, 255, 255))
-        display_link = work_link if len(work_link) < 40 else work_link[:37] + "..."
-        draw.text((400, link_y + 15), display_link, font=font_link, fill=(200, 230, 255, 255))
-    else:
-        draw.text((340, link_y + 15), "NO PORTFOLIO LINK SET", font=font_link, fill=(100, 100, 120, 255))
-
-    # 5. Save to bytes
-    img_byte_arr = io.BytesIO()
-    bg.save(img_byte_arr, format='PNG')
-    img_byte_arr.seek(0)
-    return img_byte_arr
+    """Generate an ultra-premium, modern portfolio image card (rendered off the event loop, see cards.py)."""
+    return io.BytesIO(await cards.portfolio(member, level_data, work_link))
 
 def get_guild_role(guild, role_id, role_name=None):
     """Helper to get a role by ID or Name (case-insensitive)."""
@@ -332,14 +239,15 @@ async def check_account_maturity():
 @tasks.loop(hours=6)
 async def revive_chat():
     """Loop through all guilds and send a revival message if quiet."""
-    for guild in bot.guilds:
+    # Prompt Gemini for a highly specialized "humanish" message
+    prompt = "It's quiet in the chat. Send a one-sentence, chill, human-like message to start a conversation. No robot talk."
+
+    async def revive_guild(guild):
         c_id = get_general_chan(guild.id)
         channel = guild.get_channel(c_id)
-        if not channel: continue
+        if not channel: return
 
         try:
-            # Prompt Gemini for a highly specialized "humanish" message
-            prompt = "It's quiet in the chat. Send a one-sentence, chill, human-like message to start a conversation. No robot talk."
             response = await brain.get_gemini_response(prompt, user_id=0, username="System", model=FALLBACK_MODEL, guild_id=guild.id)
             
             if response:
@@ -349,22 +257,28 @@ async def revive_chat():
         except Exception as e:
             logger.error(f"Error in revive_chat for {guild.name}: {e}")
 
+    # Fired together so guilds sharing the same prompt coalesce into one model call
+    await asyncio.gather(*(revive_guild(guild) for guild in bot.guilds))
+
 @tasks.loop(hours=24)
 async def daily_insight():
     """Send a creative tip to all guilds every 24 hours."""
-    for guild in bot.guilds:
+    prompt = "Provide one high-level creative tip or industry secret. Chill, direct tone. Short."
+
+    async def insight_for_guild(guild):
         c_id = get_general_chan(guild.id)
         channel = guild.get_channel(c_id)
-        if not channel: continue
+        if not channel: return
 
         try:
-            prompt = "Provide one high-level creative tip or industry secret. Chill, direct tone. Short."
             response = await brain.get_gemini_response(prompt, user_id=0, username="System", model=FALLBACK_MODEL, guild_id=guild.id)
             if response:
                 await channel.send(f"💡 **Today's Insight**\n\n{response}")
         except Exception as e:
             logger.error(f"Error in daily_insight for {guild.name}: {e}")
 
+    await asyncio.gather(*(insight_for_guild(guild) for guild in bot.guilds))
+
 # Track who added the bot to each server (guild_id -> user_id)
 guild_inviters = db_manager.get_guild_inviters()
 
@@ -396,9 +310,6 @@ def save_guild_inviters(inviters):
     for gid, uid in inviters.items():
         db_manager.save_guild_inviter(gid, uid)
 
-# Media spam tracking (hash: {"count": n, "last_seen": time, "users": set()})
-image_hash_tracker = {}
-
 async def log_activity(title, description, color=0x5865F2, fields=None, guild=None):
     """Send activity log to the designated Discord channel (per-guild or global)."""
     target_id = None
@@ -427,29 +338,32 @@ async def log_activity(title, description, color=0x5865F2, fields=None, guild=No
     except Exception as e:
         logger.error(f"Failed to send activity log: {e}")
 
+_app_owner_id = None
+
 async def is_server_admin(user, guild):
     """Check if user is the bot owner, guild owner, or has administrator permissions."""
+    global _app_owner_id
     if not guild: return False
     
-    # 1. Global Bot Owner
-    try:
-        app = await bot.application_info()
-        if user.id == app.owner.id: return True
-    except: pass
-    
-    # 2. Guild Owner
-    if guild.owner and user.id == guild.owner.id: return True
+    # 1. Guild Owner
+    if guild.owner_id and user.id == guild.owner_id: return True
 
-    # 3. Dedicated Guild Admin (Who invited the bot)
+    # 2. Dedicated Guild Admin (Who invited the bot)
     guild_id_str = str(guild.id)
     if guild_id_str in guild_inviters and guild_inviters[guild_id_str] == user.id:
         return True
 
-    # 4. Administrator Permission
+    # 3. Administrator Permission
     if hasattr(user, 'guild_permissions') and user.guild_permissions.administrator:
         return True
-        
-    return False
+
+    # 4. Global Bot Owner (looked up once; this runs on every moderated message)
+    if _app_owner_id is None:
+        try:
+            app = await bot.application_info()
+            _app_owner_id = app.owner.id
+        except: pass
+    return user.id == _app_owner_id
 
 def get_server_admin_name(guild):
     """Get the name of who can use admin commands in this server."""
@@ -581,16 +495,11 @@ EDITING_KEYWORDS = [
 
 def is_editing_related(text):
     """Check if the message is related to editing."""
-    text_lower = text.lower()
-    return any(keyword in text_lower for keyword in EDITING_KEYWORDS)
+    return 'editing' in triggers.scan(text.lower())
 
 def detect_rudeness(text):
     """Detect if someone is being rude to the bot."""
-    text_lower = text.lower()
-    for keyword in RUDE_KEYWORDS:
-        if keyword in text_lower:
-            return True
-    return False
+    return 'rude' in triggers.scan(text.lower())
 
 def get_rude_system_prompt():
     """System prompt for when someone is rude to the bot."""
@@ -674,64 +583,12 @@ Ask them: "Which software or workflow would you like help with? (After Effects,
 Wait for their answer."""
 
 async def download_image(url):
-    """Download image from URL and return bytes for Gemini Vision."""
+    """Download image from URL and return normalized JPEG bytes for Gemini Vision (shared with moderation)."""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    image_data = await response.read()
-                    # Open with PIL to validate and get format, then convert to bytes
-                    img = Image.open(io.BytesIO(image_data))
-                    # Convert to RGB if necessary (for RGBA images)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        img = img.convert('RGB')
-                    # Save to bytes buffer as JPEG
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='JPEG', quality=85)
-                    buffer.seek(0)
-                    data = buffer.getvalue()
-                    buffer.close()
-                    return data
-    except Exception as e:
-        logger.error(f"Error downloading image: {str(e)}")
-    return None
-
-def generate_captcha(length=6):
-    """Generate a random captcha code and return its visual representation as bytes."""
-    code = ''.join(random.choices(string.ascii_uppercase + string.digits, k=length))
-    
-    # Create image
-    width, height = 240, 90
-    image = Image.new('RGB', (width, height), color=(240, 240, 240))
-    draw = ImageDraw.Draw(image)
-    
-    # Add noise points
-    for _ in range(250):
-        draw.point((random.randint(0, width), random.randint(0, height)), 
-                   fill=(random.randint(50, 200), random.randint(50, 200), random.randint(50, 200)))
-    
-    # Draw noise lines
-    for _ in range(8):
-        draw.line((random.randint(0, width), random.randint(0, height), 
-                   random.randint(0, width), random.randint(0, height)), 
-                  fill=(random.randint(100, 220), random.randint(100, 220), random.randint(100, 220)), width=2)
-
-    # Use default font
-    try: font = ImageFont.load_default(size=40)
-    except: font = ImageFont.load_default()
-
-    # Draw characters
-    for i, char in enumerate(code):
-        char_pos = (20 + i*35, 20 + random.randint(-10, 10))
-        draw.text(char_pos, char, fill=(random.randint(0, 80), random.randint(0, 80), random.randint(0, 80)), font=font)
-
-    # Save to bytes
-    buf = io.BytesIO()
-    image.save(buf, format='PNG')
-    buf.seek(0)
-    img_data = buf.getvalue()
-    buf.close()
-    return code, img_data
+        return await media.images.download(url)
+    except media.DownloadBlocked:
+        logger.info(f"🚫 Skipped known-bad image: {url}")
+        return None
 
 def detect_spam(message_content):
     """Detect if message is spam with balanced sensitivity."""
@@ -893,13 +750,95 @@ POLITICAL_KEYWORDS = {
     'communist', 'socialist', 'capitalist', 'dictator', 'parliament', 'congress'
 }
 
+# --- TRIGGER KEYWORDS ---
+FEEDBACK_TRIGGERS = ['thoughts?', 'feedback?', 'wip', 'rate this', 'how does this look', 'opinions?', 'be honest', 'give me tips', 'rate?', 'thoughts']
+RESOURCE_TRIGGERS = ['where to get', 'where can i get', 'where can i find', 'where to find', 'looking for', 'any good', 'is there a', 'need some', 'anyone got', 'get me', 'send me', 'find me', 'i need', 'i want', 'can someone send', 'anyone have', 'send over', 'gimme', 'is there a', 'looking for a', 'any', 'suggest', 'provide', 'send', 'get', 'need', 'give', 'link', 'sound']
+RESOURCE_KEYWORDS = ['sfx', 'overlay', 'preset', 'font', 'texture', 'lut', 'vfx', 'pack', 'cc', 'brush', 'plugin', 'shake', 'quality', 'png', 'jpg', 'jpeg', 'image', 'img', 'asset', 'stock', 'clip', 'video', 'background', 'cloud', 'smoke', 'fire', 'flare', 'dust', 'grain', 'particles', 'light', 'leak', 'sound effect', 'overlay', 'background', 'gfx', 'liquid', 'glitch', 'paper', 'dust', 'mp3', 'mp4', 'mkv', 'wav']
+MOTIVATION_TRIGGERS = [
+    'stuck', 'burnout', 'hate my edit', 'giving up', 'cant do this',
+    'impossible', 'ugly edit', 'not good at this', 'no motivation',
+    'frustrated', 'want to quit', 'tired of this'
+]
+# Software Keywords vs Role IDs
+SOFTWARE_ROLES = {
+    'after effects': AE_ROLE_ID,
+    'ae': AE_ROLE_ID,
+    'premiere': PR_ROLE_ID,
+    'photoshop': PS_ROLE_ID,
+    'resolve': OTHER_EDIT_ROLE_ID, # Or specific if you have one
+    'capcut': CAPCUT_ROLE_ID,
+    'alight motion': AM_ROLE_ID,
+    'am': AM_ROLE_ID
+}
+COUNCIL_TRIGGERS = ['council', 'review', 'deep audit', 'analyze deeply', 'expert opinion', 'shadow council']
+PROJECT_NOUNS = ['project', 'app', 'website', 'repository', 'system', 'build', 'architect']
+PROJECT_VERBS = ['make', 'generate', 'build', 'want', 'need', 'insane']
+ARCHITECT_KEYWORDS = ['project', 'app', 'website', 'repository', 'zip', 'framework', 'system', 'site']
+ARCHITECT_VERBS = ['build', 'architect', 'generate', 'make', 'want', 'need', 'setup', 'create']
+VISION_TRIGGERS = ['look', 'see', 'what', 'analyze', 'fix', 'check', 'read', 'solve', 'price', 'identify', 'where', 'tell me', 'who', 'prime eye']
+SEARCH_WORDS = ['gimme', 'give me', 'send me', 'get me', 'find me', 'show me', 'find', 'search', 'get', 'show', 'view', 'who is', 'what is', 'link']
+IMAGE_KEYWORDS = ['png', 'jpg', 'jpeg', 'image', 'img', 'picture', 'photo', 'gif', 'webp']
+PFP_KEYWORDS = ['pfp', 'avatar', 'profile picture', 'profile pic']
+STAT_KEYWORDS = ['stats', 'info', 'profile', 'bio', 'about me', 'discord acc', 'prof', 'account']
+IDENTITY_VERBS = ['show', 'get', 'give', 'send', 'view', 'what is', 'who is', 'shoe', 'find', 'check', 'look', 'display', 'sent', 'look up']
+AE_EXPR_KEYWORDS = ['expression', 'ae code', 'after effects code', 'wiggle', 'bounce', 'loopout', 'posterize', 'smooth', 'velocity code', 'shake expression', 'script code']
+DECISION_KEYWORDS = ['decide', 'choose', 'choice', 'better', 'comparison', 'compare', 'which one', 'should i', 'buy', 'get']
+INTEL_TRIGGERS = ['leak', 'insider info', 'whispers', 'intel', 'scout info', 'research leak']
+EPISODE_WORDS = ['ep', 'episode', 'part']
+VIDEO_KEYWORDS = ['video', 'song', 'music', 'track', 'phonk', 'beat', 'clip', 'youtube', 'yt', 'ep', 'episode', 'series', 'part', 'movie']
+YT_STAT_KEYWORDS = ['stats', 'analytics', 'subs', 'subscribers', 'views', 'subscriber', 'chanel', 'channel info']
+HELP_WORDS = ['help', 'tutorial', 'how to', 'teach', 'guide', 'learn', 'explain', 'show me', 'assist', 'how do i', 'how can i', 'how do you', 'create', 'make', 'how do', 'show me']
+EDITING_HELP_KEYWORDS = ['edit', 'effect', 'render', 'color', 'grade', 'video', 'after effects', 'ae', 'premiere', 'pr', 'photoshop', 'ps', 'resolve', 'davinci', 'capcut', 'topaz', 'cc', 'grading', 'correction', 'effects', 'transition', 'animation', 'vfx', 'motion', 'mask', 'keyframe']
+SOFTWARE_NAMES = {
+    'after effects': 'After Effects', 'ae': 'After Effects', 'afterffeffects': 'After Effects',
+    'premiere': 'Premiere Pro', 'pr': 'Premiere Pro',
+    'photoshop': 'Photoshop', 'ps': 'Photoshop',
+    'resolve': 'DaVinci Resolve', 'davinci': 'DaVinci Resolve',
+    'capcut': 'CapCut', 'topaz': 'Topaz',
+    'final cut': 'Final Cut Pro', 'fcp': 'Final Cut Pro',
+    'alight motion': 'Alight Motion', 'am': 'Alight Motion'
+}
+
+# One compiled pattern for every list above: each message is scanned once and the
+# handlers look up the categories they care about.
+triggers = KeywordEngine("triggers")
+triggers.add('rude', RUDE_KEYWORDS)
+triggers.add('editing', EDITING_KEYWORDS)
+triggers.add('political', POLITICAL_KEYWORDS, whole_words=True)
+triggers.add('feedback', FEEDBACK_TRIGGERS)
+triggers.add('resource_trigger', RESOURCE_TRIGGERS)
+triggers.add('resource', RESOURCE_KEYWORDS)
+triggers.add('motivation', MOTIVATION_TRIGGERS)
+triggers.add('software_role', SOFTWARE_ROLES, whole_words=True)
+triggers.add('council', COUNCIL_TRIGGERS)
+triggers.add('project_noun', PROJECT_NOUNS)
+triggers.add('project_verb', PROJECT_VERBS)
+triggers.add('architect', ARCHITECT_KEYWORDS)
+triggers.add('architect_verb', ARCHITECT_VERBS)
+triggers.add('vision', VISION_TRIGGERS)
+triggers.add('search', SEARCH_WORDS)
+triggers.add('image', IMAGE_KEYWORDS)
+triggers.add('pfp', PFP_KEYWORDS)
+triggers.add('stat', STAT_KEYWORDS)
+triggers.add('identity_verb', IDENTITY_VERBS)
+triggers.add('ae_expr', AE_EXPR_KEYWORDS)
+triggers.add('decision', DECISION_KEYWORDS)
+triggers.add('intel', INTEL_TRIGGERS)
+triggers.add('episode', EPISODE_WORDS)
+triggers.add('video', VIDEO_KEYWORDS)
+triggers.add('yt_stat', YT_STAT_KEYWORDS)
+triggers.add('help', HELP_WORDS, whole_words=True)
+triggers.add('editing_help', EDITING_HELP_KEYWORDS, whole_words=True)
+triggers.add('software', SOFTWARE_NAMES, whole_words=True)
+triggers.compile()
+
 async def moderate_topic_and_vibe(message):
     """Automatically moderate political or chaotic chat using AI analysis."""
     try:
         if message.author.bot or isinstance(message.channel, discord.DMChannel):
             return False
             
-        if is_server_admin(message.author, message.guild):
+        if await is_server_admin(message.author, message.guild):
             return False
 
         chan_id = message.channel.id
@@ -920,7 +859,7 @@ async def moderate_topic_and_vibe(message):
         
         # 2. Trigger Conditions
         # A. Political Keywords Detected
-        has_political_kw = any(re.search(r'\b' + re.escape(kw) + r'\b', message.content.lower()) for kw in POLITICAL_KEYWORDS)
+        has_political_kw = 'political' in triggers.scan(message.content.lower())
         
         # B. High Velocity (Potential Chaos)
         # Check if 8+ messages were sent in the last 15 seconds
@@ -1003,7 +942,7 @@ async def check_and_moderate_spam(message):
     """Check if message is spam and handle moderation."""
     try:
         # Don't moderate Admins/Owners, Bot, or DMs
-        if message.author == bot.user or is_server_admin(message.author, message.guild):
+        if message.author == bot.user or await is_server_admin(message.author, message.guild):
             return
         if isinstance(message.channel, discord.DMChannel):
             return
@@ -1125,7 +1064,6 @@ async def handle_automatic_media_review(message):
             return False
             
         prompt_lower = message.content.lower()
-        feedback_triggers = ['thoughts?', 'feedback?', 'wip', 'rate this', 'how does this look', 'opinions?', 'be honest', 'give me tips', 'rate?', 'thoughts']
         
         # Check for video links (YT Shorts, Streamable)
         video_link_pattern = r'(https?://(?:www\.)?(?:youtube\.com/shorts/|streamable\.com/)\S+)'
@@ -1135,7 +1073,7 @@ async def handle_automatic_media_review(message):
         if not has_media:
             return False
 
-        if any(trigger in prompt_lower for trigger in feedback_triggers):
+        if 'feedback' in triggers.scan(prompt_lower):
             async with message.channel.typing():
                 # Prepare feedback prompt
                 prompt = f"""
@@ -1165,7 +1103,7 @@ async def handle_automatic_media_review(message):
                         image_bytes = await download_image(attachment.url)
                         response = await get_gemini_response(prompt, message.author.id, username=message.author.name, image_bytes=image_bytes, guild_id=message.guild.id if message.guild else None)
                     elif is_video:
-                        video_bytes, error = await download_video(attachment.url, attachment.filename)
+                        video_bytes, error = await download_video(attachment.url, attachment.filename, expected_size=attachment.size)
                         if video_bytes:
                             response = await analyze_video(video_bytes, attachment.filename, message.author.id)
                 
@@ -1190,12 +1128,9 @@ async def handle_automatic_resources(message):
             return False
             
         prompt_lower = message.content.lower()
-        # Expanded triggers and keywords for more intelligent proactive detection
-        resource_triggers = ['where to get', 'where can i get', 'where can i find', 'where to find', 'looking for', 'any good', 'is there a', 'need some', 'anyone got', 'get me', 'send me', 'find me', 'i need', 'i want', 'can someone send', 'anyone have', 'send over', 'gimme', 'is there a', 'looking for a', 'any', 'suggest', 'provide', 'send', 'get', 'need', 'give', 'link', 'sound']
-        resource_keywords = ['sfx', 'overlay', 'preset', 'font', 'texture', 'lut', 'vfx', 'pack', 'cc', 'brush', 'plugin', 'shake', 'quality', 'png', 'jpg', 'jpeg', 'image', 'img', 'asset', 'stock', 'clip', 'video', 'background', 'cloud', 'smoke', 'fire', 'flare', 'dust', 'grain', 'particles', 'light', 'leak', 'sound effect', 'overlay', 'background', 'gfx', 'liquid', 'glitch', 'paper', 'dust', 'mp3', 'mp4', 'mkv', 'wav']
-        
-        has_trigger = any(trigger in prompt_lower for trigger in resource_triggers)
-        has_keyword = any(kw in prompt_lower for kw in resource_keywords)
+        hits = triggers.scan(prompt_lower)
+        has_trigger = 'resource_trigger' in hits
+        has_keyword = 'resource' in hits
                 
         if has_trigger and has_keyword:
             # Send an immediate status message to show we're working on it
@@ -1215,17 +1150,17 @@ async def handle_automatic_resources(message):
                 is_video_asset = any(kw in search_query.lower() for kw in ['video', 'song', 'music', 'track', 'phonk', 'beat', 'clip', 'yt'])
                 
                 if is_img_asset or is_sfx_asset or is_video_asset:
-                    file_path = None
+                    asset = None
                     if is_img_asset:
                         is_atmospheric = any(kw in search_query.lower() for kw in ['cloud', 'fire', 'smoke', 'flare', 'light', 'sky', 'stars', 'galaxy'])
                         if is_atmospheric:
-                            file_path = await generate_image(f"{search_query} high quality isolated on transparent-ready black background")
+                            asset = await generate_image(f"{search_query} high quality isolated on transparent-ready black background")
                         
-                        if not file_path:
-                            file_path = await search_and_download_image(search_query)
+                        if not asset:
+                            asset = await search_and_download_image(search_query)
                     
                     elif is_sfx_asset:
-                        file_path = await search_and_download_audio(search_query)
+                        asset = await search_and_download_audio(search_query)
 
                     elif is_video_asset:
                         # For videos/music, we send links instead of downloading large files
@@ -1239,11 +1174,9 @@ async def handle_automatic_resources(message):
                             await message.reply(content=f"here's the **{search_query}** you needed. hope it hits.\n🔗 {res['link']}", embed=embed, view=FindMoreImageView(search_query))
                             return True
                     
-                    if file_path and os.path.exists(file_path):
+                    if asset:
                         await status_msg.edit(content=f"✅ **Found it.** Fulfilling your request for **{search_query}**.")
-                        await message.reply(content=f"here's the **{search_query}** asset you needed. hope it hits.", file=discord.File(file_path), view=FindMoreImageView(search_query))
-                        try: os.remove(file_path)
-                        except: pass
+                        await message.reply(content=f"here's the **{search_query}** asset you needed. hope it hits.", file=asset.file(), view=FindMoreImageView(search_query))
                         return True
 
                 # --- LINK SUGGESTIONS (Fallback) ---
@@ -1296,22 +1229,9 @@ async def handle_automatic_role_suggestion(message):
         if message.author.bot or isinstance(message.channel, discord.DMChannel):
             return False
             
-        prompt_lower = message.content.lower()
-        
-        # Software Keywords vs Role IDs
-        software_roles = {
-            'after effects': AE_ROLE_ID,
-            'ae': AE_ROLE_ID,
-            'premiere': PR_ROLE_ID,
-            'photoshop': PS_ROLE_ID,
-            'resolve': OTHER_EDIT_ROLE_ID, # Or specific if you have one
-            'capcut': CAPCUT_ROLE_ID,
-            'alight motion': AM_ROLE_ID,
-            'am': AM_ROLE_ID
-        }
-        
-        for kw, role_id in software_roles.items():
-            if re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower):
+        mentioned = triggers.scan(message.content.lower()).get('software_role', ())
+        for kw, role_id in SOFTWARE_ROLES.items():
+            if kw in mentioned:
                 role = message.guild.get_role(role_id)
                 if role and role not in message.author.roles:
                     # Don't annoy them, only suggest once per session (10% chance to be 'chill')
@@ -1334,14 +1254,7 @@ async def handle_automatic_motivation(message):
         if message.author.bot:
             return False
             
-        prompt_lower = message.content.lower()
-        motivation_triggers = [
-            'stuck', 'burnout', 'hate my edit', 'giving up', 'cant do this', 
-            'impossible', 'ugly edit', 'not good at this', 'no motivation', 
-            'frustrated', 'want to quit', 'tired of this'
-        ]
-        
-        if any(trigger in prompt_lower for trigger in motivation_triggers):
+        if 'motivation' in triggers.scan(message.content.lower()):
             # Only trigger occasionally (25% chance) to keep it special
             if random.random() < 0.25:
                 async with message.channel.typing():
@@ -1418,18 +1331,44 @@ async def moderate_profanity(message):
 
 def get_image_hash(image_data):
     """Calculate a simple MD5 hash of image bytes for exact match detection."""
-    return hashlib.md5(image_data).hexdigest()
+    return media.content_hash(image_data)
 
-async def analyze_image_content(image_url):
+async def analyze_image_content(image_url, guild_id=None, user_id=None, allow_model=True, tiny=False):
     """Use Gemini to analyze if an image contains inappropriate content, scams, or gore.
     Uses a fallback system to handle quota limits (tries 2.0 -> 1.5 -> 1.5-8b).
+    Known-bad and near-duplicate spam images are caught by hash before any model call;
+    pass guild_id/user_id to count the post towards that guild's spam window.
+    Anything else goes through the local pre-screen (allowlist, QR, colour heuristics) and
+    only ambiguous images reach the model.
+    With allow_model=False only the hash checks and verdict cache run; an unknown image
+    comes back marked "shed". tiny=True (emotes, stickers) runs every local check but never
+    calls the model.
     """
     try:
-        image_data = await download_image(image_url)
+        try:
+            image_data = await media.images.download(image_url)
+        except media.DownloadBlocked as blocked:
+            logger.info(f"🚫 Known-bad image blocked mid-download: {blocked.verdict.get('reason')}")
+            return {**blocked.verdict, "hash": None}
         if not image_data:
             return {"is_bad": False}
         
         image_hash = get_image_hash(image_data)
+        known_bad = media.verdicts.blocked(digest=image_hash)
+        if known_bad:
+            return {**known_bad, "hash": image_hash}
+
+        perceptual = await media.images.dhash_for(image_data)
+        if perceptual is not None:
+            near_bad = near_dupes.blocked(perceptual)
+            if near_bad:
+                logger.info(f"🚫 Near-duplicate of blocked image ({perceptual:016x})")
+                return {**near_bad, "hash": image_hash}
+            if guild_id is not None:
+                count, users = near_dupes.observe(guild_id, perceptual, user_id)
+                # Same image sprayed repeatedly, or by several accounts, within the window
+                if count >= 5 or (count >= 3 and len(users) >= 2):
+                    return {"is_bad": False, "spam": True, "hash": image_hash}
         
         prompt_text = (
             "You are a HIGHLY STRICT server moderator AI. Analyze this image for violations.\n"
@@ -1451,6 +1390,31 @@ async def analyze_image_content(image_url):
         models_to_try = ["gemini-1.5-flash-latest", "gemini-2.0-flash", PRIMARY_MODEL]
         last_error = None
 
+        cached = await media.verdicts.get(image_hash, "moderation", models_to_try)
+        if cached is not None:
+            logger.info(f"♻️ Reused cached image verdict ({image_hash[:8]})")
+            return {**cached, "hash": image_hash}
+
+        screened = prescreen.screen(perceptual, await media.images.features_for(image_data), tiny=tiny)
+        if screened["decision"] == "allow":
+            return {"is_bad": False, "hash": image_hash}
+        if screened["decision"] == "block":
+            # Acted on for this post only; the persistent blocklist takes model-confirmed verdicts
+            logger.info(f"🚫 Image blocked by pre-screen ({screened['tier']}): {screened['reason']}")
+            return {"is_bad": True, "severity": "MEDIUM", "reason": screened["reason"], "hash": image_hash}
+        if screened.get("hints"):
+            prompt_text += "\n\nContext from local checks:\n" + "\n".join(screened["hints"])
+
+        if not allow_model:
+            return {"is_bad": False, "shed": True, "hash": image_hash}
+
+        async def remember(model_name, verdict):
+            await media.verdicts.put(image_hash, "moderation", model_name, verdict)
+            if verdict.get("is_bad"):
+                await media.verdicts.block(media.images.fingerprint_for(image_url), image_hash, verdict, perceptual)
+            else:
+                prescreen.approve(perceptual)
+
         for model_name in models_to_try:
             try:
                 response = await safe_generate_content(
@@ -1471,8 +1435,8 @@ async def analyze_image_content(image_url):
                 )
                 
                 if response.text:
-                    import json
                     data = json.loads(response.text)
+                    await remember(model_name, data)
                     data['hash'] = image_hash
                     logger.info(f"Image analysis successful using {model_name}")
                     return data
@@ -1486,7 +1450,9 @@ async def analyze_image_content(image_url):
                 
                 if "safety" in err_str:
                     logger.info(f"Content blocked by safety filter on {model_name} (Treating as SEVERE NSFW)")
-                    return {"is_bad": True, "severity": "SEVERE", "reason": "Content blocked by AI safety filters (likely NSFW/Gore)", "hash": image_hash}
+                    verdict = {"is_bad": True, "severity": "SEVERE", "reason": "Content blocked by AI safety filters (likely NSFW/Gore)"}
+                    await remember(model_name, verdict)
+                    return {**verdict, "hash": image_hash}
                 
                 logger.error(f"Error with model {model_name}: {e}")
                 last_error = e
@@ -1499,30 +1465,55 @@ async def analyze_image_content(image_url):
         
     return {"is_bad": False}
 
+VIDEO_MIME_TYPES = {
+    '.mp4': 'video/mp4',
+    '.avi': 'video/avi',
+    '.mkv': 'video/x-matroska',
+    '.webm': 'video/webm',
+    '.mov': 'video/quicktime',
+    '.flv': 'video/x-flv',
+    '.wmv': 'video/x-ms-wmv',
+    '.m4v': 'video/mp4'
+}
+
+async def video_contents(video_bytes, filename, prompt):
+    """Gemini parts for a video (bytes or a download from download_video): keyframe contact sheets +
+    audio excerpt, or the whole file for short clips."""
+    sample = await media.videos.sample(video_bytes, filename)
+    if sample is None:
+        mime_type = VIDEO_MIME_TYPES.get('.' + filename.split('.')[-1].lower(), 'video/mp4')
+        data = video_bytes.read() if isinstance(video_bytes, media.SpooledDownload) else video_bytes
+        return [types.Part.from_bytes(data=data, mime_type=mime_type), types.Part.from_text(text=prompt)]
+
+    parts = [types.Part.from_bytes(data=sheet, mime_type="image/jpeg") for sheet in sample["sheets"]]
+    note = (
+        f"The video ({sample['duration']:.0f}s) is shown as {len(sample['sheets'])} contact sheet(s) of "
+        f"{sample['frames']} scene keyframes in time order, each stamped with its timestamp"
+    )
+    if sample["audio"]:
+        parts.append(types.Part.from_bytes(data=sample["audio"], mime_type="audio/mp3"))
+        note += f", plus a {media.VIDEO_AUDIO_SECONDS}s audio excerpt from the middle"
+    parts.append(types.Part.from_text(text=f"{note}.\n\n{prompt}"))
+    return parts
+
 async def check_video_safety(video_bytes, filename):
     """Use Gemini to analyze if a video contains inappropriate content.
     Uses fallback 2.0 -> 1.5.
     """
     try:
-        mime_types = {'.mp4': 'video/mp4', '.avi': 'video/avi', '.mkv': 'video/x-matroska', '.webm': 'video/webm'}
-        file_ext = '.' + filename.split('.')[-1].lower()
-        mime_type = mime_types.get(file_ext, 'video/mp4')
-
         prompt = (
             "Analyze this video strictly for moderation. Check for NSFW, nudity, sex, gore, extreme violence, or scams. "
             "Reply with ONLY JSON format: {\"is_bad\": true/false, \"severity\": \"SEVERE\" or \"MEDIUM\", \"reason\": \"...\"}"
         )
         models_to_try = ["gemini-1.5-flash-latest", "gemini-2.0-flash-latest", PRIMARY_MODEL]
         last_error = None
+        contents = await video_contents(video_bytes, filename, prompt)
 
         for model_name in models_to_try:
             try:
                 response = await safe_generate_content(
                     model=model_name,
-                    contents=[
-                        types.Part.from_bytes(data=video_bytes, mime_type=mime_type),
-                        types.Part.from_text(text=prompt)
-                    ],
+                    contents=contents,
                     config=types.GenerateContentConfig(
                         response_mime_type="application/json",
                         safety_settings=[
@@ -1532,7 +1523,6 @@ async def check_video_safety(video_bytes, filename):
                     )
                 )
                 if response.text:
-                    import json
                     logger.info(f"Video analysis successful using {model_name}")
                     return json.loads(response.text)
             except Exception as e:
@@ -1548,104 +1538,187 @@ async def check_video_safety(video_bytes, filename):
         logger.error(f"Error in video safety check: {str(e)}")
         return {"is_bad": False}
 
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+MODERATED_VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mkv', '.webm')
+MEDIA_MODERATION_WORKERS = int(os.getenv("MEDIA_MODERATION_WORKERS", "4"))  # Attachment checks running at once, across all guilds
+MEDIA_QUEUE_MAX_DEPTH = int(os.getenv("MEDIA_QUEUE_MAX_DEPTH", "200"))      # Past this, new checks are hash-only
+MEDIA_QUEUE_MAX_WAIT = float(os.getenv("MEDIA_QUEUE_MAX_WAIT", "20"))       # Seconds queued before a check falls back to hash-only
+MEDIA_DEFERRED_MAX_WAIT = float(os.getenv("MEDIA_DEFERRED_MAX_WAIT", "900"))  # Deferred full checks have no fallback, so they get much longer
+PRIORITY_NEW_ACCOUNT, PRIORITY_NORMAL, PRIORITY_DEFERRED = 0, 1, 2
+
+# Guilds are served round-robin so a raid in one server can't starve the others (or chat replies)
+media_queue = FairQueue("media_moderation", workers=MEDIA_MODERATION_WORKERS, max_depth=MEDIA_QUEUE_MAX_DEPTH, max_wait=MEDIA_QUEUE_MAX_WAIT)
+metrics.register(media_queue.samples)
+
+def moderation_priority(member):
+    """New accounts and fresh joins are checked first; they're who raids are made of."""
+    now = datetime.now(timezone.utc)
+    created_at = getattr(member, 'created_at', None)
+    if created_at and (now - created_at).days < 7:
+        return PRIORITY_NEW_ACCOUNT
+    joined_at = getattr(member, 'joined_at', None)
+    if joined_at and (now - joined_at).total_seconds() < 86400:
+        return PRIORITY_NEW_ACCOUNT
+    return PRIORITY_NORMAL
+
+async def _shed_verdict():
+    return {"is_bad": False, "shed": True}
+
+async def check_attachment(message, attachment, priority=PRIORITY_NORMAL):
+    """Moderation verdict for one attachment ({"is_bad", "severity", "reason"}, or {"spam": True}).
+    Runs through the media queue; under overload images get a hash-only check and the full
+    check is deferred.
+    """
+    filename = attachment.filename.lower()
+    guild_id = message.guild.id
+    deferred = priority == PRIORITY_DEFERRED
+    # A deferred re-check must not count the post towards the spam window twice
+    window_guild = None if deferred else guild_id
+    try:
+        # 1. Check IMAGES
+        if filename.endswith(IMAGE_EXTENSIONS):
+            # Emotes, stickers and thumbnails: nothing for a model to judge, but hash, spam and QR checks still run
+            tiny = prescreen.tiny(attachment.width, attachment.height, attachment.size)
+            full = lambda: analyze_image_content(attachment.url, guild_id=window_guild, user_id=message.author.id, tiny=tiny)
+            quick = lambda: analyze_image_content(attachment.url, guild_id=window_guild, user_id=message.author.id, allow_model=False, tiny=tiny)
+        # 2. Check VIDEOS
+        elif filename.endswith(MODERATED_VIDEO_EXTENSIONS):
+            async def full():
+                video_data, _ = await download_video(attachment.url, attachment.filename, expected_size=attachment.size)
+                return await check_video_safety(video_data, attachment.filename) if video_data else {"is_bad": False}
+            quick = _shed_verdict
+        else:
+            return {"is_bad": False}
+
+        if deferred:
+            verdict = await media_queue.submit(guild_id, priority, full, max_wait=MEDIA_DEFERRED_MAX_WAIT)
+        else:
+            verdict = await media_queue.submit(guild_id, priority, full, fallback=quick)
+        if verdict.get("shed"):
+            asyncio.create_task(deferred_media_review(message, attachment))
+        return verdict
+    except LaneFull:
+        logger.warning(f"🪫 {'Deferred media' if deferred else 'Media'} check dropped: {attachment.filename}")
+    except Exception as e:
+        logger.error(f"Error checking attachment {attachment.filename}: {e}")
+    return {"is_bad": False}
+
+async def deferred_media_review(message, attachment):
+    """Full check for an attachment that only got a hash check under load; acts if it turns out bad."""
+    res = await check_attachment(message, attachment, priority=PRIORITY_DEFERRED)
+    if res.get("is_bad"):
+        logger.info(f"⏳ Deferred media check caught {attachment.filename} from {message.author.name}")
+        await act_on_media_verdict(message, res)
+
+async def act_on_media_verdict(message, res):
+    """Delete/ban/warn for a bad (or mass-spam) attachment verdict. Returns True if action was taken."""
+    # Image Spam Check: near-duplicates across the server (BAN for mass spam)
+    if res.get("spam"):
+        reason_msg = "Mass Image/Scam Spam detected across the server."
+        try:
+            await message.delete()
+            # Pre-ban DM
+            try:
+                view = AppealButtonView(message.guild.id)
+                await message.author.send(
+                    f"🚫 You have been **permanently banned** from **{message.guild.name}**.\n"
+                    f"**Reason:** {reason_msg}\n\n"
+                    f"If this was a mistake, appeal below.",
+                    view=view
+                )
+            except: pass
+            await message.guild.ban(message.author, reason=reason_msg, delete_message_seconds=86400)
+            await message.channel.send(f"🔨 **{message.author.name}** has been BANNED for image spam.")
+            return True
+        except: pass
+        return False
+
+    reason = res.get("reason", "Inappropriate content")
+    severity = res.get("severity", "MEDIUM")
+
+    try: await message.delete()
+    except: pass
+
+    if severity == "SEVERE":
+        # Instant Ban for NSFW/Gore/Scams
+        reason_msg = f"Zero tolerance policy: {reason}"
+        try:
+            view = AppealButtonView(message.guild.id)
+            await message.author.send(
+                f"🚫 You have been **permanently banned** from **{message.guild.name}**.\n"
+                f"**Reason:** {reason_msg}\n\n"
+                f"If this was a mistake, appeal below.",
+                view=view
+            )
+            await message.guild.ban(message.author, reason=reason_msg, delete_message_seconds=86400)
+            await message.channel.send(f"🔨 **{message.author.name}** has been BANNED. Reason: {reason_msg}")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to ban user for media: {e}")
+    
+    # Else just warn
+    await warn_user(message.author, message.guild, f"Inappropriate Media: {reason}")
+    return True
+
 async def moderate_media(message):
-    """Check images/videos for inappropriate content (NSFW/Gore/Scams/Spam)."""
+    """Check images/videos for inappropriate content (NSFW/Gore/Scams/Spam).
+    Attachments are checked concurrently through the media queue; the first SEVERE (or spam) verdict cancels the rest.
+    """
     try:
         if message.author == bot.user:
             return False
         
-        if is_server_admin(message.author, message.guild):
-            return False
-
         if isinstance(message.channel, discord.DMChannel):
             return False
         
-        user_id = message.author.id
-        
-        for attachment in message.attachments:
-            filename = attachment.filename.lower()
-            res = {"is_bad": False}
-            
-            # 1. Check IMAGES
-            if any(filename.endswith(ext) for ext in ['.png', '.jpg', '.jpeg', '.gif', '.webp']):
-                res = await analyze_image_content(attachment.url)
-                
-                # Image Spam Check
-                img_hash = res.get('hash')
-                if img_hash:
-                    now = datetime.now(timezone.utc)
-                    if img_hash not in image_hash_tracker:
-                        image_hash_tracker[img_hash] = {"count": 1, "last_seen": now, "users": {user_id}}
-                    else:
-                        tracker = image_hash_tracker[img_hash]
-                        # Reset if long ago
-                        if (now - tracker["last_seen"]).total_seconds() > 3600: # 1 hour
-                            tracker["count"] = 1
-                            tracker["users"] = {user_id}
-                        else:
-                            tracker["count"] += 1
-                            tracker["users"].add(user_id)
-                        tracker["last_seen"] = now
-
-                        # Trigger BAN for mass spam (same image across multiple users or massive spray)
-                        if tracker["count"] >= 5 or (tracker["count"] >= 3 and len(tracker["users"]) >= 2):
-                            reason_msg = "Mass Image/Scam Spam detected across the server."
-                            try:
-                                await message.delete()
-                                # Pre-ban DM
-                                try:
-                                    view = AppealButtonView(message.guild.id)
-                                    await message.author.send(
-                                        f"🚫 You have been **permanently banned** from **{message.guild.name}**.\n"
-                                        f"**Reason:** {reason_msg}\n\n"
-                                        f"If this was a mistake, appeal below.",
-                                        view=view
-                                    )
-                                except: pass
-                                await message.guild.ban(message.author, reason=reason_msg, delete_message_seconds=86400)
-                                await message.channel.send(f"🔨 **{message.author.name}** has been BANNED for image spam.")
-                                return True
-                            except: pass
-
-            # 2. Check VIDEOS
-            elif any(filename.endswith(ext) for ext in ['.mp4', '.avi', '.mkv', '.webm']):
-                video_data, _ = await download_video(attachment.url, attachment.filename)
-                if video_data:
-                    res = await check_video_safety(video_data, attachment.filename)
-            
-            if res.get("is_bad"):
-                reason = res.get("reason", "Inappropriate content")
-                severity = res.get("severity", "MEDIUM")
-
-                try: await message.delete()
-                except: pass
+        attachments = [a for a in message.attachments if a.filename.lower().endswith(IMAGE_EXTENSIONS + MODERATED_VIDEO_EXTENSIONS)]
+        if not attachments:
+            return False
 
-                if severity == "SEVERE":
-                    # Instant Ban for NSFW/Gore/Scams
-                    reason_msg = f"Zero tolerance policy: {reason}"
-                    try:
-                        view = AppealButtonView(message.guild.id)
-                        await message.author.send(
-                            f"🚫 You have been **permanently banned** from **{message.guild.name}**.\n"
-                            f"**Reason:** {reason_msg}\n\n"
-                            f"If this was a mistake, appeal below.",
-                            view=view
-                        )
-                        await message.guild.ban(message.author, reason=reason_msg, delete_message_seconds=86400)
-                        await message.channel.send(f"🔨 **{message.author.name}** has been BANNED. Reason: {reason_msg}")
-                        return True
-                    except Exception as e:
-                        logger.error(f"Failed to ban user for media: {e}")
-                
-                # Else just warn
-                await warn_user(message.author, message.guild, f"Inappropriate Media: {reason}")
-                return True
+        if await is_server_admin(message.author, message.guild):
+            return False
         
-        return False
+        priority = moderation_priority(message.author)
+        checks = [asyncio.create_task(check_attachment(message, a, priority)) for a in attachments]
+        res = None
+        try:
+            for finished in asyncio.as_completed(checks):
+                verdict = await finished
+                if verdict.get("spam") or (verdict.get("is_bad") and verdict.get("severity") == "SEVERE"):
+                    res = verdict
+                    break
+                if verdict.get("is_bad") and res is None:
+                    # Keep waiting: a later attachment may still be SEVERE
+                    res = verdict
+        finally:
+            for task in checks:
+                task.cancel()
+
+        if res is None:
+            return False
+        return await act_on_media_verdict(message, res)
     except Exception as e:
         logger.error(f"Error in media moderation: {str(e)}")
         return False
 
+async def moderate_message(message):
+    """Staged moderation. Returns True if the message was actioned and shouldn't be processed further.
+    Stage 1: text checks (pure string matching, no I/O unless they hit) short-circuit first.
+    Stage 2: attachments, checked concurrently under the guild's budget.
+    """
+    # Check for profanity and moderate (delete + warn + mute 24h)
+    if await moderate_profanity(message):
+        return True
+    
+    # Check for spam and moderate
+    if await check_and_moderate_spam(message):
+        return True
+    
+    # Check images/videos for inappropriate content
+    if message.attachments and await moderate_media(message):
+        return True
+    return False
+
 async def check_server_security(message):
     """Monitor server security threats like invites and suspicious behavior."""
     try:
@@ -1777,11 +1850,11 @@ async def on_member_join(member):
     except Exception as e:
         logger.error(f"Error in welcome flow: {e}")
 
-@bot.listen('on_message')
-async def leveling_handler(message):
+async def xp_stage(ctx):
     """Award XP to users for messaging."""
-    if message.author.bot or not message.guild:
-        return
+    message = ctx.message
+    if not message.guild:
+        return False
 
     user_id = message.author.id
     current_time = datetime.now(timezone.utc)
@@ -1790,7 +1863,7 @@ async def leveling_handler(message):
     if user_id in user_xp_cooldowns:
         last_xp_time = user_xp_cooldowns[user_id]
         if (current_time - last_xp_time).total_seconds() < 60:
-            return
+            return False
 
     # Award XP
     xp_to_add = random.randint(15, 25)
@@ -1832,7 +1905,7 @@ async def leveling_handler(message):
         user_levels[user_id]["level"] = new_level
         
         # Determine where to send level-up alert (only in the specific channel)
-        alert_channel = bot.get_channel(get_leveling_chan(ctx.guild.id))
+        alert_channel = bot.get_channel(get_leveling_chan(message.guild.id))
         if alert_channel:
             embed = discord.Embed(
                 title="🎊 LEVEL UP!",
@@ -1844,10 +1917,11 @@ async def leveling_handler(message):
             try:
                 await alert_channel.send(embed=embed, delete_after=30)
             except Exception as e:
-                logger.error(f"Failed to send level-up alert to channel {get_leveling_chan(ctx.guild.id)}: {e}")
+                logger.error(f"Failed to send level-up alert to channel {get_leveling_chan(message.guild.id)}: {e}")
     
     # Save levels immediately to prevent data loss on restart
-    db_manager.save_level(user_id, user_levels[user_id]["xp"], user_levels[user_id]["level"])
+    await asyncio.to_thread(db_manager.save_level, user_id, user_levels[user_id]["xp"], user_levels[user_id]["level"])
+    return False
 
 
 @bot.event
@@ -1899,46 +1973,28 @@ async def on_webhooks_update(channel):
     """Monitor webhook creation/deletion."""
     logger.warning(f"Webhook update in {channel.guild.name}#{channel.name} - potential security concern")
 
-async def download_video(url, filename):
-    """Download video from URL (Direct, YT Shorts, or Streamable) and return bytes."""
+async def download_video(url, filename, expected_size=None):
+    """Download video from URL (Direct, YT Shorts, or Streamable).
+    Returns a media.SpooledDownload (streamed, size-capped, spilled to disk when large) or None, plus an error.
+    """
     try:
         # Check if it's a direct link to a file or a platform link
-        is_direct = any(url.lower().endswith(ext) for ext in ['.mp4', '.avi', '.mkv', '.webm', '.flv', '.wmv', '.m4v'])
+        is_direct = any(url.lower().split('?')[0].endswith(ext) for ext in ['.mp4', '.avi', '.mkv', '.webm', '.flv', '.wmv', '.m4v'])
         
         if is_direct:
             if filename.lower().endswith('.mov'):
                 return None, "MOV files are not supported"
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url) as response:
-                    if response.status == 200:
-                        video_data = await response.read()
-                        return video_data, None
+            return await media.download_media(url, media.VIDEO_MAX_BYTES, expected_size), None
         else:
-            # Platform link (YT Shorts, Streamable, etc.)
+            # Platform link (YT Shorts, Streamable, etc.), resolved in the yt-dlp worker pool and cached
             logger.info(f"Extracting video from platform link: {url}")
-            ydl_opts = {
-                'format': 'best[ext=mp4]/best',
-                'quiet': True,
-                'no_warnings': True,
-                'max_filesize': 50 * 1024 * 1024, # 50MB limit
-            }
-            
-            # Using asyncio.to_thread for blocking yt-dlp call
-            def extract_info():
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    return info.get('url'), info.get('ext', 'mp4')
-
-            direct_url, ext = await asyncio.to_thread(extract_info)
-            
-            if direct_url:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(direct_url) as response:
-                        if response.status == 200:
-                            video_data = await response.read()
-                            return video_data, None
+            info = await media.extractor.extract(url)
+            if info:
+                return await media.download_media(info["url"], media.VIDEO_MAX_BYTES, info["filesize"], headers=info["http_headers"]), None
                             
+    except media.DownloadTooLarge:
+        return None, f"Video is too large (max {media.VIDEO_MAX_BYTES // (1024 * 1024)}MB)"
     except Exception as e:
         logger.error(f"Error downloading video: {str(e)}")
     return None, "Failed to download video"
@@ -1946,21 +2002,6 @@ async def download_video(url, filename):
 async def analyze_video(video_bytes, filename, user_id):
     """Analyze video and provide editing steps using Gemini."""
     try:
-        # Determine mime type based on file extension
-        mime_types = {
-            '.mp4': 'video/mp4',
-            '.avi': 'video/avi',
-            '.mkv': 'video/x-matroska',
-            '.webm': 'video/webm',
-            '.mov': 'video/quicktime',
-            '.flv': 'video/x-flv',
-            '.wmv': 'video/x-ms-wmv',
-            '.m4v': 'video/mp4'
-        }
-        
-        file_ext = '.' + filename.split('.')[-1].lower()
-        mime_type = mime_types.get(file_ext, 'video/mp4')
-        
         # Create a detailed prompt for video analysis
         analysis_prompt = """You're an expert video editor. Analyze this video and provide:
 
@@ -1975,16 +2016,10 @@ async def analyze_video(video_bytes, filename, user_id):
 
 Be specific with menu locations and techniques. Assume the user is editing in Adobe Premiere Pro or After Effects."""
         
-        # Send video to Gemini for analysis
+        # Send video to Gemini for analysis (sampled unless it's a short clip)
         response = await safe_generate_content(
             model=PRIMARY_MODEL,
-            contents=[
-                types.Part.from_bytes(
-                    data=video_bytes,
-                    mime_type=mime_type,
-                ),
-                types.Part.from_text(text=analysis_prompt),
-            ],
+            contents=await video_contents(video_bytes, filename, analysis_prompt),
         )
         
         if not response or not response.text:
@@ -1995,59 +2030,6 @@ Be specific with menu locations and techniques. Assume the user is editing in Ad
         logger.error(f"Video analysis error: {str(e)}")
         return f"{BOT_ERROR_MSG} [DEBUG: {str(e)}]"
 
-async def update_user_personality(user_id, username):
-    """Analyze recent history to update the user's perceived 'vibe' and personality profile."""
-    try:
-        # Get history (last 15 messages)
-        history = db_manager.get_history(user_id, limit=15)
-        if not history or len(history) < 3: # Only update if there's enough context
-            return
-
-        chat_blob = "\n".join([f"{'User' if m['role'] == 'user' else 'Prime'}: {m['parts'][0]['text']}" for m in history])
-        
-        prompt = f"""
-        Analyze the following chat history between a user and Prime (an elite creative partner).
-        
-        CHAT HISTORY:
-        {chat_blob}
-        
-        TASK:
-        1. Summarize this user's 'Creative Profile' (what they do, expertise, tools they mention).
-        2. Identify their 'Chat Vibe' (e.g., chill, aggressive, high-energy, technical, meme-heavy).
-        3. Identify how they chat (e.g., uses lowercase, short sentences, technical jargon, emojis).
-        
-        STRICT RESPONSE FORMAT (JSON ONLY):
-        {{
-            "profile_summary": "Short 1-sentence descriptor (e.g. 'Advanced AE editor focused on liquid motion').",
-            "vibe": "One-word vibe descriptor.",
-            "notes": "Brief bullets on their technical style and chat habits."
-        }}
-        """
-        
-        # Use a faster model for the background update
-        response = await safe_generate_content(model=FALLBACK_MODEL, contents=[prompt])
-        if response and response.text:
-            res_text = response.text.strip()
-            if "```json" in res_text:
-                res_text = res_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in res_text:
-                res_text = res_text.split("```")[1].split("```")[0].strip()
-            
-            try:
-                data = json.loads(res_text)
-                db_manager.update_user_memory(
-                    user_id, 
-                    username, 
-                    profile_summary=data.get('profile_summary'), 
-                    vibe=data.get('vibe'),
-                    notes=data.get('notes')
-                )
-                logger.info(f"Updated personality profile for {username}")
-            except:
-                pass
-    except Exception as e:
-        logger.error(f"Error updating user personality: {e}")
-
 # --- SPECIALIZED AI PROMPTS ---
 EXECUTIVE_BRIEFING_PROMPT = """You are Prime, acting as an elite Executive Assistant. 
 Your goal is to provide a high-level summary of recent activity, trends, and priorities.
@@ -2079,180 +2061,52 @@ async def get_gemini_response(prompt, user_id, username=None, image_bytes=None,
     )
 
 async def search_and_download_image(query: str, limit: int = 1):
-    """Search for images using direct API sources."""
+    """Search for images using direct API sources. Returns an assets.Asset or None."""
     try:
-        import requests
-        import tempfile
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
         # Method 1: Google Image Search (via Serper) - MOST ACCURATE
+        img_urls = None
         try:
             logger.info(f"Trying Google Image Search for: {query}")
             img_urls = await brain.search_images_google(query)
-            if img_urls:
-                # Pick a random image from top results to ensure variety on "Find More"
-                img_url = random.choice(img_urls)
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(img_url, timeout=10) as response:
-                        if response.status == 200:
-                            content = await response.read()
-                            if len(content) > 1000:
-                                temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-                                temp_file.write(content)
-                                temp_file.close()
-                                logger.info(f"✓ Downloaded image from Google for: {query}")
-                                return temp_file.name
         except Exception as e:
             logger.warning(f"Google Image Search failed: {str(e)}")
 
-        # Method 2: Unsplash API (fallback)
-        try:
-            # Clean the query
-            safe_query = query.replace(' ', '+')
-            unsplash_url = f"https://source.unsplash.com/random/800x600?{safe_query}"
-            logger.info(f"Trying Unsplash: {unsplash_url}")
-            
-            response = requests.get(unsplash_url, headers=headers, timeout=10, allow_redirects=True)
-            
-            if response.status_code == 200 and len(response.content) > 1000:
-                temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-                temp_file.write(response.content)
-                temp_file.close()
-                logger.info(f"✓ Downloaded image from Unsplash for: {query}")
-                return temp_file.name
-        except Exception as e:
-            logger.warning(f"Unsplash failed: {str(e)}")
-        
-        # Method 3: Placeholder with image text overlay as fallback
-        try:
-            logger.info(f"Creating placeholder image for: {query}")
-            from PIL import Image, ImageDraw
-            
-            # Create a simple colored image with text
-            img = Image.new('RGB', (800, 600), color=(73, 109, 137))
-            d = ImageDraw.Draw(img)
-            
-            # Add text
-            text = f"Image: {query[:30]}"
-            d.text((50, 250), text, fill=(255, 255, 255))
-            
-            temp_file = tempfile.NamedTemporaryFile(suffix='.jpg', delete=False)
-            img.save(temp_file.name)
-            temp_file.close()
-            logger.info(f"✓ Created placeholder for: {query}")
-            return temp_file.name
-        except Exception as e:
-            logger.warning(f"Placeholder creation failed: {str(e)}")
-        
-        logger.warning(f"Could not find/create images for query: {query}")
-        return None
+        # Then Unsplash, then a placeholder with the query on it
+        asset = await assets.search_image(query, img_urls)
+        if not asset:
+            logger.warning(f"Could not find/create images for query: {query}")
+        return asset
         
     except Exception as e:
         logger.error(f"Error downloading image: {str(e)}")
         return None
 
 async def search_and_download_audio(query: str):
-    """Search for audio/SFX files using Google Search and direct downloads."""
+    """Search for audio/SFX files using Google Search and direct downloads. Returns an assets.Asset or None."""
     try:
-        import tempfile
-        import aiohttp
-        
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
-        # Method 1: Target MyInstants specifically for SFX
-        try:
-            search_query = f"site:myinstants.com {query} mp3"
-            logger.info(f"Trying MyInstants Search for SFX: {query}")
-            search_results = await brain.search_google(search_query)
-            
-            if search_results:
-                async with aiohttp.ClientSession() as session:
-                    for result in search_results:
-                        page_url = result.get('link')
-                        if not page_url: continue
-                        
-                        # Fetch page to find the mp3 link
-                        async with session.get(page_url, headers=headers, timeout=10) as page_res:
-                            if page_res.status == 200:
-                                page_html = await page_res.text()
-                                # Patterns common for mp3 links on myinstants
-                                mp3_match = re.search(r'https?://[^\s<>"]+\.mp3', page_html)
-                                if mp3_match:
-                                    download_url = mp3_match.group(0)
-                                    logger.info(f"Found SFX Download URL: {download_url}")
-                                    
-                                    async with session.get(download_url, headers=headers, timeout=15) as res:
-                                        if res.status == 200:
-                                            content = await res.read()
-                                            if len(content) > 1000:
-                                                temp_file = tempfile.NamedTemporaryFile(suffix='.mp3', delete=False)
-                                                temp_file.write(content)
-                                                temp_file.close()
-                                                logger.info(f"✓ Downloaded SFX from {download_url}")
-                                                return temp_file.name
-        except Exception as e:
-            logger.warning(f"SFX search failed: {str(e)}")
-            
+        # Target MyInstants specifically for SFX
+        search_query = f"site:myinstants.com {query} mp3"
+        logger.info(f"Trying MyInstants Search for SFX: {query}")
+        search_results = await brain.search_google(search_query)
+        page_urls = [result.get('link') for result in search_results or [] if result.get('link')]
+        if page_urls:
+            return await assets.find_sfx(query, page_urls)
         return None
     except Exception as e:
         logger.error(f"Global SFX search error: {str(e)}")
         return None
 
 async def generate_image(description: str):
-    """Generate an image using Pollinations AI (free, no auth required)."""
+    """Generate an image using Pollinations AI (free, no auth required). Returns an assets.Asset or None."""
     try:
-        # Use Pollinations.AI free image generation
-        url = f"https://image.pollinations.ai/prompt/{description}"
-        
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, timeout=aiohttp.ClientTimeout(total=30)) as response:
-                if response.status == 200:
-                    image_data = await response.read()
-                    # Save to temp file
-                    import tempfile
-                    temp_file = tempfile.NamedTemporaryFile(suffix='.png', delete=False)
-                    temp_file.write(image_data)
-                    temp_file.close()
-                    return temp_file.name
+        return await assets.generate_image(description)
     except Exception as e:
         logger.error(f"Error generating image: {str(e)}")
-    
     return None
 
 async def search_google(query):
     """Search Google using Serper API and return top organic results."""
-    api_key = os.getenv("SERPER_API_KEY")
-    if not api_key:
-        logger.warning("SERPER_API_KEY not found in environment. Google Search is disabled.")
-        return None
-    
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({"q": query, "num": 5})
-    headers = {
-        'X-API-KEY': api_key,
-        'Content-Type': 'application/json'
-    }
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, data=payload, timeout=10) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data.get('organic', [])
-                else:
-                    logger.error(f"Serper API error: {response.status}")
-                    return None
-    except Exception as e:
-        logger.error(f"Google Search failed: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"Error generating image: {str(e)}")
-        return None
+    return await brain.search_google(query)
 
 import asyncio
 import random
@@ -2610,8 +2464,8 @@ class VerifyButtonView(discord.ui.View):
             await interaction.response.send_message("✅ You are already verified and have full access to the server!", ephemeral=True)
             return
 
-        # 2. Generate captcha
-        code, image_bytes = generate_captcha()
+        # 2. Take a pre-rendered captcha
+        code, image_bytes = await captcha_pool.take()
         active_captchas[interaction.user.id] = code
         db_manager.save_captcha(interaction.user.id, code)
         
@@ -2649,9 +2503,9 @@ class FindMoreImageView(discord.ui.View):
         # We don't defer here to show "typing" or similar, just act
         try:
             # We use interaction.followup to send new messages
-            image_path = await search_and_download_image(self.query)
-            if image_path and os.path.exists(image_path):
-                await interaction.response.send_message(f"found another one for **{self.query}**.", file=discord.File(image_path), view=FindMoreImageView(self.query))
+            asset = await search_and_download_image(self.query)
+            if asset:
+                await interaction.response.send_message(f"found another one for **{self.query}**.", file=asset.file(), view=FindMoreImageView(self.query))
             else:
                 await interaction.response.send_message("❌ couldn't find any more unique images for that.", ephemeral=True)
         except Exception as e:
@@ -2738,10 +2592,14 @@ async def fetch_invidious_stats(query):
     
     async with aiohttp.ClientSession() as session:
         for instance in instances:
+            breaker = breakers.for_url(instance)
+            if not breaker.allow():
+                continue # Known dead instance, don't wait out its timeout
             try:
                 # Search for channel
                 url = f"{instance}/api/v1/search?q={clean_query}&type=channel"
                 async with session.get(url, timeout=5) as resp:
+                    breaker.record(resp.status < 500 and resp.status != 429)
                     if resp.status == 200:
                         data = await resp.json()
                         if data and isinstance(data, list) and len(data) > 0:
@@ -2762,6 +2620,7 @@ async def fetch_invidious_stats(query):
                             logger.info(f"Fetched stats from {instance}: {title}, {subs_text}")
                             return subs_text, str(videos), title
             except Exception as e:
+                breaker.record_failure()
                 logger.warning(f"Invidious {instance} failed: {e}")
                 continue
     
@@ -3073,6 +2932,7 @@ async def on_ready():
         bot.add_view(VerifyButtonView())
         bot.add_view(CaptchaEntryView())
         logger.info("✅ Persistent views registered.")
+        captcha_pool.start()
 
         # Sync slash commands
         try:
@@ -3108,6 +2968,12 @@ async def on_ready():
         # AutoMod Setup
         bot.loop.create_task(setup_all_guilds_automod())
 
+        # Worker metrics endpoint (breaker states etc.), only when METRICS_PORT is set
+        try:
+            await metrics.start_server()
+        except Exception as e:
+            logger.error(f"Failed to start metrics endpoint: {e}")
+
     except Exception as e:
         logger.error(f"Fatal error in on_ready: {e}")
 
@@ -3452,9 +3318,9 @@ async def on_command_error(ctx, error):
 
 # Removed duplicate on_message_delete handler
 
-@bot.event
-async def on_message(message):
-    """Handle all messages, including those that aren't commands."""
+async def prefilter_stage(ctx):
+    """Hype train, secret chat log, DM command guard; drops messages from bots (including ourselves)."""
+    message = ctx.message
     # --- HYPE TRAIN DETECTION ---
     if not message.guild:
         pass
@@ -3477,17 +3343,9 @@ async def on_message(message):
 
     # --- SECRET CHAT LOGGING ---
     # Only log interactions with the bot (DMs, Mentions, Replies to bot, or Bot's own replies)
-    is_dm = isinstance(message.channel, discord.DMChannel)
-    is_mentioned = bot.user.mentioned_in(message)
-    is_reply_to_bot = False
-    if message.reference:
-        try:
-            ref_msg = await message.channel.fetch_message(message.reference.message_id)
-            is_reply_to_bot = (ref_msg.author == bot.user)
-        except: pass
-    
-    user_id = message.author.id
-    is_bot_self = (message.author == bot.user)
+    is_dm = ctx.is_dm
+    user_id = ctx.user_id
+    is_bot_self = ctx.is_self
     
     # --- DM COMMAND PROTECTION ---
     if is_dm and message.content.startswith('!') and not is_bot_self:
@@ -3502,10 +3360,11 @@ async def on_message(message):
                 color=0xFF5555
             )
             await message.channel.send(embed=embed)
-            return
+            return True
 
     # We only log if it's an interaction and NOT already in the log channel (to prevent loops)
-    if (is_dm or is_mentioned or is_reply_to_bot or is_bot_self) and SECRET_LOG_CHANNEL_ID and message.channel.id != SECRET_LOG_CHANNEL_ID:
+    # (the replied-to message is only fetched when logging is on)
+    if SECRET_LOG_CHANNEL_ID and message.channel.id != SECRET_LOG_CHANNEL_ID and (is_dm or ctx.is_mentioned or is_bot_self or await ctx.is_reply_to_bot()):
         try:
             log_chan = bot.get_channel(SECRET_LOG_CHANNEL_ID)
             if log_chan:
@@ -3534,16 +3393,15 @@ async def on_message(message):
         except Exception as e:
             logger.error(f"Error redirecting message to logging channel: {e}")
 
-    # Ignore messages from other bots (but allow ourselves for logging above)
-    if message.author.bot and message.author != bot.user:
-        return
-    # If it's ourselves, we stop here AFTER logging
-    if message.author == bot.user:
-        return
-        
+    # Ignore messages from other bots, and ourselves AFTER logging
+    return message.author.bot
+
+async def moderation_stage(ctx):
+    """Age check, then profanity/spam/media moderation; security checks run in the background."""
+    message = ctx.message
     # 0. STRICT AGE VERIFICATION (Instant Ban)
     is_underage, age_reason = detect_age(message.content)
-    if is_underage:
+    if is_underage and message.guild:
         try:
             logger.warning(f"Underage detection triggered for {message.author.name}: {age_reason}")
             
@@ -3561,10 +3419,22 @@ async def on_message(message):
 
             await message.guild.ban(message.author, reason=f"Underage User (COPPA/TOS): {age_reason}", delete_message_seconds=86400)
             await message.channel.send(f"🔨 **{message.author.mention}** has been BANNED. Reason: User is under 13.")
-            return
+            return True
         except Exception as e:
             logger.error(f"Failed to ban underage user {message.author.name}: {e}")
-    
+
+    # Profanity, spam, then attachments (see moderate_message)
+    if await moderate_message(message):
+        return True
+
+    # Check server security (invites, suspicious behavior) (RUN IN BACKGROUND - NON-BLOCKING)
+    asyncio.create_task(check_server_security(message))
+    return False
+
+async def pending_state_stage(ctx):
+    """Answers to a question the bot asked (tutorial follow-ups, appeals, YouTube proof)."""
+    message = ctx.message
+    user_id = ctx.user_id
     # Check if user has a pending state (waiting for response to a question)
     if user_id in user_states:
         try:
@@ -3590,7 +3460,7 @@ async def on_message(message):
                     await message.reply(response)
                 else:
                     await message.reply("I had trouble generating a response. Please try again!")
-                return
+                return True
 
             elif state['type'] == 'waiting_for_appeal_explanation':
                 explanation = message.content.strip()
@@ -3621,13 +3491,13 @@ async def on_message(message):
                     await message.reply("❌ Error: Appeal channel not found.")
                 
                 del user_states[user_id]
-                return
+                return True
             
             elif state['type'] == 'waiting_for_yt_verification':
                 if message.content.lower().strip() == 'cancel':
                     del user_states[user_id]
                     await message.reply("Verification cancelled.")
-                    return
+                    return True
 
                 async with message.channel.typing():
                     result_data, _ = await verify_youtube_proof(message, state['min_subs'])
@@ -3643,7 +3513,7 @@ async def on_message(message):
                          
                          await message.reply(f"⚠️ **Manual Verification Required**\n{admin_ping} please review.\n**Reason:** {reason}")
                          del user_states[user_id]
-                         return
+                         return True
 
                     final_response = None
                     if is_verified:
@@ -3720,7 +3590,7 @@ async def on_message(message):
                         except: pass
                 
                 del user_states[user_id]
-                return
+                return True
 
             elif state['type'] == 'waiting_for_detail_decision':
                 user_message = message.content.lower().strip()
@@ -3736,96 +3606,59 @@ async def on_message(message):
                     await message.reply("Got it! Let me know if you need help with anything else!")
                 
                 del user_states[user_id]
-                return
+                return True
 
         except Exception as state_err:
             logger.error(f"Error processing user state: {state_err}")
             await message.reply("❌ An error occurred. Please try again later.")
             if user_id in user_states:
                 del user_states[user_id]
-            return
-    
-    # Ignore messages that are replies to other users (not the bot)
-    if message.reference:
-        try:
-            referenced_msg = await message.channel.fetch_message(message.reference.message_id)
-            # If the reply is to someone other than the bot, ignore it
-            if referenced_msg.author != bot.user:
-                return
-        except:
-            pass  # If we can't fetch the message, continue normally
+            return True
+    return False
 
-    # Check for profanity and moderate (delete + warn + mute 24h)
-    if await moderate_profanity(message):
-        return
-    
-    # Check images/videos for inappropriate content
-    if await moderate_media(message):
-        return
-    
-    # Check for spam and moderate
-    if await check_and_moderate_spam(message):
+async def command_stage(ctx):
+    """Registered bot commands; the context is parsed once and invoked directly."""
+    command_ctx = await ctx.command()
+    if not command_ctx.valid:
+        return False
+    await bot.invoke(command_ctx)
+    return True
+
+async def file_command_stage(ctx):
+    """Any other !word is a file request (or a typo'd command). Either way it isn't chat."""
+    if not ctx.is_prefixed:
+        return False
+    if len(ctx.content) > 1:
+        await handle_file_command(ctx.message)
+    return True
+
+async def ai_routing_stage(ctx):
+    """Automatic resource suggestions, then chat for DMs, mentions and replies to the bot."""
+    message = ctx.message
+    user_id = ctx.user_id
+
+    # Ignore messages that are replies to other users (not the bot)
+    if message.reference and not await ctx.is_reply_to_bot() and await ctx.referenced() is not None:
         return
-    
-    # --- CONVERSATIONAL AUTOMATION (Currently Disabled to prevent 'random' messages) ---
-    # Check for political/chaotic conversation flow (RUN IN BACKGROUND - NON-BLOCKING)
-    # asyncio.create_task(moderate_topic_and_vibe(message))
-    
-    # Check server security (invites, suspicious behavior) (RUN IN BACKGROUND - NON-BLOCKING)
-    asyncio.create_task(check_server_security(message))
-    
-    # Trigger AI feedback on WIPs/Media automatically
-    # if await handle_automatic_media_review(message):
-    #     return
-        
+
     # Trigger AI resource suggestions automatically (SFX, Videos, Images)
     if await handle_automatic_resources(message):
         return
-
-    # Extra catch: If they are asking for an asset/file but the above didn't catch it
-    # if any(kw in message.content.lower() for kw in ['png', 'asset', 'send me', 'give me', 'find me']) and ('cloud' in message.content.lower() or 'overlay' in message.content.lower() or 'sfx' in message.content.lower()):
-    #     # Force the resource handler to run even if keywords/triggers were loose
-    #     if await handle_automatic_resources(message):
-    #         return
-        
-    # Trigger AI role suggestions if they mention software they don't have a role for
-    # if await handle_automatic_role_suggestion(message):
-    #     pass # Don't return, allow other things to happen
-        
-    # Trigger AI motivation if they feel stuck/burnt out
-    # if await handle_automatic_motivation(message):
-    #     return
-    
-    # Process commands first and stop if it's a command
-    await bot.process_commands(message)
-    ctx = await bot.get_context(message)
-    if ctx.valid:
-        return
-    
-    # Check if bot was mentioned or if this is a DM
-    is_dm = isinstance(message.channel, discord.DMChannel)
-    is_mentioned = bot.user.mentioned_in(message)
-    is_reply_to_bot = False
-    if message.reference:
-        try:
-            referenced_msg = await message.channel.fetch_message(message.reference.message_id)
-            is_reply_to_bot = referenced_msg.author == bot.user
-        except:
-            pass
     
     # Only respond if mentioned, in DM, or replying to bot
-    if not is_dm and not is_mentioned and not is_reply_to_bot:
+    is_dm = ctx.is_dm
+    if not is_dm and not ctx.is_mentioned and not await ctx.is_reply_to_bot():
         return
 
-    # If the message doesn't start with a command prefix, treat it as a chat message
-    if not message.content.startswith('!'):
+    # Commands and file requests were handled by earlier stages
+    if not ctx.is_prefixed:
         prompt_lower = message.content.lower()
+        hits = triggers.scan(prompt_lower)
         
         # *** SHADOW COUNCIL (MULTI-AGENT REVIEW) - PRIORITY #0.1 ***
-        council_triggers = ['council', 'review', 'deep audit', 'analyze deeply', 'expert opinion', 'shadow council']
-        is_project_req = any(kw in prompt_lower for kw in ['project', 'app', 'website', 'repository', 'system', 'build', 'architect']) and any(w in prompt_lower for w in ['make', 'generate', 'build', 'want', 'need', 'insane'])
+        is_project_req = 'project_noun' in hits and 'project_verb' in hits
         
-        if any(kw in prompt_lower for kw in council_triggers) or (is_project_req and 'insane' in prompt_lower):
+        if 'council' in hits or (is_project_req and 'insane' in prompt_lower):
             status_msg = await message.reply("🕵️ **Shadow Council**: Summoning the Architect, Aestheticist, and Strategist...")
             async with message.channel.typing():
                 try:
@@ -3852,9 +3685,7 @@ async def on_message(message):
                     except: pass
         
         # *** PROJECT ARCHITECT (AUTO-ZIP) - PRIORITY #0.5 ***
-        architect_keywords = ['project', 'app', 'website', 'repository', 'zip', 'framework', 'system', 'site']
-        architect_verbs = ['build', 'architect', 'generate', 'make', 'want', 'need', 'setup', 'create']
-        if any(v in prompt_lower for v in architect_verbs) and any(kw in prompt_lower for kw in architect_keywords):
+        if 'architect_verb' in hits and 'architect' in hits:
             status_msg = await message.reply("🏗️ **Prime Architect**: Designing your system architecture...")
             async with message.channel.typing():
                 try:
@@ -3903,9 +3734,9 @@ async def on_message(message):
             prompt = message.content.replace(f'<@{bot.user.id}>', '').strip()
             await message.channel.send("🎨 Generating image...")
             try:
-                image_path = await generate_image(prompt)
-                if image_path and os.path.exists(image_path):
-                    await message.channel.send(f"{message.author.mention}, here's your image:", file=discord.File(image_path))
+                asset = await generate_image(prompt)
+                if asset:
+                    await message.channel.send(f"{message.author.mention}, here's your image:", file=asset.file())
                     return
             except Exception as e:
                 logger.error(f"Image error: {str(e)}")
@@ -3913,8 +3744,7 @@ async def on_message(message):
             return
         
         # *** THE PRIME EYE (VISUAL INTELLIGENCE) - PRIORITY #1.5 ***
-        vision_triggers = ['look', 'see', 'what', 'analyze', 'fix', 'check', 'read', 'solve', 'price', 'identify', 'where', 'tell me', 'who']
-        if message.attachments and (any(kw in prompt_lower for kw in vision_triggers) or 'prime eye' in prompt_lower):
+        if message.attachments and 'vision' in hits:
             attachment = message.attachments[0]
             if any(attachment.filename.lower().endswith(ext) for ext in ['png', 'jpg', 'jpeg', 'webp']):
                 async with message.channel.typing():
@@ -3944,11 +3774,8 @@ async def on_message(message):
                         return
 
         # *** IMAGE SEARCH - PRIORITY #2 ***
-        search_words = ['gimme', 'give me', 'send me', 'get me', 'find me', 'show me', 'find', 'search', 'get', 'show', 'view', 'who is', 'what is', 'link']
-        image_keywords = ['png', 'jpg', 'jpeg', 'image', 'img', 'picture', 'photo', 'gif', 'webp']
-        
-        has_search_word = any(w in prompt_lower for w in search_words)
-        has_image_keyword = any(w in prompt_lower for w in image_keywords)
+        has_search_word = 'search' in hits
+        has_image_keyword = 'image' in hits
         
         if has_search_word and has_image_keyword:
             # Extract search query
@@ -3967,9 +3794,9 @@ async def on_message(message):
             if search_query:
                 await message.channel.send("🔍 Searching for images...")
                 try:
-                    image_path = await search_and_download_image(search_query, limit=1)
-                    if image_path and os.path.exists(image_path):
-                        await message.channel.send(f"fulfilled your request. found/created this **{search_query}** for you.", file=discord.File(image_path), view=FindMoreImageView(search_query))
+                    asset = await search_and_download_image(search_query, limit=1)
+                    if asset:
+                        await message.channel.send(f"fulfilled your request. found/created this **{search_query}** for you.", file=asset.file(), view=FindMoreImageView(search_query))
                         return
                 except Exception as e:
                     logger.error(f"Image search error: {str(e)}")
@@ -3977,13 +3804,10 @@ async def on_message(message):
                 return
         
         # *** DISCORD IDENTITY (PFP/Profile) - PRIORITY #2.1 ***
-        pfp_keywords = ['pfp', 'avatar', 'profile picture', 'profile pic']
-        stat_keywords = ['stats', 'info', 'profile', 'bio', 'about me', 'discord acc', 'prof', 'account']
+        is_pfp_req = 'pfp' in hits
+        is_stat_req = 'stat' in hits
         
-        is_pfp_req = any(kw in prompt_lower for kw in pfp_keywords)
-        is_stat_req = any(kw in prompt_lower for kw in stat_keywords)
-        
-        if (is_pfp_req or is_stat_req) and any(verb in prompt_lower for verb in ['show', 'get', 'give', 'send', 'view', 'what is', 'who is', 'shoe', 'find', 'check', 'look', 'display', 'sent', 'look up']):
+        if (is_pfp_req or is_stat_req) and 'identity_verb' in hits:
             target_user = None
             
             # 1. Check for mentions
@@ -4044,8 +3868,7 @@ async def on_message(message):
                     return
         
         # *** AE EXPRESSION GHOST - PRIORITY #2.15 ***
-        ae_expr_keywords = ['expression', 'ae code', 'after effects code', 'wiggle', 'bounce', 'loopout', 'posterize', 'smooth', 'velocity code', 'shake expression', 'script code']
-        if any(kw in prompt_lower for kw in ae_expr_keywords) and ('how to' in prompt_lower or 'give' in prompt_lower or 'get' in prompt_lower or 'show' in prompt_lower or 'code' in prompt_lower or 'expression' in prompt_lower or 'script' in prompt_lower):
+        if 'ae_expr' in hits and ('how to' in prompt_lower or 'give' in prompt_lower or 'get' in prompt_lower or 'show' in prompt_lower or 'code' in prompt_lower or 'expression' in prompt_lower or 'script' in prompt_lower):
             async with message.channel.typing():
                 try:
                     ghost_prompt = f"Act as an After Effects Technical Expert. Provide only the JavaScript expression code for: '{message.content}'. Briefly explain how to apply it (e.g., 'Alt-Click the Position stopwatch'). Keep it high-end and minimalist. No fluff. Wrap the code in a clean markdown block."
@@ -4064,8 +3887,7 @@ async def on_message(message):
                     logger.error(f"Expression Ghost Error: {e}")
         
         # *** DECISION ARCHITECT - PRIORITY #2.16 ***
-        decision_keywords = ['decide', 'choose', 'choice', 'better', 'comparison', 'compare', 'which one', 'should i', 'buy', 'get']
-        if any(kw in prompt_lower for kw in decision_keywords) and ('help' in prompt_lower or 'me' in prompt_lower or 'decide' in prompt_lower or 'compare' in prompt_lower):
+        if 'decision' in hits and ('help' in prompt_lower or 'me' in prompt_lower or 'decide' in prompt_lower or 'compare' in prompt_lower):
             async with message.channel.typing():
                 try:
                     # Search for real-time market/tech data to backup the decision
@@ -4090,8 +3912,7 @@ async def on_message(message):
                     logger.error(f"Decision Architect Error: {e}")
 
         # *** INTELLIGENCE SCOUT - PRIORITY #2.17 ***
-        intel_triggers = ['leak', 'insider info', 'whispers', 'intel', 'scout info', 'research leak']
-        if any(kw in prompt_lower for kw in intel_triggers) and not message.content.startswith('!'):
+        if 'intel' in hits and not message.content.startswith('!'):
             async with message.channel.typing():
                 try:
                     query = message.content.replace(f'<@{bot.user.id}>', '').strip()
@@ -4111,8 +3932,7 @@ async def on_message(message):
                     logger.error(f"Auto-Intel Error: {e}")
         
         # *** YOUTUBE VIDEO SEARCH - PRIORITY #2.6 ***
-        video_keywords = ['video', 'song', 'music', 'track', 'phonk', 'beat', 'clip', 'youtube', 'yt', 'ep', 'episode', 'series', 'part', 'movie']
-        if (has_search_word or any(k in prompt_lower for k in ['ep', 'episode', 'part'])) and any(kw in prompt_lower for kw in video_keywords):
+        if (has_search_word or 'episode' in hits) and 'video' in hits:
             # Extract search query
             search_query = None
             clean_text = message.content.replace(f'<@{bot.user.id}>', '').strip()
@@ -4144,8 +3964,7 @@ async def on_message(message):
                 return
 
         # *** YOUTUBE STATS/ANALYTICS - PRIORITY #2.5 ***
-        yt_stat_keywords = ['stats', 'analytics', 'subs', 'subscribers', 'views', 'subscriber', 'chanel', 'channel info']
-        is_yt_stat_request = any(kw in prompt_lower for kw in yt_stat_keywords) and ('yt' in prompt_lower or 'youtube' in prompt_lower or 'channel' in prompt_lower or 'chanel' in prompt_lower)
+        is_yt_stat_request = 'yt_stat' in hits and ('yt' in prompt_lower or 'youtube' in prompt_lower or 'channel' in prompt_lower or 'chanel' in prompt_lower)
         
         # Also catch follow-ups like "ahh mb [name]" or just a channel name after asking for stats
         is_correction = False
@@ -4189,36 +4008,18 @@ async def on_message(message):
         
         # NOW handle other messages
         is_dm = isinstance(message.channel, discord.DMChannel)
-        is_dm_message = is_dm
-        is_mentioned = bot.user.mentioned_in(message)
         
         # *** TUTORIALS & HELP - PRIORITY #4 ***
-        help_words = ['help', 'tutorial', 'how to', 'teach', 'guide', 'learn', 'explain', 'show me', 'assist', 'how do i', 'how can i', 'how do you', 'create', 'make', 'how do', 'show me']
-        is_help = any(re.search(r'\b' + re.escape(word) + r'\b', prompt_lower) for word in help_words)
-        
-        editing_kws = ['edit', 'effect', 'render', 'color', 'grade', 'video', 'after effects', 'ae', 'premiere', 'pr', 'photoshop', 'ps', 'resolve', 'davinci', 'capcut', 'topaz', 'cc', 'grading', 'correction', 'effects', 'transition', 'animation', 'vfx', 'motion', 'mask', 'keyframe']
-        is_editing_help = is_help and any(re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower) for kw in editing_kws)
+        is_help = 'help' in hits
+        is_editing_help = is_help and 'editing_help' in hits
         
         # PRIORITY: If this is editing help, ALWAYS ask which software FIRST before generating anything
         if is_editing_help:
             # Check if they already have a pending state
             if user_id not in user_states or user_states[user_id]['type'] != 'waiting_for_software':
                 # NEW: Detect if software is already mentioned to skip the question
-                softwares = {
-                    'after effects': 'After Effects', 'ae': 'After Effects', 'afterffeffects': 'After Effects',
-                    'premiere': 'Premiere Pro', 'pr': 'Premiere Pro',
-                    'photoshop': 'Photoshop', 'ps': 'Photoshop',
-                    'resolve': 'DaVinci Resolve', 'davinci': 'DaVinci Resolve',
-                    'capcut': 'CapCut', 'topaz': 'Topaz',
-                    'final cut': 'Final Cut Pro', 'fcp': 'Final Cut Pro',
-                    'alight motion': 'Alight Motion', 'am': 'Alight Motion'
-                }
-                
-                mentioned_software = None
-                for kw, name in softwares.items():
-                    if re.search(r'\b' + re.escape(kw) + r'\b', prompt_lower):
-                        mentioned_software = name
-                        break
+                mentioned = hits.get('software', ())
+                mentioned_software = next((name for kw, name in SOFTWARE_NAMES.items() if kw in mentioned), None)
                 
                 if mentioned_software:
                     logger.info(f"Software '{mentioned_software}' already mentioned by {message.author.name}, skipping question.")
@@ -4288,7 +4089,7 @@ async def on_message(message):
                     # Check if attachment is a video (but reject .mov files)
                     elif any(filename_lower.endswith(ext) for ext in ['.mp4', '.avi', '.mkv', '.webm', '.flv', '.wmv', '.m4v']):
                         logger.info(f'Downloading video from {message.author.name}: {attachment.filename}')
-                        video_bytes, error = await download_video(attachment.url, attachment.filename)
+                        video_bytes, error = await download_video(attachment.url, attachment.filename, expected_size=attachment.size)
                         if error:
                             await message.reply(f"❌ {error}")
                             return
@@ -4352,11 +4153,9 @@ async def on_message(message):
                     prompt_val = action_input.get("prompt") if isinstance(action_input, dict) else action_input
                     if prompt_val:
                         async with message.channel.typing():
-                            img_path = await generate_image(prompt_val)
-                            if img_path and os.path.exists(img_path):
-                                await message.reply(content=f"fulfilled your request. found/created this **{prompt_val}** for you.", file=discord.File(img_path), view=FindMoreImageView(prompt_val))
-                                try: os.remove(img_path)
-                                except: pass
+                            asset = await generate_image(prompt_val)
+                            if asset:
+                                await message.reply(content=f"fulfilled your request. found/created this **{prompt_val}** for you.", file=asset.file(), view=FindMoreImageView(prompt_val))
                                 tool_executed = True
                 except Exception as tool_e:
                     logger.error(f"Failed to execute auto-tool: {tool_e}")
@@ -4387,10 +4186,6 @@ async def on_message(message):
                     ext_map = {"python": "py", "javascript": "js", "typescript": "ts", "html": "html", "css": "css", "json": "json", "bash": "sh", "cpp": "cpp"}
                     ext = ext_map.get(lang, lang)
                     
-                    with tempfile.NamedTemporaryFile(suffix=f".{ext}", delete=False, mode='w', encoding='utf-8') as tf:
-                        tf.write(code)
-                        temp_path = tf.name
-                    
                     embed = discord.Embed(
                         title="📜 LOGIC EXPORT",
                         description=f"Generated results for **{lang.upper()}**.",
@@ -4398,11 +4193,7 @@ async def on_message(message):
                     )
                     embed.set_footer(text="Prime | Technical Export")
                     
-                    await message.channel.send(embed=embed, file=discord.File(temp_path, filename=f"logic_{os.urandom(2).hex()}.{ext}"))
-                    
-                    # Cleanup
-                    try: os.remove(temp_path)
-                    except: pass
+                    await message.channel.send(embed=embed, file=text_file(code, f"logic_{os.urandom(2).hex()}.{ext}"))
 
             logger.info(f'Responded to {message.author.name}' + (' (video analysis)' if is_video else ' (image analysis)' if image_bytes else ''))
             
@@ -4422,17 +4213,31 @@ async def on_message(message):
             )
             
             # --- UPDATE USER MEMORY ---
-            # Update interaction count and trigger personality analysis periodically (every 5 interactions)
-            user_interaction_mem = db_manager.get_user_memory(message.author.id)
-            icount = (user_interaction_mem.get('interaction_count', 0) if user_interaction_mem else 0) + 1
-            db_manager.update_user_memory(message.author.id, message.author.name) # Increments count in DB
-            
-            if icount % 5 == 0:
-                asyncio.create_task(update_user_personality(message.author.id, message.author.name))
+            # Counted in the cached context; the history writer adds the same increment in the DB
+            user_context = await brain.conversations.get(message.author.id, message.author.name)
+            user_context.bump_interactions()
 
         except Exception as e:
             logger.error(f'Error in chat response: {str(e)}')
 
+# --- MESSAGE PIPELINE ---
+# One pass per message, in order; a stage returning True stops the rest.
+# Prefilter and moderation fail closed: if they break, nothing after them runs.
+message_pipeline = MessagePipeline(bot)
+message_pipeline.add("prefilter", prefilter_stage, stop_on_error=True)
+message_pipeline.add("moderation", moderation_stage, stop_on_error=True)
+message_pipeline.add("xp", xp_stage)
+message_pipeline.add("pending_state", pending_state_stage)
+message_pipeline.add("commands", command_stage)
+message_pipeline.add("file_commands", file_command_stage)
+message_pipeline.add("ai_routing", ai_routing_stage)
+metrics.register(message_pipeline.samples)
+
+@bot.event
+async def on_message(message):
+    """Handle all messages, including those that aren't commands (see message_pipeline)."""
+    await message_pipeline.run(message)
+
 @bot.command(name="help", aliases=["commands", "cmds"])
 async def help_command(ctx):
     """Show all available commands with detailed descriptions."""
@@ -5396,16 +5201,11 @@ async def manual_sync(ctx):
     except Exception as e:
         await ctx.send(f"❌ Failed to sync: {e}")
 
-@bot.listen('on_message')
-async def file_command_handler(message):
+async def handle_file_command(message):
     """
-    Listens for messages that start with ! and checks if they match any filenames.
+    Checks whether a message that starts with ! matches any filenames.
     If a match is found, sends the file to the user's DMs.
     """
-    # Ignore messages from the bot itself
-    if message.author == bot.user:
-        return
-
     # Check if message starts with ! and is longer than 1 character
     if not message.content.startswith('!') or len(message.content) <= 1:
         return
@@ -5680,7 +5480,7 @@ async def file_command_handler(message):
 async def ban_command(ctx, member: discord.Member = None):
     """Ban a user from the server - Server admin/inviter can use this."""
     # Check if user is server admin (inviter, owner, or has admin perms)
-    if not is_server_admin(ctx.author, ctx.guild):
+    if not await is_server_admin(ctx.author, ctx.guild):
         admin_name = get_server_admin_name(ctx.guild)
         await ctx.send(f"{ctx.author.mention}, only **{admin_name}** (the person who added me) or server admins can use this command.")
         return
@@ -5702,7 +5502,7 @@ async def ban_command(ctx, member: discord.Member = None):
             return
         
         # Don't allow banning BMR or the server admin
-        if 'bmr' in member.name.lower() or is_server_admin(member, ctx.guild):
+        if 'bmr' in member.name.lower() or await is_server_admin(member, ctx.guild):
             await ctx.send("❌ I can't ban this user!")
             return
         
@@ -5745,7 +5545,7 @@ async def ban_command(ctx, member: discord.Member = None):
 async def timeout_command(ctx, member: discord.Member = None, duration: str = None):
     """Timeout a user for a specified duration - Server admin/inviter can use this."""
     # Check if user is server admin (inviter, owner, or has admin perms)
-    if not is_server_admin(ctx.author, ctx.guild):
+    if not await is_server_admin(ctx.author, ctx.guild):
         admin_name = get_server_admin_name(ctx.guild)
         await ctx.send(f"{ctx.author.mention}, only **{admin_name}** (the person who added me) or server admins can use this command.")
         return
@@ -5791,7 +5591,7 @@ async def timeout_command(ctx, member: discord.Member = None, duration: str = No
             return
         
         # Don't allow timing out BMR or the server admin
-        if 'bmr' in member.name.lower() or is_server_admin(member, ctx.guild):
+        if 'bmr' in member.name.lower() or await is_server_admin(member, ctx.guild):
             await ctx.send("❌ I can't timeout this user!")
             return
         
@@ -5846,7 +5646,7 @@ async def mute_command(ctx, member: discord.Member = None, duration: str = None)
 async def unmute_command(ctx, member: discord.Member = None):
     """Remove timeout from a user - Server admin/inviter can use this."""
     # Check if user is server admin (inviter, owner, or has admin perms)
-    if not is_server_admin(ctx.author, ctx.guild):
+    if not await is_server_admin(ctx.author, ctx.guild):
         admin_name = get_server_admin_name(ctx.guild)
         await ctx.send(f"{ctx.author.mention}, only **{admin_name}** (the person who added me) or server admins can use this command.")
         return
@@ -6338,13 +6138,13 @@ async def get_asset(ctx, category=None, *, query=None):
             Return ONLY the JSON.
             """
             
-            response = gemini_client.models.generate_content(
+            response = await safe_generate_content(
                 model=PRIMARY_MODEL,
                 contents=asset_prompt,
                 config=types.GenerateContentConfig(response_mime_type="application/json")
             )
             
-            if response.text:
+            if response and response.text:
                 data = json.loads(response.text)
                 reco = data.get('recommendation', 'Explore these resources to find the perfect asset for your project.')
                 sites = data.get('sites', {})
@@ -6427,13 +6227,15 @@ async def sync_beat_map(ctx):
             """
             
             # Using the same bytes-sending logic as video/images but for audio
-            response = gemini_client.models.generate_content(
+            response = await safe_generate_content(
                 model=PRIMARY_MODEL,
                 contents=[
                     types.Part.from_bytes(data=audio_bytes, mime_type=attachment.content_type or "audio/mpeg"),
                     prompt
                 ]
             )
+            if not response or not response.text:
+                return await ctx.send("❌ Couldn't map that track right now. Try again in a bit.")
             
             embed = discord.Embed(
                 title="🎼 BEAT SYNC MAP",
@@ -6634,7 +6436,7 @@ async def aesthetic_overlay_command(ctx, aesthetic: str = None):
 @bot.command(name="setup_updates")
 async def setup_updates(ctx, channel: discord.TextChannel = None):
     """Set the channel for bot updates. Usage: !setup_updates #channel"""
-    if not is_server_admin(ctx.author, ctx.guild):
+    if not await is_server_admin(ctx.author, ctx.guild):
         await ctx.reply("🚫 Only server admins can configure bot updates.")
         return
         
@@ -6649,7 +6451,7 @@ async def setup_updates(ctx, channel: discord.TextChannel = None):
 @bot.command(name="appeal_link")
 async def appeal_link(ctx, member: discord.Member = None):
     """Send an appeal button to a member. Usage: !appeal_link @user"""
-    if not is_server_admin(ctx.author, ctx.guild):
+    if not await is_server_admin(ctx.author, ctx.guild):
         return
         
     if not member:
@@ -6763,7 +6565,13 @@ async def clout_analysis(ctx):
     
     async with ctx.typing():
         try:
-            file_bytes = await attachment.read()
+            if is_video:
+                file_bytes, error = await download_video(attachment.url, attachment.filename, expected_size=attachment.size)
+            else:
+                file_bytes, error = await download_image(attachment.url), None
+            if not file_bytes:
+                await ctx.send(f"❌ {error or 'Could not read that file.'}")
+                return
             prompt = """
             Analyze this creative work for 'Viral Clout Potential'. 
             As an elite social media strategist, provide:
@@ -6843,9 +6651,7 @@ async def identity_report(ctx, member: discord.Member = None):
         bio = await get_gemini_response(prompt, ctx.author.id, username=ctx.author.name, guild_id=ctx.guild.id if ctx.guild else None)
         
         # Report as file
-        with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, mode='w', encoding='utf-8') as tf:
-            tf.write(f"PRIME IDENTITY REPORT\n{'='*30}\nSUBJECT: {member.name}\nDesignation: {user_memory.get('vibe', 'Unknown').upper()}\n\n{bio}")
-            temp_path = tf.name
+        report = f"PRIME IDENTITY REPORT\n{'='*30}\nSUBJECT: {member.name}\nDesignation: {user_memory.get('vibe', 'Unknown').upper()}\n\n{bio}"
             
         embed = discord.Embed(
             title="📑 CREATIVE BIO EXPORT",
@@ -6853,10 +6659,7 @@ async def identity_report(ctx, member: discord.Member = None):
             color=0x00FFB4
         )
         embed.set_footer(text="Prime | Bio Export")
-        await ctx.send(embed=embed, file=discord.File(temp_path, filename=f"bio_{member.name.lower()}.txt"))
-        
-        try: os.remove(temp_path)
-        except: pass
+        await ctx.send(embed=embed, file=text_file(report, f"bio_{member.name.lower()}.txt"))
 
 @bot.command(name="snipe")
 async def chat_snipe(ctx):
@@ -6995,9 +6798,7 @@ async def project_structure_Report(ctx, *, type: str = "Video Edit"):
             response = await get_gemini_response(prompt, ctx.author.id, username=ctx.author.name, guild_id=ctx.guild.id if ctx.guild else None)
             
             # Report as file for the "tuff" factor
-            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, mode='w', encoding='utf-8') as tf:
-                tf.write(f"PRIME PROJECT STRUCTURE\n{'='*40}\nTYPE: {type.upper()}\n\n{response}")
-                temp_path = tf.name
+            report = f"PRIME PROJECT STRUCTURE\n{'='*40}\nTYPE: {type.upper()}\n\n{response}"
                 
             embed = discord.Embed(
                 title="📁 PROJECT STRUCTURE",
@@ -7005,10 +6806,7 @@ async def project_structure_Report(ctx, *, type: str = "Video Edit"):
                 color=0x00FFB4
             )
             embed.set_footer(text="Prime | Organization")
-            await ctx.send(embed=embed, file=discord.File(temp_path, filename=f"structure_{type.lower().replace(' ', '_')}.txt"))
-            
-            try: os.remove(temp_path)
-            except: pass
+            await ctx.send(embed=embed, file=text_file(report, f"structure_{type.lower().replace(' ', '_')}.txt"))
         except Exception as e:
             await ctx.send(BOT_ERROR_MSG)
 
@@ -7033,9 +6831,7 @@ async def technical_blueprint(ctx, *, query: str = None):
             response = await get_gemini_response(prompt, ctx.author.id, username=ctx.author.name, guild_id=ctx.guild.id if ctx.guild else None)
             
             # Use Report logic
-            with tempfile.NamedTemporaryFile(suffix=".txt", delete=False, mode='w', encoding='utf-8') as tf:
-                tf.write(f"PRIME EXPRESSION GUIDE\n{'='*40}\nQUERY: {query.upper()}\n\n{response}")
-                temp_path = tf.name
+            report = f"PRIME EXPRESSION GUIDE\n{'='*40}\nQUERY: {query.upper()}\n\n{response}"
  
             embed = discord.Embed(
                 title="⚙️ EXPRESSION GUIDE",
@@ -7043,10 +6839,7 @@ async def technical_blueprint(ctx, *, query: str = None):
                 color=0x00FFB4
             )
             embed.set_footer(text="Prime | Logic & Technical")
-            await ctx.send(embed=embed, file=discord.File(temp_path, filename=f"guide_{os.urandom(2).hex()}.txt"))
-            
-            try: os.remove(temp_path)
-            except: pass
+            await ctx.send(embed=embed, file=text_file(report, f"guide_{os.urandom(2).hex()}.txt"))
         except Exception as e:
             await ctx.send(BOT_ERROR_MSG)
 
@@ -7211,8 +7004,8 @@ async def secret_override(ctx):
 async def manual_rotate(ctx):
     """Creator only: Manually cycle API keys."""
     if 'bmr' not in ctx.author.name.lower(): return
-    rotate_gemini_key()
-    await ctx.send(f"🔄 **Manual Rotation**: Switched to key position {current_key_index + 1}.")
+    brain.rotate_gemini_key()
+    await ctx.send(f"🔄 **Manual Rotation**: Switched to key position {brain.current_key_index + 1}.")
 
 @bot.command(name="setrules")
 @commands.has_permissions(administrator=True)
@@ -1,13 +1,11 @@
 import os
 import logging
-import random
 import re
 import json
 import asyncio
 import io
 import time
 import hashlib
-import aiohttp
 import tempfile
 import requests
 import httpx
@@ -17,6 +15,16 @@ from PIL import Image, ImageDraw, ImageFont
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
 from database import db_manager
+from config import GROQ_BASE_URL, GEMINI_BASE_URL
+from concurrency import SingleFlight, Timings, request_key
+from conversation import conversations
+from prompt_builder import PromptBuilder, compact_turn, truncate_to_tokens
+from reflection import ReflectionScheduler
+from search import search_service, needs_web_search
+from router import ProviderRouter
+from breakers import breakers, CircuitOpen
+from keywords import KeywordEngine
+import media
 
 load_dotenv()
 
@@ -26,6 +34,8 @@ logger = logging.getLogger('prime_brain')
 PRIMARY_MODEL = "gemini-3-flash-preview"
 FALLBACK_MODEL = "gemini-3-flash-preview"
 SECRET_LOG_CHANNEL_ID = int(os.getenv("SECRET_LOG_CHANNEL_ID", "0"))
+SUMMARY_BATCH_TURNS = int(os.getenv("SUMMARY_BATCH_TURNS", "8")) # Old turns folded into the rolling summary at once
+SEARCH_DEADLINE_MS = int(os.getenv("SEARCH_DEADLINE_MS", "800")) # Replies stop waiting for web research after this
 
 # --- API KEY MANAGEMENT ---
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
@@ -43,9 +53,15 @@ def find_keys():
 GEMINI_KEYS = find_keys()
 current_key_index = 0
 
+def make_gemini_client(api_key):
+    http_options = {'api_version': 'v1beta'}
+    if GEMINI_BASE_URL:
+        http_options['base_url'] = GEMINI_BASE_URL
+    return genai.Client(api_key=api_key, http_options=http_options)
+
 if GEMINI_KEYS:
     logger.info(f"✅ BRAIN: Detected {len(GEMINI_KEYS)} Gemini API Key(s).")
-    gemini_client = genai.Client(api_key=GEMINI_KEYS[current_key_index], http_options={'api_version': 'v1beta'})
+    gemini_client = make_gemini_client(GEMINI_KEYS[current_key_index])
 else:
     logger.error("❌ BRAIN: NO Gemini API KEY DETECTED.")
     gemini_client = None
@@ -55,50 +71,78 @@ if GROQ_API_KEY:
 else:
     logger.warning("⚠️ BRAIN: No Groq API Key found. Falling back to Gemini for all tasks.")
 
-async def get_groq_response(prompt, system_prompt, model=GROQ_MODEL):
-    """Call Groq API for lightning fast chat responses."""
+gemini_breaker = breakers.for_url(GEMINI_BASE_URL or "https://generativelanguage.googleapis.com", name="gemini")
+
+# Identical in-flight requests share one upstream call (one quota unit per burst)
+gemini_flights = SingleFlight("gemini")
+groq_flights = SingleFlight("groq")
+
+# Rolling latency/error stats per provider:model; priors are rough cold-start guesses
+provider_router = ProviderRouter()
+provider_router.register(f"groq:{GROQ_MODEL}", 2.0)
+provider_router.register(f"gemini:{PRIMARY_MODEL}", 6.0)
+
+async def groq_chat_completion(messages, model=GROQ_MODEL, temperature=0.7, timeout=30.0):
+    """Run a Groq chat completion, coalescing identical concurrent requests."""
     if not GROQ_API_KEY:
         return None
-    
-    url = "https://api.groq.com/openai/v1/chat/completions"
+    key = request_key("groq", model, messages, temperature)
+    return await groq_flights.do(key, lambda: _groq_chat_completion(messages, model, temperature, timeout))
+
+async def _groq_chat_completion(messages, model, temperature, timeout):
+    url = f"{GROQ_BASE_URL}/chat/completions"
+    breaker = breakers.for_url(url, name="groq")
+    if not breaker.allow():
+        # Fail fast; the router falls over to Gemini
+        return None
     headers = {
         "Authorization": f"Bearer {GROQ_API_KEY}",
         "Content-Type": "application/json"
     }
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt}
-        ],
-        "temperature": 0.7
-    }
+    payload = {"model": model, "messages": messages, "temperature": temperature}
     
     async with httpx.AsyncClient() as client:
         try:
-            response = await client.post(url, headers=headers, json=payload, timeout=30.0)
+            response = await client.post(url, headers=headers, json=payload, timeout=timeout)
+            breaker.record(response.status_code != 429 and response.status_code < 500)
             if response.status_code == 200:
                 data = response.json()
                 return data["choices"][0]["message"]["content"]
+            elif response.status_code == 429:
+                logger.warning("⚠️ Groq Rate Limited.")
             else:
                 logger.error(f"Groq API error: {response.status_code} - {response.text}")
-                return None
+            return None
         except Exception as e:
+            breaker.record_failure()
             logger.error(f"Groq Request failed: {e}")
             return None
 
+async def get_groq_response(prompt, system_prompt, model=GROQ_MODEL):
+    """Call Groq API for lightning fast chat responses."""
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt}
+    ]
+    return await groq_chat_completion(messages, model=model, temperature=0.7)
+
 def rotate_gemini_key():
     global current_key_index, gemini_client
     if len(GEMINI_KEYS) <= 1:
         return False
     current_key_index = (current_key_index + 1) % len(GEMINI_KEYS)
-    gemini_client = genai.Client(api_key=GEMINI_KEYS[current_key_index], http_options={'api_version': 'v1beta'})
+    gemini_client = make_gemini_client(GEMINI_KEYS[current_key_index])
     logger.info(f"🔄 Switched to API Key Position: {current_key_index + 1}")
     return True
 
 async def safe_generate_content(model, contents, config=None):
     if not GEMINI_KEYS:
         return None
+    key = request_key("gemini", model, contents, config)
+    # Every key hits the same upstream, so one breaker covers the whole rotation
+    return await gemini_flights.do(key, lambda: gemini_breaker.call(lambda: _generate_content(model, contents, config)))
+
+async def _generate_content(model, contents, config=None):
     last_err = None
     # Unify logic: only rotate keys, don't double-loop models here
     for _ in range(len(GEMINI_KEYS)):
@@ -185,9 +229,11 @@ RUDE_KEYWORDS = {
     "get lost", "gtfo", "you suck", "you're useless", "you're trash", "you're garbage"
 }
 
+rudeness = KeywordEngine("rudeness")
+rudeness.add('rude', RUDE_KEYWORDS)
+
 def detect_rudeness(text):
-    text_lower = text.lower()
-    return any(keyword in text_lower for keyword in RUDE_KEYWORDS)
+    return 'rude' in rudeness.scan(text.lower())
 
 def get_rude_system_prompt():
     return """You are "Prime". Someone just tried to be rude to you.
@@ -239,41 +285,53 @@ Your task is to break down complex problems into strategic phases.
 # --- CORE AI FUNCTION ---
 async def get_gemini_response(prompt, user_id, username=None, image_bytes=None, is_tutorial=False, software=None, brief=False, model=None, mode=None, use_thought=False, guild_id=None):
     try:
-        # 1. Load User Memory from Database
-        user_memory = db_manager.get_user_memory(user_id)
+        user_question = prompt if prompt else "Please analyze this and help me."
+        user_context = f"\n\n[Message from: {username}]" if username else ""
+        timings = Timings()
+
+        # 1. Fan out: user memory, guild settings and (if needed) web research load concurrently
+        async def no_settings():
+            return {}
+        search_task = None
+        if needs_web_search(user_question) and not is_tutorial:
+            logger.info(f"🔎 SEARCH INTENT DETECTED: {user_question}")
+            # Runs as its own task so a late answer still lands in the search cache
+            search_task = asyncio.create_task(timings.measure("search", search_google(user_question)))
+        context, all_settings = await asyncio.gather(
+            timings.measure("memory", conversations.get(user_id, username)),
+            timings.measure("settings", asyncio.to_thread(db_manager.get_guild_settings, guild_id) if guild_id else no_settings()),
+        )
+
+        user_memory = context.memory
         memory_context = ""
+        summary_context = ""
         if user_memory:
             profile_summary = user_memory.get("profile_summary", "")
             vibe = user_memory.get("vibe", "neutral")
-            notes = user_memory.get("notes", "")
+            notes = user_memory.get("notes") or ""
             memory_context = f"\n\n[USER MEMORY: '{vibe}'. Profile: {profile_summary}. Notes: {notes}]"
+            if user_memory.get("history_summary"):
+                summary_context = f"\n\n[EARLIER CONVERSATION SUMMARY: {user_memory['history_summary']}]"
         
-        # 2. Check for Server Aesthetic Overlay & System Prompt
+        # 2. Server Aesthetic Overlay & System Prompt
         overlay_context = ""
-        custom_system = None
-        if guild_id:
-            all_settings = db_manager.get_guild_setting(guild_id, "all_settings", {})
-            aesthetic = all_settings.get("aesthetic_overlay")
-            if aesthetic:
-                overlay_context = f"\n\n[SERVER AESTHETIC OVERLAY: {aesthetic.upper()}. Adopt this tone.]"
-            custom_system = all_settings.get("custom_system_prompt")
-        
-        # 3. Build the full prompt with system context
-        user_question = prompt if prompt else "Please analyze this and help me."
-        user_context = f"\n\n[Message from: {username}]" if username else ""
+        all_settings = all_settings.get("all_settings", {})
+        aesthetic = all_settings.get("aesthetic_overlay")
+        if aesthetic:
+            overlay_context = f"\n\n[SERVER AESTHETIC OVERLAY: {aesthetic.upper()}. Adopt this tone.]"
+        custom_system = all_settings.get("custom_system_prompt")
         
         # --- WEB SEARCH ENGINE ---
         search_context = ""
-        # Expanded keywords to catch info-seeking intents
-        SEARCH_KEYWORDS = [
-            'current', 'recent', 'today', 'price', 'news', 'weather', 'stock', 'best', 'latest', 
-            'release date', 'who is', 'what happened', 'search', 'how many', 'where can i', 
-            'how to get', 'how can i', 'free', 'where to', 'buy', 'get', 'find', 'how do i',
-            'how to', 'recipe', 'cook', 'tutorial', 'guide', 'explain', 'tell me about', 'who'
-        ]
-        if any(kw in user_question.lower() for kw in SEARCH_KEYWORDS) and not is_tutorial:
-            logger.info(f"🔎 SEARCH INTENT DETECTED: {user_question}")
-            search_results = await search_google(user_question)
+        if search_task:
+            started = time.perf_counter()
+            try:
+                remaining = max(0.0, SEARCH_DEADLINE_MS / 1000 - (started - timings.started))
+                search_results = await asyncio.wait_for(asyncio.shield(search_task), timeout=remaining)
+            except asyncio.TimeoutError:
+                search_results = None
+                timings.mark("search_wait", started)
+                logger.info(f"⏱️ Search missed the {SEARCH_DEADLINE_MS}ms deadline, answering without it")
             if search_results:
                 search_context = "\n\n[REAL-TIME WEB RESEARCH (STRICTLY USE FOR ACCURACY):]\n"
                 for r in search_results:
@@ -300,92 +358,104 @@ async def get_gemini_response(prompt, user_id, username=None, image_bytes=None,
             "4. NO LAZINESS: Give full, precise answers. Talk like a real, competent human.\n"
             "5. FINAL PING: End with a short, relevant 'What's next?' question."
         )
-        modified_system_prompt = f"{system_prompt}{memory_context}{overlay_context}{search_context}{global_instruction}"
-
         if use_thought:
-            # Chain of Thought Step
-            thought_prompt = f"System Instruction: First, think deeply about the following request. Plan your response step-by-step. Keep this internal thought process private.\n\nUser Request: {user_question}"
             # This is a bit of a hack for Gemini without a native 'thinking' block in this version, 
             # we just prepend it and then we'll strip it or just rely on the model's self-instruction.
-            modified_system_prompt = f"System Instruction: You have a specialized thinking module. Before answering, analyze the context and the user's intent thoroughly.\n\n{modified_system_prompt}"
+            system_prompt = f"System Instruction: You have a specialized thinking module. Before answering, analyze the context and the user's intent thoroughly.\n\n{system_prompt}"
+
+        def assemble(route):
+            # Segment order matches the old concatenation; optional ones get trimmed to the route budget
+            builder = PromptBuilder(route)
+            builder.reserve("question", user_question)
+            builder.add("system", system_prompt, required=True)
+            builder.add("memory", memory_context, max_tokens=400)
+            builder.add("summary", summary_context, max_tokens=600)
+            builder.add("overlay", overlay_context, max_tokens=100)
+            builder.add("search", search_context, max_tokens=1200)
+            builder.add("rules", global_instruction + user_context, required=True)
+            return builder, builder.build_system()
 
 
         if image_bytes:
-            image_prompt = f"{modified_system_prompt}{user_context}\n\nAnalyze this image.\n\nUser's message: {user_question}"
-            response = await safe_generate_content(
-                model=model if model else PRIMARY_MODEL,
-                contents=[
-                    types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
-                    types.Part.from_text(text=image_prompt),
-                ],
-            )
-            if not response or not response.text:
+            # Already-normalized buffers (e.g. from download_image) hit the content-hash cache
+            image_bytes = await timings.measure("image_prep", media.images.prepare(image_bytes)) or image_bytes
+            vision_model = model if model else PRIMARY_MODEL
+
+            _, modified_system_prompt = assemble("gemini")
+            image_prompt = f"{modified_system_prompt}\n\nAnalyze this image.\n\nUser's message: {user_question}"
+
+            async def analyze():
+                response = await safe_generate_content(
+                    model=vision_model,
+                    contents=[
+                        types.Part.from_bytes(data=image_bytes, mime_type="image/jpeg"),
+                        types.Part.from_text(text=image_prompt),
+                    ],
+                )
+                return {"text": response.text} if response and response.text else None
+
+            # Same image + same full prompt reuses the earlier answer. The prompt carries this user's
+            # memory, name and guild overlay, so keying on it keeps answers from crossing users.
+            kind = "vision:" + request_key(image_prompt)[:16]
+            analysis = await timings.measure("vision", media.verdicts.remember(media.content_hash(image_bytes), kind, vision_model, analyze))
+            logger.info(f"⏱️ REPLY TIMINGS (vision): {timings.summary()}")
+            if not analysis:
                 return "I couldn't analyze this image."
-            result_text = response.text
-            db_manager.save_message(user_id, "user", f"[Sent Image] {prompt if prompt else ''}")
-            db_manager.save_message(user_id, "model", result_text)
+            result_text = analysis["text"]
+            context.append_exchange(f"[Sent Image] {prompt if prompt else ''}", result_text)
+            reflections.note_turn(context)
             return result_text
         
         # --- ROUTING LOGIC: Groq vs Gemini ---
-        # Groq handles general chat and tutorials (fast, high rate limits).
-        # Gemini handles multimodal (vision), specialized thinking, or specific model overrides.
-        is_vision = image_bytes is not None
+        # Plain chat can go to either provider; the router picks the faster healthy one and hedges on the other.
+        # Vision, specialized thinking and explicit model overrides stay on Gemini.
         is_override = model is not None or mode is not None or use_thought
+        gemini_model = model if model else PRIMARY_MODEL
         
-        history = db_manager.get_history(user_id, limit=12)
-        
-        if not is_vision and not is_override and GROQ_API_KEY:
-            # ROUTE TO GROQ (CHAT)
-            logger.info(f"🚀 ROUTING TO GROQ: {username or 'User'}")
-            
-            groq_messages = [{"role": "system", "content": modified_system_prompt + user_context}]
-            for msg in history:
+        history = context.history()
+        maybe_summarize_history(context)
+
+        async def ask_groq():
+            started = time.perf_counter()
+            builder, modified_system_prompt = assemble("groq")
+            groq_messages = [{"role": "system", "content": modified_system_prompt}]
+            for msg in builder.fit_history(history):
                 role = "user" if msg['role'] == 'user' else "assistant"
                 content = msg['parts'][0]['text']
                 groq_messages.append({"role": role, "content": content})
             
             groq_messages.append({"role": "user", "content": user_question})
+            timings.mark("groq_prompt", started)
+            return await timings.measure("groq", groq_chat_completion(groq_messages, model=GROQ_MODEL, temperature=0.8, timeout=25.0))
+
+        async def ask_gemini():
+            started = time.perf_counter()
+            builder, modified_system_prompt = assemble("gemini")
+            contents = [types.Part.from_text(text=modified_system_prompt)]
+            for msg in builder.fit_history(history):
+                role = "user" if msg['role'] == 'user' else "model"
+                contents.append(types.Content(role=role, parts=[types.Part.from_text(text=msg['parts'][0]['text'])]))
             
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {"Authorization": f"Bearer {GROQ_API_KEY}", "Content-Type": "application/json"}
-            payload = {"model": GROQ_MODEL, "messages": groq_messages, "temperature": 0.8}
-            
-            async with httpx.AsyncClient() as client:
-                try:
-                    g_res = await client.post(url, headers=headers, json=payload, timeout=25.0)
-                    if g_res.status_code == 200:
-                        result_text = g_res.json()["choices"][0]["message"]["content"]
-                        db_manager.save_message(user_id, "user", user_question)
-                        db_manager.save_message(user_id, "model", result_text)
-                        asyncio.create_task(reflect_on_user(user_id, username, user_question, result_text))
-                        return result_text
-                    elif g_res.status_code == 429:
-                        logger.warning("⚠️ Groq Rate Limited. Falling back to Gemini.")
-                    else:
-                        logger.error(f"Groq API Error {g_res.status_code}: {g_res.text}")
-                except Exception as e:
-                    logger.error(f"Groq Request failed: {e}")
-
-            logger.warning("⚠️ Groq unavailable or limited, falling back to Gemini.")
-
-        # --- GEMINI FALLBACK/DEFAULT ---
-        contents = [types.Part.from_text(text=modified_system_prompt + user_context)]
-        for msg in history:
-            role = "user" if msg['role'] == 'user' else "model"
-            contents.append(types.Content(role=role, parts=[types.Part.from_text(text=msg['parts'][0]['text'])]))
-        
-        contents.append(types.Content(role="user", parts=[types.Part.from_text(text=user_question)]))
-        
-        response = await safe_generate_content(model=model if model else PRIMARY_MODEL, contents=contents)
-        if not response or not response.text:
+            contents.append(types.Content(role="user", parts=[types.Part.from_text(text=user_question)]))
+            timings.mark("gemini_prompt", started)
+            response = await timings.measure("gemini", safe_generate_content(model=gemini_model, contents=contents))
+            return response.text if response and response.text else None
+
+        provider_router.register(f"gemini:{gemini_model}", 6.0)
+        candidates = {f"gemini:{gemini_model}": ask_gemini}
+        if not is_override and GROQ_API_KEY:
+            candidates[f"groq:{GROQ_MODEL}"] = ask_groq
+        result_text = await provider_router.run("chat", candidates)
+        logger.info(f"⏱️ REPLY TIMINGS ({username or 'User'}): {timings.summary()}")
+        if not result_text:
             return "I'm having trouble thinking right now."
         
-        result_text = response.text
-        db_manager.save_message(user_id, "user", user_question)
-        db_manager.save_message(user_id, "model", result_text)
-        
-        asyncio.create_task(reflect_on_user(user_id, username, user_question, result_text))
+        context.append_exchange(user_question, result_text)
+        reflections.note_turn(context)
         return result_text
+    except CircuitOpen:
+        logger.warning("⚡ Brain: every chat provider is failing fast right now")
+        return "my brain's offline for a sec (upstream is down). try again in a minute."
     except Exception as e:
         err_str = str(e).lower()
         if "429" in err_str or "quota" in err_str or "resource_exhausted" in err_str:
@@ -453,199 +523,135 @@ Keep the tone elite and confident. Don't mention it's an AI simulation; just del
         logger.error(f"Council Error: {e}")
         return await get_gemini_response(prompt, user_id, username, guild_id=guild_id)
 
-async def reflect_on_user(user_id, username, latest_user_msg, latest_bot_res):
+async def reflect_on_users(contexts):
     """
-    Asks the AI to 'reflect' on the interaction and update its long-term memory of the user.
+    Asks the AI to 'reflect' on several users at once and update their long-term memory.
+    Called by the reflection scheduler. Returns the ids of the users the model answered for;
+    anyone missing, or the whole batch if this raises, is retried with backoff.
     """
-    try:
-        old_memory = db_manager.get_user_memory(user_id)
-        history = db_manager.get_history(user_id, limit=6)
-        history_text = "\n".join([f"{m['role']}: {m['parts'][0]['text']}" for m in history])
-
-        reflection_prompt = f"""You are reflecting on your relationship with {username}.
+    blocks = []
+    for context in contexts:
+        old_memory = context.memory or {}
+        history_text = "\n".join(f"{m['role']}: {compact_turn(m['parts'][0]['text'])}" for m in context.history(8))
+        blocks.append(f"""### USER {context.user_id} ({context.username})
+OLD MEMORY: {old_memory.get('profile_summary') or 'None'} | vibe: {old_memory.get('vibe') or 'unknown'} | notes: {old_memory.get('notes') or 'None'}
 RECENT CONVERSATION:
-{history_text}
+{history_text}""")
+
+    reflection_prompt = f"""You are Prime, reflecting on your relationship with each user below.
+
+{chr(10).join(blocks)}
 
-OLD MEMORY:
-{old_memory.get('profile_summary', 'None') if old_memory else 'None'}
+TASK (for every user):
+1. Summarize interests, expertise, tools they mention and preferences (max 60 words).
+2. Assign a one-word 'vibe' (respectful, technical, casual, rude, creative, ...).
+3. Note how they chat (lowercase, jargon, emojis, short sentences) in a few words.
 
-TASK:
-1. Summarize interests, tone, preferences.
-2. Assign a 'vibe' (respectful, technical, casual, rude, creative).
-3. Keep it concise (max 100 words).
+Format as JSON: {{"users": [{{"id": "<user id>", "summary": "...", "vibe": "...", "notes": "..."}}]}}"""
 
-Format as JSON: {{"summary": "...", "vibe": "..."}}"""
+    response = await safe_generate_content(
+        model=PRIMARY_MODEL,
+        contents=reflection_prompt,
+        config=types.GenerateContentConfig(response_mime_type="application/json")
+    )
+    if not response or not response.text:
+        raise RuntimeError("empty reflection response")
 
-        response = await safe_generate_content(
-            model=PRIMARY_MODEL, 
-            contents=reflection_prompt,
-            config=types.GenerateContentConfig(response_mime_type="application/json")
+    try:
+        payload = json.loads(response.text)
+    except ValueError as e:
+        raise RuntimeError(f"unparseable reflection response: {e}")
+    entries = payload.get("users") if isinstance(payload, dict) else None
+    if not isinstance(entries, list):
+        raise RuntimeError(f"reflection response has no users list: {response.text[:120]!r}")
+
+    by_id = {str(c.user_id): c for c in contexts}
+    reflected = set()
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        context = by_id.get(str(entry.get("id")))
+        if context is None:
+            continue
+        await asyncio.to_thread(
+            db_manager.update_user_memory,
+            context.user_id,
+            context.username,
+            profile_summary=entry.get('summary'),
+            vibe=entry.get('vibe'),
+            notes=entry.get('notes'),
+            bump=False  # The history writer persists the count as turns happen
         )
+        context.update_memory(profile_summary=entry.get('summary'), vibe=entry.get('vibe'), notes=entry.get('notes'))
+        reflected.add(context.user_id)
+    logger.info(f"🪞 Reflected on {len(reflected)}/{len(contexts)} user(s) in one batch")
+    return reflected
+
+# Memory refreshes are batched and only run when chat traffic leaves room for them
+reflections = ReflectionScheduler(reflect_on_users, load=lambda: gemini_flights.in_flight() + groq_flights.in_flight())
+
+def maybe_summarize_history(context):
+    """Schedule a summary refresh once enough turns have scrolled out of the window."""
+    if context.summarizing or len(context.overflow) < SUMMARY_BATCH_TURNS:
+        return
+    context.summarizing = True
+    asyncio.create_task(summarize_history(context))
+
+async def summarize_history(context):
+    """
+    Folds turns that left the context window into the rolling summary stored in user_memory,
+    so the prompt keeps the gist of old conversation without resending it.
+    """
+    turns, context.overflow = context.overflow, []
+    try:
+        previous = (context.memory or {}).get("history_summary") or "None"
+        transcript = "\n".join(f"{t['role']}: {compact_turn(t['parts'][0]['text'])}" for t in turns)
+        summary_prompt = f"""Update the running summary of your conversation with {context.username or 'this user'}.
+CURRENT SUMMARY:
+{previous}
 
-        if response and response.text:
-            data = json.loads(response.text)
-            db_manager.update_user_memory(
-                user_id, 
-                username, 
-                profile_summary=data.get('summary'), 
-                vibe=data.get('vibe')
-            )
-            logger.info(f"Updated memory for user {username}")
+OLDER MESSAGES TO FOLD IN:
+{transcript}
 
-    except Exception as e:
-        logger.error(f"Reflection error for user {user_id}: {e}")
+Keep names, projects, decisions and open questions. Drop small talk and code. Max 120 words. Reply with the summary only."""
 
-# Tool functions (Actual implementations)
-async def generate_image(description):
-    try:
-        # Using pollination for free generation
-        url = f"https://pollinations.ai/p/{description.replace(' ', '%20')}?width=1024&height=1024&seed={random.randint(1, 99999)}&model=flux"
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    data = await response.read()
-                    path = f"gen_{int(time.time())}.jpg"
-                    with open(path, "wb") as f:
-                        f.write(data)
-                    return path
+        summary = None
+        if GROQ_API_KEY:
+            summary = await groq_chat_completion([{"role": "user", "content": summary_prompt}], temperature=0.3)
+        if not summary:
+            response = await safe_generate_content(model=PRIMARY_MODEL, contents=summary_prompt)
+            summary = response.text if response and response.text else None
+        if not summary:
+            # Put the turns back so the next attempt still covers them
+            context.overflow = turns + context.overflow
+            return
+
+        summary = truncate_to_tokens(summary.strip(), 300)
+        await asyncio.to_thread(
+            db_manager.update_user_memory, context.user_id, context.username,
+            history_summary=summary, bump=False
+        )
+        context.update_memory(history_summary=summary)
+        logger.info(f"🗜️ Folded {len(turns)} old turns into summary for {context.username or context.user_id}")
     except Exception as e:
-        logger.error(f"Image generation error: {e}")
-    return None
+        context.overflow = turns + context.overflow
+        logger.error(f"History summary error for user {context.user_id}: {e}")
+    finally:
+        context.summarizing = False
 
+# Tool functions (Actual implementations)
 async def search_google(query):
-    api_key = os.getenv("SERPER_API_KEY")
-    if not api_key:
-        return []
-    
-    url = "https://google.serper.dev/search"
-    payload = json.dumps({"q": query})
-    headers = {'X-API-KEY': api_key, 'Content-Type': 'application/json'}
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, data=payload) as response:
-                res_data = await response.json()
-                return res_data.get('organic', [])[:5]
-    except Exception as e:
-        logger.error(f"Google search error: {e}")
-    return []
+    """Top organic Google results (cached, see search.py)."""
+    return await search_service.web(query)
 
 async def search_images_google(query):
     """Search for images via Serper API and return a list of top image URLs."""
-    api_key = os.getenv("SERPER_API_KEY")
-    if not api_key:
-        return []
-    
-    url = "https://google.serper.dev/images"
-    payload = json.dumps({"q": query})
-    headers = {'X-API-KEY': api_key, 'Content-Type': 'application/json'}
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.post(url, headers=headers, data=payload) as response:
-                res_data = await response.json()
-                images = res_data.get('images', [])
-                if images:
-                    return [img.get('imageUrl') for img in images[:10] if img.get('imageUrl')]
-    except Exception as e:
-        logger.error(f"Google image search error: {e}")
-    return []
+    return await search_service.images(query)
 
 async def get_youtube_stats(channel_name):
     """Fetch real-time YouTube channel statistics using the Google YouTube Data API."""
-    api_key = os.getenv("YOUTUBE_API_KEY")
-    if not api_key:
-        logger.warning("No YOUTUBE_API_KEY found in environment.")
-        return None
-    
-    # 1. Search for the channel to get its ID
-    search_url = "https://www.googleapis.com/youtube/v3/search"
-    search_params = {
-        'part': 'snippet',
-        'q': channel_name,
-        'type': 'channel',
-        'maxResults': 1,
-        'key': api_key
-    }
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(search_url, params=search_params) as response:
-                if response.status != 200:
-                    logger.error(f"YouTube Search API error: {response.status}")
-                    return None
-                    
-                search_data = await response.json()
-                items = search_data.get('items', [])
-                if not items:
-                    return None
-                
-                channel_id = items[0]['id']['channelId']
-                
-                # 2. Get detailed stats for this channel ID
-                stats_url = "https://www.googleapis.com/youtube/v3/channels"
-                stats_params = {
-                    'part': 'statistics,snippet',
-                    'id': channel_id,
-                    'key': api_key
-                }
-                
-                async with session.get(stats_url, params=stats_params) as stats_response:
-                    if stats_response.status != 200:
-                        return None
-                        
-                    stats_data = await stats_response.json()
-                    if not stats_data.get('items'):
-                        return None
-                    
-                    full_data = stats_data['items'][0]
-                    stats = full_data['statistics']
-                    snippet = full_data['snippet']
-                    
-                    return {
-                        'name': snippet['title'],
-                        'custom_url': snippet.get('customUrl', 'N/A'),
-                        'pfp': snippet['thumbnails']['high']['url'],
-                        'subs': stats.get('subscriberCount', '0'),
-                        'views': stats.get('viewCount', '0'),
-                        'videos': stats.get('videoCount', '0'),
-                        'description': snippet.get('description', '')[:200] + "...",
-                        'id': channel_id
-                    }
-    except Exception as e:
-        logger.error(f"YouTube Stats Error: {e}")
-        return None
+    return await search_service.youtube_channel(channel_name)
 
 async def search_youtube_videos(query, max_results=1):
     """Search for real YouTube videos/music and return their links and titles."""
-    api_key = os.getenv("YOUTUBE_API_KEY")
-    if not api_key:
-        return []
-    
-    url = "https://www.googleapis.com/youtube/v3/search"
-    params = {
-        'part': 'snippet',
-        'q': query,
-        'type': 'video',
-        'maxResults': max_results,
-        'key': api_key
-    }
-    
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(url, params=params) as response:
-                if response.status != 200:
-                    return []
-                
-                data = await response.json()
-                results = []
-                for item in data.get('items', []):
-                    results.append({
-                        'title': item['snippet']['title'],
-                        'link': f"https://www.youtube.com/watch?v={item['id']['videoId']}",
-                        'thumbnail': item['snippet']['thumbnails']['high']['url']
-                    })
-                return results
-    except Exception as e:
-        logger.error(f"YouTube Search Error: {e}")
-        return []
+    return await search_service.youtube_videos(query, max_results)
@@ -0,0 +1,170 @@
+import os
+import time
+import asyncio
+import logging
+from urllib.parse import urlparse
+import metrics
+
+logger = logging.getLogger('prime_breakers')
+
+# --- CONFIGURATION ---
+BREAKER_FAILURES = int(os.getenv("BREAKER_FAILURES", "5"))            # Consecutive failures before opening
+BREAKER_RESET_SECONDS = float(os.getenv("BREAKER_RESET_SECONDS", "30")) # How long to fail fast before probing again
+BREAKER_HALF_OPEN_PROBES = 1
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitOpen(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+    def __init__(self, name):
+        super().__init__(f"{name} is unavailable (circuit open)")
+        self.name = name
+
+class UpstreamError(Exception):
+    """An upstream answered with an error status."""
+    def __init__(self, host, status):
+        super().__init__(f"{host} returned HTTP {status}")
+        self.host = host
+        self.status = status
+
+def counts_as_outage(exc):
+    """Rate limits, 5xx, timeouts and connection errors trip breakers; bad requests don't."""
+    if isinstance(exc, UpstreamError):
+        return exc.status == 429 or exc.status >= 500
+    if isinstance(exc, (asyncio.TimeoutError, TimeoutError, ConnectionError, OSError)):
+        return True
+    name = type(exc).__name__.lower()
+    if "timeout" in name or "connect" in name or "network" in name:
+        return True
+    text = str(exc).lower()
+    return any(marker in text for marker in ("429", "500", "502", "503", "504", "unavailable", "resource_exhausted", "timed out", "deadline"))
+
+class CircuitBreaker:
+    """
+    Classic three-state breaker for one upstream.
+    closed: calls pass, consecutive failures are counted.
+    open: calls fail fast until reset_timeout has passed.
+    half_open: a single probe call decides whether to close again or re-open.
+    """
+    def __init__(self, name, host=None, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.host = host or name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probes = 0
+        self.total_failures = 0
+        self.total_successes = 0
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self):
+        if self._state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self.probes = 0
+        return self._state
+
+    def allow(self):
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and self.probes < BREAKER_HALF_OPEN_PROBES:
+            self.probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.total_successes += 1
+        self.failures = 0
+        if self._state != CLOSED:
+            logger.info(f"🟢 BREAKER {self.name}: closed again")
+            self._state = CLOSED
+
+    def record_failure(self):
+        self.total_failures += 1
+        self.failures += 1
+        if self._state == HALF_OPEN or (self._state == CLOSED and self.failures >= self.failure_threshold):
+            if self._state == CLOSED:
+                self.trips += 1
+            logger.warning(f"🔴 BREAKER {self.name}: open for {self.reset_timeout:.0f}s after {self.failures} failure(s)")
+            self._state = OPEN
+            self.opened_at = time.monotonic()
+
+    def record(self, ok):
+        if ok:
+            self.record_success()
+        else:
+            self.record_failure()
+
+    async def call(self, factory, fallback=None):
+        """Run factory() through the breaker. Returns fallback (or raises CircuitOpen if it is None) when open."""
+        if not self.allow():
+            if fallback is not None:
+                return fallback() if callable(fallback) else fallback
+            raise CircuitOpen(self.name)
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            if self._state == HALF_OPEN:
+                # The probe never finished; let the next caller try instead
+                self.probes = max(0, self.probes - 1)
+            raise
+        except Exception as e:
+            if counts_as_outage(e):
+                self.record_failure()
+            else:
+                # The host answered, so it's up; a probe that got a 4xx still counts as recovery
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "failures": self.total_failures,
+            "successes": self.total_successes,
+            "rejected": self.rejected,
+            "trips": self.trips,
+        }
+
+class BreakerRegistry:
+    """
+    One breaker per logical upstream ("gemini", "serper", ...), created on first use. Keying
+    by name rather than host keeps upstreams apart when several share one (e.g. the stand-in);
+    the host is kept as a metric label.
+    """
+    def __init__(self):
+        self._breakers = {}
+
+    def get(self, name, host=None):
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            breaker = self._breakers[name] = CircuitBreaker(name, host=host)
+        return breaker
+
+    def for_url(self, url, name=None):
+        """Breaker for the upstream serving url; unnamed upstreams get one per host."""
+        host = urlparse(url).netloc or url
+        return self.get(name or host, host=host)
+
+    def stats(self):
+        return {name: b.stats() for name, b in self._breakers.items()}
+
+    def samples(self):
+        for name, b in self._breakers.items():
+            labels = {"upstream": name, "host": b.host}
+            yield "prime_breaker_state", labels, STATE_VALUES[b.state]
+            yield "prime_breaker_failures_total", labels, b.total_failures
+            yield "prime_breaker_successes_total", labels, b.total_successes
+            yield "prime_breaker_rejected_total", labels, b.rejected
+            yield "prime_breaker_trips_total", labels, b.trips
+
+breakers = BreakerRegistry()
+metrics.register(breakers.samples)
@@ -0,0 +1,116 @@
+import io
+import os
+import asyncio
+import secrets
+import string
+import logging
+from collections import deque
+import media
+
+logger = logging.getLogger('prime_captcha')
+
+# --- CONFIGURATION ---
+CAPTCHA_POOL_SIZE = int(os.getenv("CAPTCHA_POOL_SIZE", "64"))   # Ready captchas kept for join raids
+CAPTCHA_BATCH = 8       # Captchas rendered per worker job
+CAPTCHA_LENGTH = 6
+CAPTCHA_WIDTH, CAPTCHA_HEIGHT = 240, 90
+CAPTCHA_ALPHABET = string.ascii_uppercase + string.digits
+
+# --- RENDERING (runs in worker processes) ---
+_font = None
+
+def _captcha_font():
+    global _font
+    if _font is None:
+        from PIL import ImageFont
+        try: _font = ImageFont.load_default(size=40)
+        except: _font = ImageFont.load_default()
+    return _font
+
+def render_captcha(code, rng):
+    """PNG bytes of one captcha image for code."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    # Noise points, scattered in one vectorised write
+    pixels = np.full((CAPTCHA_HEIGHT, CAPTCHA_WIDTH, 3), 240, dtype=np.uint8)
+    ys = rng.integers(0, CAPTCHA_HEIGHT, 250)
+    xs = rng.integers(0, CAPTCHA_WIDTH, 250)
+    pixels[ys, xs] = rng.integers(50, 201, (250, 3), dtype=np.uint8)
+    image = Image.fromarray(pixels, "RGB")
+    draw = ImageDraw.Draw(image)
+
+    # Noise lines
+    ends = rng.integers(0, (CAPTCHA_WIDTH, CAPTCHA_HEIGHT, CAPTCHA_WIDTH, CAPTCHA_HEIGHT), (8, 4))
+    colors = rng.integers(100, 221, (8, 3))
+    for end, color in zip(ends.tolist(), colors.tolist()):
+        draw.line(end, fill=tuple(color), width=2)
+
+    # Characters
+    font = _captcha_font()
+    offsets = rng.integers(-10, 11, len(code)).tolist()
+    inks = rng.integers(0, 81, (len(code), 3)).tolist()
+    for i, char in enumerate(code):
+        draw.text((20 + i*35, 20 + offsets[i]), char, fill=tuple(inks[i]), font=font)
+
+    buf = io.BytesIO()
+    image.save(buf, format='PNG')
+    return buf.getvalue()
+
+def render_captchas(count, length=CAPTCHA_LENGTH):
+    """A batch of (code, png_bytes). Codes come from the OS CSPRNG, so forked workers never repeat each other."""
+    import numpy as np
+    rng = np.random.default_rng()
+    batch = []
+    for _ in range(count):
+        code = ''.join(secrets.choice(CAPTCHA_ALPHABET) for _ in range(length))
+        batch.append((code, render_captcha(code, rng)))
+    return batch
+
+class CaptchaPool:
+    """
+    A ring of pre-rendered captchas. Verify clicks pop one and answer inside the interaction
+    deadline; a background task renders replacements in a worker process.
+    """
+    def __init__(self, size=CAPTCHA_POOL_SIZE):
+        self.size = size
+        self.ready = deque()
+        self._low = asyncio.Event()
+        self._task = None
+        self.served = 0
+        self.misses = 0
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._refill_loop())
+            self._low.set()
+
+    async def _refill_loop(self):
+        while True:
+            await self._low.wait()
+            self._low.clear()
+            while len(self.ready) < self.size:
+                try:
+                    batch = await media.run_in_pool(render_captchas, min(CAPTCHA_BATCH, self.size - len(self.ready)), pool_name="cards")
+                except Exception as e:
+                    logger.error(f"Error pre-rendering captchas: {e}")
+                    await asyncio.sleep(5)
+                    continue
+                self.ready.extend(batch)
+
+    async def take(self):
+        """(code, png_bytes) for a new captcha; instant unless the pool has run dry."""
+        self.served += 1
+        if len(self.ready) < self.size // 2:
+            self._low.set()
+        if self.ready:
+            return self.ready.popleft()
+        self.misses += 1
+        logger.warning("⚠️ Captcha pool empty, rendering on demand")
+        batch = await media.run_in_pool(render_captchas, 1, pool_name="cards")
+        return batch[0]
+
+    def stats(self):
+        return {"ready": len(self.ready), "size": self.size, "served": self.served, "misses": self.misses}
+
+captcha_pool = CaptchaPool()
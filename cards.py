@@ -0,0 +1,159 @@
+import io
+import os
+import logging
+import media
+from avatars import avatars
+from cache import TTLCache
+from concurrency import SingleFlight
+
+logger = logging.getLogger('prime_cards')
+
+# --- CONFIGURATION ---
+CARD_CACHE_SIZE = int(os.getenv("CARD_CACHE_SIZE", "256"))
+CARD_CACHE_TTL = 3600
+CARD_WIDTH, CARD_HEIGHT = 900, 500
+PANEL_PADDING = 40
+AVATAR_SIZE = 220
+AVATAR_POS = (80, 120)
+
+# --- RENDERING (runs in worker processes) ---
+# Static layers and fonts are built once per worker and reused for every card
+_template = None
+_avatar_mask = None
+_fonts = None
+
+def _draw_glow(draw, center, radius, color):
+    for r in range(radius, 0, -5):
+        alpha = int(80 * (1 - (r / radius))**2)
+        draw.ellipse([center[0]-r, center[1]-r, center[0]+r, center[1]+r],
+                     fill=(color[0], color[1], color[2], alpha))
+
+def portfolio_template():
+    """Background glows, glass panel and gloss streak: identical on every card."""
+    global _template
+    if _template is None:
+        from PIL import Image, ImageDraw
+        bg = Image.new('RGB', (CARD_WIDTH, CARD_HEIGHT), (10, 10, 12))
+        draw = ImageDraw.Draw(bg, 'RGBA')
+
+        # Background "Mesh" Glows
+        _draw_glow(draw, (100, 100), 300, (50, 0, 150)) # Purple glow top left
+        _draw_glow(draw, (CARD_WIDTH-100, CARD_HEIGHT-100), 300, (0, 80, 150)) # Blue glow bottom right
+        _draw_glow(draw, (CARD_WIDTH//2, CARD_HEIGHT//2), 400, (20, 20, 30)) # Center deep glow
+
+        # Main Glassmorphism Panel
+        panel_shape = [PANEL_PADDING, PANEL_PADDING, CARD_WIDTH - PANEL_PADDING, CARD_HEIGHT - PANEL_PADDING]
+        draw.rounded_rectangle(panel_shape, radius=30, fill=(255, 255, 255, 5), outline=(255, 255, 255, 20), width=2)
+
+        # "Gloss" streak
+        draw.polygon([(PANEL_PADDING, PANEL_PADDING), (400, PANEL_PADDING), (100, CARD_HEIGHT-PANEL_PADDING), (PANEL_PADDING, CARD_HEIGHT-PANEL_PADDING)],
+                     fill=(255, 255, 255, 5))
+        _template = bg
+    return _template
+
+def avatar_mask():
+    global _avatar_mask
+    if _avatar_mask is None:
+        from PIL import Image, ImageDraw
+        _avatar_mask = Image.new('L', (AVATAR_SIZE, AVATAR_SIZE), 0)
+        ImageDraw.Draw(_avatar_mask).ellipse((0, 0, AVATAR_SIZE, AVATAR_SIZE), fill=255)
+    return _avatar_mask
+
+def card_fonts():
+    global _fonts
+    if _fonts is None:
+        from PIL import ImageFont
+        try:
+            _fonts = {
+                "name": ImageFont.truetype("arialbd.ttf", 60), # Bold
+                "stat_val": ImageFont.truetype("arialbd.ttf", 45),
+                "stat_lbl": ImageFont.truetype("arial.ttf", 25),
+                "link": ImageFont.truetype("arial.ttf", 30),
+            }
+        except Exception:
+            default = ImageFont.load_default()
+            _fonts = {"name": default, "stat_val": default, "stat_lbl": default, "link": default}
+    return _fonts
+
+def render_portfolio_card(display_name, level, xp, work_link, avatar_pixels):
+    """Composite the per-user parts of a portfolio card onto the template. Returns PNG bytes."""
+    from PIL import Image, ImageDraw
+
+    bg = portfolio_template().copy()
+    draw = ImageDraw.Draw(bg, 'RGBA')
+    fonts = card_fonts()
+
+    # Avatar (already decoded and resized by the avatar cache)
+    if avatar_pixels:
+        try:
+            avatar_img = Image.frombytes("RGBA", (AVATAR_SIZE, AVATAR_SIZE), avatar_pixels)
+            bg.paste(avatar_img, AVATAR_POS, avatar_mask())
+
+            # Glowing outer rings
+            for i in range(1, 6):
+                alpha = int(200 / i)
+                draw.ellipse([AVATAR_POS[0]-i*2, AVATAR_POS[1]-i*2, AVATAR_POS[0]+AVATAR_SIZE+i*2, AVATAR_POS[1]+AVATAR_SIZE+i*2],
+                             outline=(0, 255, 200, alpha), width=2)
+        except Exception:
+            pass  # Bad pixel buffer; the card is still useful without it
+
+    # Name and Premium Badge
+    draw.text((340, 120), display_name.upper(), font=fonts["name"], fill=(255, 255, 255, 255))
+    draw.rectangle([340, 195, 480, 225], fill=(0, 255, 180, 40), outline=(0, 255, 180, 150))
+    draw.text((355, 198), "VERIFIED EDITOR", font=fonts["stat_lbl"], fill=(0, 255, 180, 255))
+
+    # Stats Section (Grid Layout)
+    draw.text((340, 260), "LEVEL", font=fonts["stat_lbl"], fill=(180, 180, 200, 255))
+    draw.text((340, 290), f"{level}", font=fonts["stat_val"], fill=(255, 255, 255, 255))
+    draw.text((500, 260), "TOTAL XP", font=fonts["stat_lbl"], fill=(180, 180, 200, 255))
+    draw.text((500, 290), f"{xp}", font=fonts["stat_val"], fill=(255, 255, 255, 255))
+
+    # Portfolio Link (Lower Glass Box)
+    link_y = 380
+    if work_link:
+        draw.rounded_rectangle([340, link_y, 820, link_y + 60], radius=15, fill=(0, 150, 255, 30), outline=(0, 150, 255, 100))
+        draw.text((360, link_y + 15), "🔗", font=fonts["link"], fill=(255, 255, 255, 255))
+        display_link = work_link if len(work_link) < 40 else work_link[:37] + "..."
+        draw.text((400, link_y + 15), display_link, font=fonts["link"], fill=(200, 230, 255, 255))
+    else:
+        draw.text((340, link_y + 15), "NO PORTFOLIO LINK SET", font=fonts["link"], fill=(100, 100, 120, 255))
+
+    out = io.BytesIO()
+    bg.save(out, format='PNG')
+    return out.getvalue()
+
+# --- CARD CACHE ---
+class CardRenderer:
+    """
+    Portfolio cards rendered in the "cards" process pool and cached by everything drawn on them,
+    so a repeat !profile with nothing changed skips the render. Avatars come from the avatar
+    cache, so a new card for an unchanged avatar doesn't wait on the CDN either.
+    """
+    def __init__(self):
+        self.cards = TTLCache(maxsize=CARD_CACHE_SIZE, ttl=CARD_CACHE_TTL)
+        self.flights = SingleFlight("cards")
+        self.rendered = 0
+
+    async def portfolio(self, member, level_data, work_link=None):
+        """PNG bytes of member's portfolio card."""
+        avatar = member.display_avatar
+        key = (member.id, member.display_name, level_data.get('level', 0), level_data.get('xp', 0), work_link, avatars.asset_key(avatar))
+        cached = self.cards.get(key)
+        if cached is not None:
+            return cached
+        return await self.flights.do(key, lambda: self._render(key, avatar, member.display_name, level_data, work_link))
+
+    async def _render(self, key, avatar, display_name, level_data, work_link):
+        avatar_pixels = await avatars.pixels(avatar, AVATAR_SIZE)
+        png = await media.run_in_pool(
+            render_portfolio_card, display_name, level_data.get('level', 0), level_data.get('xp', 0), work_link, avatar_pixels,
+            pool_name="cards"
+        )
+        self.rendered += 1
+        self.cards.set(key, png)
+        return png
+
+    def stats(self):
+        return {"rendered": self.rendered, "cache": self.cards.stats(), "coalesced": self.flights.coalesced}
+
+cards = CardRenderer()
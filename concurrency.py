@@ -0,0 +1,297 @@
+import asyncio
+import collections
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger('prime_concurrency')
+
+def _fingerprint(obj):
+    """Reduce arbitrary request arguments to something JSON can hash stably."""
+    if obj is None or isinstance(obj, (str, int, float, bool)):
+        return obj
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+        return "bytes:" + hashlib.sha1(bytes(obj)).hexdigest()
+    if isinstance(obj, dict):
+        return {str(k): _fingerprint(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple, set)):
+        return [_fingerprint(v) for v in obj]
+    if hasattr(obj, "model_dump"):
+        # google-genai request types are pydantic models
+        return _fingerprint(obj.model_dump(exclude_none=True))
+    return repr(obj)
+
+def request_key(*parts):
+    """Build a stable key for a set of request arguments."""
+    blob = json.dumps(_fingerprint(parts), sort_keys=True, default=repr)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+class _Flight:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical calls so they share one upstream request.
+    Every caller awaits the same task; the task is only cancelled once the
+    last interested caller has gone away.
+    """
+    def __init__(self, name):
+        self.name = name
+        self._flights = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key, factory):
+        flight = self._flights.get(key)
+        if flight is None or flight.task.done():
+            flight = _Flight(asyncio.ensure_future(factory()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _t, k=key, f=flight: self._forget(k, f))
+            self.started += 1
+        else:
+            self.coalesced += 1
+            logger.debug(f"🔗 {self.name}: joined in-flight request ({flight.waiters} waiting)")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Nobody is left to receive the result, stop burning quota on it. Forget it
+                # now, not when the cancellation lands, so a new caller starts a fresh request
+                # instead of joining one that is about to raise CancelledError.
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                flight.task.cancel()
+
+    def _forget(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Waiters re-raise errors themselves; mark it retrieved so the loop stays quiet
+            flight.task.exception()
+
+    def in_flight(self):
+        return len(self._flights)
+
+    def stats(self):
+        return {"name": self.name, "in_flight": self.in_flight(), "started": self.started, "coalesced": self.coalesced}
+
+class LaneFull(Exception):
+    """Raised when a lane is saturated and sheds new work."""
+
+class Lane:
+    """
+    Concurrency-limited lane for background work. Up to `limit` jobs run at once and
+    at most `max_waiting` more may queue; anything beyond that is shed immediately.
+    """
+    def __init__(self, name, limit, max_waiting=0):
+        self.name = name
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self._semaphore = asyncio.Semaphore(limit)
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.shed = 0
+
+    def saturated(self):
+        return self.running >= self.limit and self.waiting >= self.max_waiting
+
+    async def run(self, factory):
+        if self.saturated():
+            self.shed += 1
+            logger.debug(f"🪫 {self.name}: lane full, shedding job")
+            raise LaneFull(self.name)
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            return await factory()
+        finally:
+            self.running -= 1
+            self.completed += 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {"name": self.name, "running": self.running, "waiting": self.waiting, "completed": self.completed, "shed": self.shed}
+
+_DEFAULT = object()
+
+class _Job:
+    __slots__ = ("factory", "fallback", "future", "queued_at", "max_wait")
+
+    def __init__(self, factory, fallback, future, max_wait):
+        self.factory = factory
+        self.fallback = fallback
+        self.future = future
+        self.queued_at = time.monotonic()
+        self.max_wait = max_wait
+
+class FairQueue:
+    """
+    Work queue drained by a fixed pool of workers. Jobs are grouped by key (e.g. guild) and
+    served round-robin within each priority level, lower levels first, so one busy key can't
+    starve the rest. Past `max_depth` queued jobs, or after waiting `max_wait` seconds, a job
+    runs its cheap fallback instead; with no fallback it fails with LaneFull. Fallbacks for
+    jobs that never got queued run on a lane bounded like the workers, not inline.
+    """
+    def __init__(self, name, workers, max_depth, max_wait, levels=3):
+        self.name = name
+        self.workers = workers
+        self.max_depth = max_depth
+        self.max_wait = max_wait
+        self._queues = [{} for _ in range(levels)]                # level -> {key: deque of jobs}
+        self._ready = [collections.deque() for _ in range(levels)] # level -> keys with queued jobs, in turn order
+        self._wakeup = None
+        self._tasks = []
+        self.depth = 0
+        self.running = 0
+        self.completed = 0
+        self.shed = 0
+        self.expired = 0
+        self.waits = collections.deque(maxlen=500)
+        self.fallbacks = Lane(f"{name}:fallback", limit=workers, max_waiting=max_depth)
+
+    def _start(self):
+        if self._wakeup is None:
+            self._wakeup = asyncio.Condition()
+        self._tasks = [t for t in self._tasks if not t.done()]
+        while len(self._tasks) < self.workers:
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def submit(self, key, priority, factory, fallback=None, max_wait=_DEFAULT):
+        """Queue factory() under key at priority (0 = most urgent) and await its result.
+        max_wait overrides the queue's deadline for this job; None means it never expires."""
+        self._start()
+        if self.depth >= self.max_depth:
+            self.shed += 1
+            logger.debug(f"🪫 {self.name}: queue full ({self.depth}), shedding job")
+            if fallback is None:
+                raise LaneFull(self.name)
+            return await self.fallbacks.run(fallback)
+
+        if max_wait is _DEFAULT:
+            max_wait = self.max_wait
+        job = _Job(factory, fallback, asyncio.get_running_loop().create_future(), max_wait)
+        level = min(priority, len(self._queues) - 1)
+        queue = self._queues[level].get(key)
+        if queue is None:
+            queue = self._queues[level][key] = collections.deque()
+            self._ready[level].append(key)
+        queue.append(job)
+        self.depth += 1
+        async with self._wakeup:
+            self._wakeup.notify()
+        return await job.future
+
+    def _next_job(self):
+        for level, ready in enumerate(self._ready):
+            while ready:
+                key = ready.popleft()
+                queue = self._queues[level][key]
+                job = queue.popleft()
+                if queue:
+                    ready.append(key) # back of the line for this key's next job
+                else:
+                    del self._queues[level][key]
+                self.depth -= 1
+                if job.future.done():
+                    continue # caller gave up (e.g. cancelled after a SEVERE verdict elsewhere)
+                return job
+        return None
+
+    async def _worker(self):
+        while True:
+            async with self._wakeup:
+                job = self._next_job()
+                while job is None:
+                    await self._wakeup.wait()
+                    job = self._next_job()
+
+            waited = time.monotonic() - job.queued_at
+            self.waits.append(waited)
+            factory = job.factory
+            if job.max_wait is not None and waited > job.max_wait:
+                self.expired += 1
+                if job.fallback is None:
+                    job.future.set_exception(LaneFull(self.name))
+                    continue
+                factory = job.fallback
+
+            self.running += 1
+            task = asyncio.create_task(factory())
+            job.future.add_done_callback(lambda f, t=task: t.cancel() if f.cancelled() else None)
+            try:
+                result = await asyncio.shield(task)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                if not task.cancelled():
+                    raise # the worker itself is shutting down
+            except Exception as e:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self.running -= 1
+                self.completed += 1
+
+    def wait_percentile(self, p):
+        if not self.waits:
+            return 0.0
+        ordered = sorted(self.waits)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "depth": self.depth,
+            "depth_by_priority": [sum(len(q) for q in level.values()) for level in self._queues],
+            "running": self.running,
+            "completed": self.completed,
+            "shed": self.shed,
+            "expired": self.expired,
+            "fallbacks": self.fallbacks.stats(),
+            "wait_p50_ms": round(self.wait_percentile(0.5) * 1000, 1),
+            "wait_p95_ms": round(self.wait_percentile(0.95) * 1000, 1),
+        }
+
+    def samples(self):
+        labels = {"queue": self.name}
+        yield "prime_queue_depth", labels, self.depth
+        for level, queues in enumerate(self._queues):
+            yield "prime_queue_depth_by_priority", {**labels, "priority": level}, sum(len(q) for q in queues.values())
+        yield "prime_queue_running", labels, self.running
+        yield "prime_queue_completed_total", labels, self.completed
+        yield "prime_queue_shed_total", labels, self.shed
+        yield "prime_queue_expired_total", labels, self.expired
+        yield "prime_queue_wait_seconds", {**labels, "quantile": "0.5"}, self.wait_percentile(0.5)
+        yield "prime_queue_wait_seconds", {**labels, "quantile": "0.95"}, self.wait_percentile(0.95)
+
+class Timings:
+    """Per-segment wall-clock timings for one request, logged as a single line."""
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.segments = {}
+
+    async def measure(self, name, awaitable):
+        started = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.segments[name] = (time.perf_counter() - started) * 1000
+
+    def mark(self, name, started):
+        self.segments[name] = (time.perf_counter() - started) * 1000
+
+    def summary(self):
+        parts = [f"{name}={ms:.0f}ms" for name, ms in self.segments.items()]
+        parts.append(f"total={(time.perf_counter() - self.started) * 1000:.0f}ms")
+        return " ".join(parts)
@@ -4,6 +4,16 @@ from dotenv import load_dotenv
 
 logger = logging.getLogger('discord_bot')
 
+load_dotenv()
+
+# --- UPSTREAM BASE URLS ---
+# Overridable so everything can be pointed at the record/replay stand-in (python standin.py --help)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "https://api.groq.com/openai/v1").rstrip("/")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None # None keeps the SDK default
+SERPER_BASE_URL = os.getenv("SERPER_BASE_URL", "https://google.serper.dev").rstrip("/")
+YOUTUBE_API_BASE = os.getenv("YOUTUBE_API_BASE", "https://www.googleapis.com/youtube/v3").rstrip("/")
+DISCORD_API_BASE = os.getenv("DISCORD_API_BASE", "https://discord.com/api").rstrip("/")
+
 def load_config():
     """
     Load configuration from environment variables.
@@ -0,0 +1,144 @@
+import os
+import asyncio
+import logging
+import time
+from collections import deque
+from database import db_manager
+from cache import TTLCache
+from concurrency import SingleFlight
+
+logger = logging.getLogger('prime_conversation')
+
+# --- CONFIGURATION ---
+CONTEXT_CACHE_SIZE = int(os.getenv("CONTEXT_CACHE_SIZE", "512"))
+CONTEXT_HISTORY_TURNS = int(os.getenv("CONTEXT_HISTORY_TURNS", "24"))
+HISTORY_FLUSH_BATCH = 50
+
+class ConversationContext:
+    """
+    Everything a chat turn needs about one user, kept in memory between turns.
+    History is appended locally and persisted in the background.
+    """
+    def __init__(self, user_id, username, history, memory):
+        self.user_id = user_id
+        self.username = username
+        self.turns = deque(history, maxlen=CONTEXT_HISTORY_TURNS)
+        self.memory = memory
+        self.overflow = [] # Turns pushed out of the window, waiting to be folded into the summary
+        self.summarizing = False
+        self.last_active = time.monotonic()
+
+    def history(self, limit=None):
+        """Return the most recent turns in the DB's {'role', 'parts'} shape."""
+        if limit is None or limit >= len(self.turns):
+            return list(self.turns)
+        return list(self.turns)[-limit:]
+
+    def append(self, role, content):
+        if len(self.turns) == self.turns.maxlen:
+            self.overflow.append(self.turns[0])
+        self.turns.append({"role": role, "parts": [{"text": content}]})
+        self.last_active = time.monotonic()
+        history_writer.enqueue(self.user_id, role, content)
+
+    def append_exchange(self, user_text, model_text):
+        self.append("user", user_text)
+        self.append("model", model_text)
+
+    def bump_interactions(self):
+        """Increment the interaction counter, queue the same increment for the DB, and return the new value."""
+        if self.memory is None:
+            self.memory = {"profile_summary": "New user", "vibe": "neutral", "notes": "", "interaction_count": 0}
+        self.memory["interaction_count"] = (self.memory.get("interaction_count") or 0) + 1
+        history_writer.count_interaction(self.user_id, self.username)
+        return self.memory["interaction_count"]
+
+    def update_memory(self, **fields):
+        if self.memory is None:
+            self.memory = {"interaction_count": 0}
+        self.memory.update({k: v for k, v in fields.items() if v is not None})
+
+class HistoryWriter:
+    """
+    Single background writer so turns hit the DB in order and in batches. Interaction counts
+    ride along as per-user increments, folded together until the next flush.
+    """
+    def __init__(self):
+        self._queue = None
+        self._task = None
+        self._interactions = {} # user_id -> (username, pending increment)
+
+    def enqueue(self, user_id, role, content):
+        self._put((user_id, role, content))
+
+    def count_interaction(self, user_id, username):
+        name, count = self._interactions.get(user_id, (username, 0))
+        self._interactions[user_id] = (username or name, count + 1)
+        self._put(None) # Wakes the writer; carries no row
+
+    def _put(self, item):
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait(item)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            item = await self._queue.get()
+            items = [item]
+            while len(items) < HISTORY_FLUSH_BATCH and not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            rows = [row for row in items if row is not None]
+            if rows:
+                try:
+                    await asyncio.to_thread(db_manager.save_messages, rows)
+                except Exception as e:
+                    logger.error(f"History flush failed ({len(rows)} rows): {e}")
+            if self._interactions:
+                pending, self._interactions = self._interactions, {}
+                try:
+                    await asyncio.to_thread(db_manager.add_interactions, [(uid, name, n) for uid, (name, n) in pending.items()])
+                except Exception as e:
+                    logger.error(f"Interaction count flush failed ({len(pending)} users): {e}")
+
+    def pending(self):
+        return self._queue.qsize() if self._queue else 0
+
+class ConversationStore:
+    """Bounded LRU of ConversationContext objects, loaded once per user."""
+    def __init__(self, maxsize=CONTEXT_CACHE_SIZE):
+        self._contexts = TTLCache(maxsize=maxsize)
+        self._loads = SingleFlight("context_load")
+
+    async def get(self, user_id, username=None):
+        context = self._contexts.get(user_id)
+        if context is None:
+            context = await self._loads.do(user_id, lambda: self._load(user_id, username))
+        if username:
+            context.username = username
+        return context
+
+    async def _load(self, user_id, username):
+        history, memory = await asyncio.gather(
+            asyncio.to_thread(db_manager.get_history, user_id, CONTEXT_HISTORY_TURNS),
+            asyncio.to_thread(db_manager.get_user_memory, user_id),
+        )
+        context = ConversationContext(user_id, username, history, memory)
+        self._contexts.set(user_id, context)
+        return context
+
+    def peek(self, user_id):
+        """Return a cached context without loading it."""
+        return self._contexts.get(user_id)
+
+    def update_memory(self, user_id, **fields):
+        context = self._contexts.get(user_id)
+        if context is not None:
+            context.update_memory(**fields)
+
+    def stats(self):
+        return {**self._contexts.stats(), "pending_writes": history_writer.pending()}
+
+history_writer = HistoryWriter()
+conversations = ConversationStore()
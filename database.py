@@ -2,9 +2,11 @@ import sqlite3
 import json
 import logging
 import os
+import time
 import psycopg2
 from psycopg2 import extras
 from datetime import datetime, timezone
+from cache import TTLCache
 
 logger = logging.getLogger('discord_bot.database')
 
@@ -21,6 +23,8 @@ class DatabaseManager:
     def __init__(self, db_path=None):
         self.db_url = os.getenv('DATABASE_URL')
         self.is_postgres = False
+        # The dashboard writes settings from another process, so keep this short-lived
+        self._guild_settings = TTLCache(maxsize=1024, ttl=int(os.getenv('GUILD_SETTINGS_TTL', '30')))
         
         if self.db_url:
             # Fix for Railway/Heroku postgres URLs
@@ -113,11 +117,23 @@ class DatabaseManager:
                     profile_summary TEXT,
                     vibe TEXT,
                     notes TEXT,
+                    history_summary TEXT,
                     interaction_count INTEGER DEFAULT 0,
                     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             ''')
 
+            # Columns added after the first release (older databases lack them)
+            def add_column(table, column, decl):
+                if self.is_postgres:
+                    cursor.execute(f'ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {decl}')
+                else:
+                    cursor.execute(f'PRAGMA table_info({table})')
+                    if column not in [row[1] for row in cursor.fetchall()]:
+                        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+            add_column('user_memory', 'history_summary', 'TEXT')
+
             # Table for Levels
             create_table('''
                 CREATE TABLE IF NOT EXISTS user_levels (
@@ -211,9 +227,33 @@ class DatabaseManager:
                 )
             ''')
             
+            # Table for cached external API responses (search results, etc.)
+            create_table('''
+                CREATE TABLE IF NOT EXISTS api_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT, -- JSON string
+                    expires_at DOUBLE PRECISION
+                )
+            ''')
+
+            # Media known to be bad, blocked on sight without another model call
+            create_table('''
+                CREATE TABLE IF NOT EXISTS blocked_media (
+                    fingerprint TEXT PRIMARY KEY,
+                    content_hash TEXT,
+                    reason TEXT,
+                    severity TEXT,
+                    created_at DOUBLE PRECISION
+                )
+            ''')
+            add_column('blocked_media', 'dhash', 'TEXT')  # 64-bit perceptual hash, hex
+            
             if not self.is_postgres:
                 cursor.execute('PRAGMA journal_mode=WAL')
                 cursor.execute('PRAGMA synchronous=NORMAL')
+
+            # After the PRAGMAs: on SQLite a DELETE opens a transaction they can't run inside
+            cursor.execute('DELETE FROM api_cache WHERE expires_at < ' + ('%s' if self.is_postgres else '?'), (time.time(),))
             
             conn.commit()
             logger.info("Database initialized successfully.")
@@ -234,6 +274,22 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error saving message to DB: {e}")
 
+    def save_messages(self, rows):
+        """Insert several (user_id, role, content) rows in one transaction."""
+        if not rows:
+            return
+        p = self.get_placeholder()
+        try:
+            with self.get_connection() as conn:
+                with self.get_cursor(conn) as cursor:
+                    cursor.executemany(
+                        f'INSERT INTO conversation_history (user_id, role, content) VALUES ({p}, {p}, {p})',
+                        rows
+                    )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving message batch to DB: {e}")
+
     def get_history(self, user_id, limit=20):
         p = self.get_placeholder()
         try:
@@ -256,18 +312,19 @@ class DatabaseManager:
             with self.get_connection() as conn:
                 with self.get_cursor(conn) as cursor:
                     cursor.execute(
-                        f'SELECT profile_summary, vibe, interaction_count FROM user_memory WHERE user_id = {p}',
+                        f'SELECT profile_summary, vibe, interaction_count, notes, history_summary FROM user_memory WHERE user_id = {p}',
                         (user_id,)
                     )
                     row = cursor.fetchone()
                     if row:
-                        return {"profile_summary": row[0], "vibe": row[1], "interaction_count": row[2]}
+                        return {"profile_summary": row[0], "vibe": row[1], "interaction_count": row[2], "notes": row[3], "history_summary": row[4]}
                     return None
         except Exception as e:
             logger.error(f"Error getting user memory from DB: {e}")
             return None
 
-    def update_user_memory(self, user_id, username, profile_summary=None, vibe=None, notes=None):
+    def update_user_memory(self, user_id, username, profile_summary=None, vibe=None, notes=None, history_summary=None, interaction_count=None, bump=True):
+        """Upsert a user's memory. Without an explicit interaction_count the stored one is incremented, unless bump=False."""
         p = self.get_placeholder()
         try:
             with self.get_connection() as conn:
@@ -276,7 +333,8 @@ class DatabaseManager:
                     row = cursor.fetchone()
                     
                     if row:
-                        interaction_count = row[0] + 1
+                        if interaction_count is None:
+                            interaction_count = row[0] + 1 if bump else row[0]
                         updates = ["interaction_count = %s", "last_updated = CURRENT_TIMESTAMP", "username = %s"]
                         if not self.is_postgres: updates = [u.replace('%s', '?') for u in updates]
                         
@@ -290,19 +348,45 @@ class DatabaseManager:
                         if notes is not None: 
                             updates.append(f"notes = {p}")
                             params.append(notes)
+                        if history_summary is not None:
+                            updates.append(f"history_summary = {p}")
+                            params.append(history_summary)
                         params.append(user_id)
                         
                         cursor.execute(f"UPDATE user_memory SET {', '.join(updates)} WHERE user_id = {p}", params)
                     else:
                         cursor.execute(
-                            f'''INSERT INTO user_memory (user_id, username, profile_summary, vibe, notes, interaction_count) 
-                               VALUES ({p}, {p}, {p}, {p}, {p}, 1)''',
-                            (user_id, username, profile_summary or "New user", vibe or "neutral", notes or "")
+                            f'''INSERT INTO user_memory (user_id, username, profile_summary, vibe, notes, history_summary, interaction_count) 
+                               VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})''',
+                            (user_id, username, profile_summary or "New user", vibe or "neutral", notes or "", history_summary or "", interaction_count or (1 if bump else 0))
                         )
                 conn.commit()
         except Exception as e:
             logger.error(f"Error updating user memory: {e}")
 
+    def add_interactions(self, rows):
+        """Add to stored interaction counts for several (user_id, username, count) rows in one transaction."""
+        if not rows:
+            return
+        p = self.get_placeholder()
+        try:
+            with self.get_connection() as conn:
+                with self.get_cursor(conn) as cursor:
+                    for user_id, username, count in rows:
+                        cursor.execute(
+                            f'UPDATE user_memory SET interaction_count = interaction_count + {p}, username = {p}, last_updated = CURRENT_TIMESTAMP WHERE user_id = {p}',
+                            (count, username, user_id)
+                        )
+                        if cursor.rowcount == 0:
+                            cursor.execute(
+                                f'''INSERT INTO user_memory (user_id, username, profile_summary, vibe, notes, history_summary, interaction_count) 
+                                   VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})''',
+                                (user_id, username, "New user", "neutral", "", "", count)
+                            )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error adding interaction counts: {e}")
+
     # --- Levels ---
     def get_levels(self):
         try:
@@ -625,22 +709,93 @@ class DatabaseManager:
                     else:
                         cursor.execute(f'INSERT INTO guild_settings (guild_id, settings) VALUES ({p}, {p})', (int(guild_id), json.dumps(settings)))
                 conn.commit()
+            self._guild_settings.set(int(guild_id), settings)
         except Exception as e:
             logger.error(f"Error saving guild setting: {e}")
 
-    def get_guild_setting(self, guild_id, key, default=None):
+    def get_guild_settings(self, guild_id):
+        """Return the whole settings dict for a guild (cached for a few seconds)."""
+        cached = self._guild_settings.get(int(guild_id))
+        if cached is not None:
+            return cached
         p = self.get_placeholder()
         try:
             with self.get_connection() as conn:
                 with self.get_cursor(conn) as cursor:
                     cursor.execute(f'SELECT settings FROM guild_settings WHERE guild_id = {p}', (int(guild_id),))
                     row = cursor.fetchone()
-                    if row:
-                        settings = json.loads(row[0])
-                        return settings.get(key, default)
-                    return default
+                    settings = json.loads(row[0]) if row else {}
+            self._guild_settings.set(int(guild_id), settings)
+            return settings
         except Exception as e:
             logger.error(f"Error getting guild setting: {e}")
-            return default
+            return {}
+
+    def get_guild_setting(self, guild_id, key, default=None):
+        return self.get_guild_settings(guild_id).get(key, default)
+
+    # --- API Cache ---
+    def get_cached_payload(self, cache_key):
+        """Return the cached JSON payload for a key, or None if missing or expired."""
+        p = self.get_placeholder()
+        try:
+            with self.get_connection() as conn:
+                with self.get_cursor(conn) as cursor:
+                    cursor.execute(f'SELECT payload, expires_at FROM api_cache WHERE cache_key = {p}', (cache_key,))
+                    row = cursor.fetchone()
+                    if row and row[1] > time.time():
+                        return json.loads(row[0])
+        except Exception as e:
+            logger.error(f"Error reading api cache: {e}")
+        return None
+
+    def save_cached_payload(self, cache_key, payload, ttl):
+        p = self.get_placeholder()
+        try:
+            with self.get_connection() as conn:
+                with self.get_cursor(conn) as cursor:
+                    if self.is_postgres:
+                        cursor.execute(
+                            'INSERT INTO api_cache (cache_key, payload, expires_at) VALUES (%s, %s, %s) ON CONFLICT (cache_key) DO UPDATE SET payload = EXCLUDED.payload, expires_at = EXCLUDED.expires_at',
+                            (cache_key, json.dumps(payload), time.time() + ttl)
+                        )
+                    else:
+                        cursor.execute(
+                            'INSERT OR REPLACE INTO api_cache (cache_key, payload, expires_at) VALUES (?, ?, ?)',
+                            (cache_key, json.dumps(payload), time.time() + ttl)
+                        )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving api cache: {e}")
+
+    def get_blocked_media(self):
+        """All blocked media fingerprints with the verdict that blocked them."""
+        try:
+            with self.get_connection() as conn:
+                with self.get_cursor(conn) as cursor:
+                    cursor.execute('SELECT fingerprint, content_hash, reason, severity, dhash FROM blocked_media')
+                    return [{"fingerprint": r[0], "content_hash": r[1], "reason": r[2], "severity": r[3], "dhash": r[4]} for r in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Error loading blocked media: {e}")
+        return []
+
+    def add_blocked_media(self, fingerprint, content_hash, reason, severity, dhash=None):
+        p = self.get_placeholder()
+        try:
+            with self.get_connection() as conn:
+                with self.get_cursor(conn) as cursor:
+                    if self.is_postgres:
+                        cursor.execute(
+                            'INSERT INTO blocked_media (fingerprint, content_hash, reason, severity, dhash, created_at) VALUES (%s, %s, %s, %s, %s, %s) ON CONFLICT (fingerprint) DO NOTHING',
+                            (fingerprint, content_hash, reason, severity, dhash, time.time())
+                        )
+                    else:
+                        cursor.execute(
+                            'INSERT OR IGNORE INTO blocked_media (fingerprint, content_hash, reason, severity, dhash, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                            (fingerprint, content_hash, reason, severity, dhash, time.time())
+                        )
+                conn.commit()
+        except Exception as e:
+            logger.error(f"Error saving blocked media: {e}")
 
 db_manager = DatabaseManager()
@@ -0,0 +1,111 @@
+import re
+import logging
+from types import MappingProxyType
+from cache import TTLCache
+
+logger = logging.getLogger('prime_keywords')
+
+# --- CONFIGURATION ---
+KEYWORD_SCAN_CACHE = 256    # Recent texts whose hits are kept; every stage of one message reuses a scan
+
+_NO_HITS = MappingProxyType({})
+
+def _is_word(char):
+    return char.isalnum() or char == '_'
+
+def _at_boundary(text, index):
+    """Same test as the regex \\b between text[index-1] and text[index]."""
+    before = index > 0 and _is_word(text[index - 1])
+    after = index < len(text) and _is_word(text[index])
+    return before != after
+
+def _trie_pattern(terms):
+    """Regex alternation with shared prefixes factored out, so the engine tests one character
+    per branch instead of every term at every position. Longer terms win (greedy)."""
+    root = {}
+    for term in terms:
+        node = root
+        for char in term:
+            node = node.setdefault(char, {})
+        node[''] = None
+
+    def build(node):
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        if '' in node:
+            body = f"(?:{body})?"
+        return body
+    return build(root)
+
+class KeywordEngine:
+    """
+    Every trigger list in one compiled pattern. Categories are registered once at startup;
+    scan() makes a single pass over lowercased text and returns {category: frozenset(terms)}
+    for every category that matched. Plain categories match anywhere (like `kw in text`),
+    whole-word ones only between word boundaries (like re.search(r'\\bkw\\b')).
+    """
+    def __init__(self, name="keywords"):
+        self.name = name
+        self.categories = {}    # category -> (terms, whole_words)
+        self._regex = None
+        self._owners = {}       # term -> [(category, whole_words)]
+        self._prefixes = {}     # term -> registered terms that are prefixes of it, itself included
+        self.cache = TTLCache(maxsize=KEYWORD_SCAN_CACHE)
+        self.scans = 0
+
+    def add(self, category, terms, whole_words=False):
+        self.categories[category] = (tuple(t.lower() for t in terms), whole_words)
+        self._regex = None
+        self.cache.clear()
+
+    def compile(self):
+        owners = {}
+        for category, (terms, whole_words) in self.categories.items():
+            for term in terms:
+                if term and (category, whole_words) not in owners.setdefault(term, []):
+                    owners[term].append((category, whole_words))
+        # The regex reports the longest term starting at each position; shorter terms
+        # starting at the same place are its prefixes and are checked from this table.
+        self._prefixes = {
+            term: [(p, len(p)) for p in owners if term.startswith(p)]
+            for term in owners
+        }
+        self._owners = owners
+        self._regex = re.compile(f"(?=({_trie_pattern(owners)}))")
+        logger.info(f"🔤 Keyword engine '{self.name}': {len(owners)} terms in {len(self.categories)} categories")
+
+    def scan(self, text):
+        """Matching categories for already-lowercased text. The result is shared; don't modify it."""
+        if not text:
+            return _NO_HITS
+        hits = self.cache.get(text)
+        if hits is None:
+            hits = self.match(text)
+            self.cache.set(text, hits)
+        return hits
+
+    def match(self, text):
+        """scan() without the cache: one pass of the compiled pattern over text."""
+        if self._regex is None:
+            self.compile()
+        self.scans += 1
+        found = {}
+        for m in self._regex.finditer(text):
+            start = m.start()
+            for term, length in self._prefixes[m.group(1)]:
+                bounded = None
+                for category, whole_words in self._owners[term]:
+                    if whole_words:
+                        if bounded is None:
+                            bounded = _at_boundary(text, start) and _at_boundary(text, start + length)
+                        if not bounded:
+                            continue
+                    found.setdefault(category, set()).add(term)
+        if not found:
+            return _NO_HITS
+        return MappingProxyType({category: frozenset(terms) for category, terms in found.items()})
+
+    def stats(self):
+        return {"terms": len(self._owners), "categories": len(self.categories), "scans": self.scans, "cache": self.cache.stats()}
@@ -0,0 +1,614 @@
+"""
+Synthetic gateway load for the on_message pipeline.
+
+Builds fake discord.Message objects from a corpus and feeds them into the bot's real
+on_message handlers (the message pipeline plus any @bot.listen('on_message')) at a target
+rate. Upstreams are stubbed in-process with configurable latency, or pointed at the
+record/replay stand-in with --standin. Media downloads are always served in-process.
+Nothing talks to Discord.
+
+    python loadgen.py --rate 20 --duration 30
+    python loadgen.py --ramp 5,10,20,40,80 --step 15            # find the throughput ceiling
+    python loadgen.py --corpus messages.txt --standin http://127.0.0.1:8765
+
+Corpus lines are plain message text. Optional prefixes shape the fake message:
+    @bot ...     mentions the bot          >reply ...   replies to a bot message
+    [img] ...    attaches a PNG            [vid] ...    attaches an MP4
+    @user ...    mentions another member
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import tempfile
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+
+logger = logging.getLogger('prime_loadgen')
+
+DEFAULT_CORPUS = [
+    "yo whats good",
+    "anyone know a good preset for velocity edits?",
+    "@bot how do i do a smooth shake in after effects",
+    "@bot what's the latest after effects version",
+    "!help",
+    "!rank",
+    "[img] check my edit",
+    "[img] @bot what do you think of this thumbnail",
+    "[vid] new edit just dropped",
+    ">reply can you explain that again",
+    "@user you coming to the collab?",
+    "send me some cloud overlays",
+    "this transition is clean fr",
+    "@bot roast my last edit",
+    "lol",
+    "https://youtube.com/watch?v=dQw4w9WgXcQ",
+]
+LAG_INTERVAL = 0.05
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+# --- STATS ---
+class Histogram:
+    def __init__(self):
+        self.samples = []
+
+    def add(self, ms):
+        self.samples.append(ms)
+
+    def pct(self, p):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+    def render(self, name):
+        counts = [0] * (len(BUCKETS_MS) + 1)
+        for ms in self.samples:
+            counts[next((i for i, b in enumerate(BUCKETS_MS) if ms <= b), len(BUCKETS_MS))] += 1
+        peak = max(counts) or 1
+        lines = [f"  {name}: n={len(self.samples)} p50={self.pct(0.5):.1f}ms p95={self.pct(0.95):.1f}ms p99={self.pct(0.99):.1f}ms max={max(self.samples, default=0):.1f}ms"]
+        for i, count in enumerate(counts):
+            if count:
+                label = f"<={BUCKETS_MS[i]}ms" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}ms"
+                lines.append(f"    {label:>9} {'#' * max(1, int(30 * count / peak))} {count}")
+        return "\n".join(lines)
+
+class Recorder:
+    def __init__(self):
+        self.stages = defaultdict(Histogram)
+        self.errors = defaultdict(int)
+        self.sent = 0
+        self.completed = 0
+        self.lag = Histogram()
+        self.unknown_attrs = defaultdict(int)
+
+    def reset(self):
+        self.__init__()
+
+recorder = Recorder()
+botmod_factory = None
+
+def timed(name, func):
+    """Wrap a coroutine function so every call lands in the per-stage histogram."""
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            recorder.errors[f"{name}: {type(e).__name__}"] += 1
+            raise
+        finally:
+            recorder.stages[name].add((time.perf_counter() - started) * 1000)
+    wrapper.__name__ = getattr(func, "__name__", name)
+    return wrapper
+
+async def monitor_lag(stop):
+    """Event-loop lag: how late a 50ms sleep wakes up."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        recorder.lag.add(max(0.0, (time.perf_counter() - started - LAG_INTERVAL) * 1000))
+
+# --- FAKE DISCORD OBJECTS ---
+class Stub:
+    """Stands in for any attribute the fakes don't model: awaitable, callable, falsy, empty."""
+    def __init__(self, path="stub"):
+        self._path = path
+    def __getattr__(self, name):
+        return Stub(f"{self._path}.{name}")
+    def __call__(self, *args, **kwargs):
+        return Stub(f"{self._path}()")
+    def __await__(self):
+        if False:
+            yield
+        return self
+    def __bool__(self):
+        return False
+    def __iter__(self):
+        return iter(())
+    def __aiter__(self):
+        return self
+    async def __anext__(self):
+        raise StopAsyncIteration
+    async def __aenter__(self):
+        return self
+    async def __aexit__(self, *exc):
+        return False
+    def __enter__(self):
+        return self
+    def __exit__(self, *exc):
+        return False
+    def __int__(self):
+        return 0
+    def __len__(self):
+        return 0
+    def __str__(self):
+        return ""
+
+class Fake:
+    """Base for fakes: unknown attributes become Stubs and are counted in the report."""
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        recorder.unknown_attrs[f"{type(self).__name__}.{name}"] += 1
+        return Stub(name)
+
+async def discord_call(name, result=None):
+    """Simulated Discord REST round trip."""
+    started = time.perf_counter()
+    await asyncio.sleep(random.uniform(0.03, 0.12))
+    recorder.stages[f"discord.{name}"].add((time.perf_counter() - started) * 1000)
+    return result
+
+class FakePermissions(Fake):
+    def __init__(self, admin=False):
+        self.administrator = admin
+        self.manage_messages = admin
+        self.manage_guild = admin
+        self.ban_members = admin
+        self.kick_members = admin
+        self.moderate_members = admin
+
+class FakeRole(Fake):
+    def __init__(self, role_id, name):
+        self.id = role_id
+        self.name = name
+        self.mention = f"<@&{role_id}>"
+        self.position = 1
+
+class FakeUser(Fake):
+    def __init__(self, user_id, name, bot=False, guild=None, admin=False):
+        self.id = user_id
+        self.name = name
+        self.display_name = name
+        self.global_name = name
+        self.bot = bot
+        self.mention = f"<@{user_id}>"
+        self.guild = guild
+        self.roles = []
+        self.guild_permissions = FakePermissions(admin)
+        self.created_at = datetime.now(timezone.utc) - timedelta(days=random.randint(40, 2000))
+        self.joined_at = datetime.now(timezone.utc) - timedelta(days=random.randint(1, 400))
+        self.avatar = None
+        self.display_avatar = Stub("display_avatar")
+        self.timed_out_until = None
+
+    def mentioned_in(self, message):
+        return self in message.mentions
+
+    async def send(self, *args, **kwargs):
+        return await discord_call("dm_send", FakeSentMessage(self))
+
+    async def add_roles(self, *roles, **kwargs):
+        await discord_call("add_roles")
+
+    async def remove_roles(self, *roles, **kwargs):
+        await discord_call("remove_roles")
+
+    async def timeout(self, *args, **kwargs):
+        await discord_call("timeout")
+
+    def __eq__(self, other):
+        return isinstance(other, FakeUser) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+class FakeSentMessage(Fake):
+    def __init__(self, channel, content=None):
+        self.id = random.getrandbits(60)
+        self.channel = channel
+        self.content = content or ""
+        self.embeds = []
+
+    async def delete(self, *args, **kwargs):
+        await discord_call("delete")
+
+    async def edit(self, *args, **kwargs):
+        await discord_call("edit")
+        return self
+
+    async def add_reaction(self, *args):
+        await discord_call("add_reaction")
+
+class FakeChannel(Fake):
+    def __init__(self, channel_id, name, guild):
+        self.id = channel_id
+        self.name = name
+        self.guild = guild
+        self.mention = f"<#{channel_id}>"
+        self.recent = []
+        self.slowmode_delay = 0
+
+    async def send(self, content=None, **kwargs):
+        return await discord_call("send", FakeSentMessage(self, content))
+
+    def typing(self):
+        return Stub("typing")
+
+    async def fetch_message(self, message_id):
+        return await discord_call("fetch_message", next((m for m in self.recent if m.id == message_id), None) or self.recent[-1])
+
+    async def history(self, limit=50, **kwargs):
+        for message in list(self.recent)[-limit:][::-1]:
+            yield message
+
+    def permissions_for(self, member):
+        return FakePermissions(True)
+
+class FakeGuild(Fake):
+    def __init__(self, guild_id, name, n_channels=4, n_members=200):
+        self.id = guild_id
+        self.name = name
+        self.owner_id = guild_id + 1
+        self.roles = [FakeRole(guild_id + 100 + i, n) for i, n in enumerate(["@everyone", "Verified", "Muted", "Editor"])]
+        self.channels = [FakeChannel(guild_id + 10 + i, n, self) for i, n in enumerate(["general", "edits", "help", "memes"][:n_channels])]
+        self.text_channels = self.channels
+        self.members = [FakeUser(guild_id + 1000 + i, f"user{i}", guild=self) for i in range(n_members)]
+        self.member_count = n_members
+        self.me = FakeUser(1, "Prime", bot=True, guild=self, admin=True)
+        self.icon = None
+
+    def get_channel(self, channel_id):
+        return next((c for c in self.channels if c.id == channel_id), None)
+
+    def get_member(self, user_id):
+        return next((m for m in self.members if m.id == user_id), None)
+
+    def get_role(self, role_id):
+        return next((r for r in self.roles if r.id == role_id), None)
+
+    async def fetch_member(self, user_id):
+        return await discord_call("fetch_member", self.get_member(user_id))
+
+    async def ban(self, *args, **kwargs):
+        await discord_call("ban")
+
+class FakeAttachment(Fake):
+    def __init__(self, kind, data):
+        self.id = random.getrandbits(60)
+        self.filename = "clip.mp4" if kind == "vid" else "image.png"
+        self.content_type = "video/mp4" if kind == "vid" else "image/png"
+        self.url = f"https://cdn.discordapp.com/attachments/loadgen/{self.id}/{self.filename}"
+        self.proxy_url = self.url
+        self._data = data
+        self.size = len(data)
+        self.width = self.height = 512 if kind == "img" else None
+
+    async def read(self, **kwargs):
+        return await discord_call("attachment_read", self._data)
+
+    async def save(self, fp, **kwargs):
+        data = await self.read()
+        if hasattr(fp, "write"):
+            fp.write(data)
+        else:
+            with open(fp, "wb") as f:
+                f.write(data)
+
+class FakeReference(Fake):
+    def __init__(self, message_id):
+        self.message_id = message_id
+        self.resolved = None
+
+class FakeMessage(Fake):
+    def __init__(self, content, author, channel, attachments=(), mentions=(), reference=None):
+        self.id = random.getrandbits(60)
+        self.content = content
+        self.clean_content = content
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.attachments = list(attachments)
+        self.mentions = list(mentions)
+        self.role_mentions = []
+        self.channel_mentions = []
+        self.mention_everyone = False
+        self.reference = reference
+        self.embeds = []
+        self.stickers = []
+        self.webhook_id = None
+        self.created_at = datetime.now(timezone.utc)
+        self.jump_url = f"https://discord.com/channels/{self.guild.id}/{channel.id}/{self.id}"
+        self._state = None
+
+    async def reply(self, content=None, **kwargs):
+        return await discord_call("reply", FakeSentMessage(self.channel, content))
+
+    async def delete(self, *args, **kwargs):
+        await discord_call("delete")
+
+    async def add_reaction(self, *args):
+        await discord_call("add_reaction")
+
+    async def edit(self, *args, **kwargs):
+        await discord_call("edit")
+
+class MessageFactory:
+    """Turns corpus lines into fake messages spread over a few guilds and many users."""
+    def __init__(self, corpus, bot_user, n_guilds=3):
+        self.corpus = corpus
+        self.bot_user = bot_user
+        self.guilds = [FakeGuild(10**17 + i * 10**6, f"Guild {i}") for i in range(n_guilds)]
+        self.png = self._make_png()
+        self.mp4 = os.urandom(256 * 1024)
+
+    def _make_png(self):
+        try:
+            import io
+            from PIL import Image
+            buf = io.BytesIO()
+            Image.new("RGB", (512, 512), (random.randint(0, 255), 80, 160)).save(buf, format="PNG")
+            return buf.getvalue()
+        except Exception:
+            return os.urandom(64 * 1024)
+
+    def build(self):
+        line = random.choice(self.corpus)
+        guild = random.choice(self.guilds)
+        channel = random.choice(guild.channels)
+        author = random.choice(guild.members)
+        attachments, mentions, reference = [], [], None
+
+        while True:
+            if line.startswith("@bot "):
+                line = f"{self.bot_user.mention} {line[5:]}"
+                mentions.append(self.bot_user)
+            elif line.startswith("@user "):
+                other = random.choice(guild.members)
+                line = f"{other.mention} {line[6:]}"
+                mentions.append(other)
+            elif line.startswith("[img] "):
+                attachments.append(FakeAttachment("img", self.png))
+                line = line[6:]
+            elif line.startswith("[vid] "):
+                attachments.append(FakeAttachment("vid", self.mp4))
+                line = line[6:]
+            elif line.startswith(">reply ") and channel.recent:
+                bot_msg = FakeMessage("earlier answer", self.bot_user, channel)
+                channel.recent.append(bot_msg)
+                reference = FakeReference(bot_msg.id)
+                line = line[7:]
+            else:
+                break
+
+        message = FakeMessage(line, author, channel, attachments, mentions, reference)
+        channel.recent.append(message)
+        del channel.recent[:-50]
+        return message
+
+# --- HARNESS ---
+def prepare_environment(args):
+    """Must run before bot/brain are imported: throwaway DB, fake keys, optional stand-in URLs."""
+    os.environ["DATABASE_URL"] = ""  # empty rather than unset so load_dotenv() can't bring Postgres back
+    os.environ["DATABASE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="loadgen_"), "loadgen.db")
+    os.environ.setdefault("GEMINI_KEY", "loadgen-gemini-key-000000")
+    os.environ.setdefault("GROQ_API_KEY", "loadgen-groq-key")
+    os.environ.setdefault("SERPER_API_KEY", "loadgen-serper-key")
+    os.environ.setdefault("YOUTUBE_API_KEY", "loadgen-youtube-key")
+    if args.standin:
+        base = args.standin.rstrip("/")
+        os.environ["GROQ_BASE_URL"] = f"{base}/groq/openai/v1"
+        os.environ["GEMINI_BASE_URL"] = f"{base}/gemini/"
+        os.environ["SERPER_BASE_URL"] = f"{base}/serper"
+        os.environ["YOUTUBE_API_BASE"] = f"{base}/youtube/youtube/v3"
+        os.environ["DISCORD_API_BASE"] = f"{base}/discord/api"
+
+def lognormal_ms(median_ms):
+    return random.lognormvariate(0, 0.5) * median_ms / 1000
+
+def stub_upstreams(brain, search, botmod, args):
+    """Replace the network edge (not the caching/coalescing/breaker layers above it) with sleeps."""
+    from types import SimpleNamespace
+
+    async def fake_groq(messages, model, temperature, timeout):
+        await asyncio.sleep(lognormal_ms(args.groq_ms))
+        return "stub groq reply. what's next?"
+
+    async def fake_gemini(model, contents, config=None):
+        await asyncio.sleep(lognormal_ms(args.gemini_ms))
+        json_mode = getattr(config, "response_mime_type", None) == "application/json"
+        return SimpleNamespace(text='{"is_safe": true, "users": []}' if json_mode else "stub gemini reply. what's next?")
+
+    async def fake_search(session, *args_):
+        await asyncio.sleep(lognormal_ms(args.search_ms))
+        return [{"title": "stub", "link": "https://example.com", "snippet": "stub result"}]
+
+    async def fake_none(*a, **k):
+        await asyncio.sleep(lognormal_ms(args.search_ms))
+        return None
+
+    brain._groq_chat_completion = fake_groq
+    brain._generate_content = fake_gemini
+    for name in ("_fetch_serper_web", "_fetch_serper_images", "_fetch_youtube_videos"):
+        setattr(search, name, fake_search)
+    search._fetch_youtube_channel = fake_none
+    botmod.generate_image = fake_none
+
+def stub_cdn(media, args):
+    """Media downloads never leave the process; the stand-in doesn't serve Discord's CDN either."""
+    # CDN fetches sleep, but the decode/resize still runs in the real media pool
+    async def fake_download(self, url):
+        await asyncio.sleep(0.05)
+        return await self.prepare(botmod_factory.png)
+    media.ImagePipeline._download = fake_download
+
+    # Every other download (video attachments, platform links, assets) gets a spool of the
+    # corpus payload, with the same size cap and head check as the real stream
+    async def fake_stream_download(url, max_bytes, expected_size=None, on_head=None, headers=None):
+        await asyncio.sleep(0.05)
+        is_video = url.lower().split("?")[0].endswith((".mp4", ".webm", ".mkv", ".mov"))
+        payload = botmod_factory.mp4 if is_video else botmod_factory.png
+        if len(payload) > max_bytes:
+            raise media.DownloadTooLarge(len(payload), max_bytes)
+        if on_head:
+            on_head(payload[:media.HEAD_BYTES], len(payload))
+        return media.SpooledDownload.from_bytes(payload)
+    media.stream_download = fake_stream_download
+
+    async def fake_extract(url):
+        await asyncio.sleep(lognormal_ms(args.search_ms))
+        return {"url": "https://cdn.loadgen.invalid/extracted.mp4", "filesize": len(botmod_factory.mp4), "http_headers": {}}
+    media.extractor.extract = fake_extract
+
+STAGES = [
+    "moderate_message", "moderate_profanity", "moderate_media", "check_and_moderate_spam", "check_server_security",
+    "handle_automatic_resources", "get_gemini_response", "search_and_download_image",
+]
+
+def instrument(botmod, brain):
+    for name in STAGES:
+        if hasattr(botmod, name):
+            setattr(botmod, name, timed(name, getattr(botmod, name)))
+    brain.get_council_response = timed("get_council_response", brain.get_council_response)
+    bot = botmod.bot
+    bot.invoke = timed("invoke_command", bot.invoke)
+    # Each pipeline stage gets its own histogram next to the functions it calls
+    pipeline = botmod.message_pipeline
+    pipeline.stages = [(name, timed(f"stage.{name}", func), stop_on_error) for name, func, stop_on_error in pipeline.stages]
+
+    from discord.ext import commands
+    # Commands reply through ctx.send; route that to the fake channel instead of the HTTP client
+    commands.Context.send = lambda self, *a, **k: self.channel.send(*a, **k)
+    commands.Context.reply = lambda self, *a, **k: self.message.reply(*a, **k)
+    commands.Context.typing = lambda self, *a, **k: Stub("typing")
+
+    handlers = [("on_message", bot.on_message)]
+    for listener in bot.extra_events.get("on_message", []):
+        handlers.append((f"listener.{listener.__name__}", listener))
+    return [(name, timed(name, handler)) for name, handler in handlers]
+
+async def deliver(handlers, message):
+    """Dispatch like the gateway does: every handler runs concurrently."""
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(message) for _, handler in handlers), return_exceptions=True)
+    recorder.stages["message.total"].add((time.perf_counter() - started) * 1000)
+    recorder.completed += 1
+
+async def run_phase(handlers, factory, rate, duration):
+    """Open-loop load: messages arrive on schedule whether or not earlier ones finished."""
+    recorder.reset()
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_lag(stop))
+    tasks = set()
+    started = time.perf_counter()
+    next_at = started
+    while time.perf_counter() - started < duration:
+        next_at += random.expovariate(rate)
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        task = asyncio.create_task(deliver(handlers, factory.build()))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        recorder.sent += 1
+    in_flight = len(tasks)
+    elapsed = time.perf_counter() - started
+    completed_in_window = recorder.completed
+    if tasks:
+        await asyncio.wait(tasks, timeout=30)
+    stop.set()
+    await lag_task
+    return {
+        "rate": rate,
+        "sent": recorder.sent,
+        "throughput": completed_in_window / elapsed,
+        "backlog": in_flight,
+        "lag_p99": recorder.lag.pct(0.99),
+        "total_p95": recorder.stages["message.total"].pct(0.95),
+    }
+
+def report(summary):
+    print(f"\n=== {summary['rate']:.0f} msg/s target: sent {summary['sent']}, completed {summary['throughput']:.1f} msg/s, backlog at end {summary['backlog']} ===")
+    print(recorder.lag.render("event-loop lag"))
+    for name in sorted(recorder.stages, key=lambda n: (n != "message.total", n)):
+        print(recorder.stages[name].render(name))
+    if recorder.errors:
+        print("  errors:")
+        for name, count in sorted(recorder.errors.items(), key=lambda kv: -kv[1])[:15]:
+            print(f"    {count:>6}  {name}")
+    if recorder.unknown_attrs:
+        print("  unmodelled attributes (stubbed):", ", ".join(sorted(recorder.unknown_attrs)[:20]))
+
+async def main_async(args):
+    global botmod_factory
+    import brain
+    import search
+    import media
+    import bot as botmod
+
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, "r", encoding="utf-8") as f:
+            corpus = [line.rstrip("\n") for line in f if line.strip()]
+
+    bot_user = FakeUser(1, "Prime", bot=True)
+    botmod.bot._connection.user = bot_user
+    botmod_factory = MessageFactory(corpus, bot_user, n_guilds=args.guilds)
+    if not args.standin:
+        stub_upstreams(brain, search, botmod, args)
+    stub_cdn(media, args)
+    handlers = instrument(botmod, brain)
+
+    rates = [float(r) for r in args.ramp.split(",")] if args.ramp else [args.rate]
+    duration = args.step if args.ramp else args.duration
+    ceiling = None
+    for rate in rates:
+        summary = await run_phase(handlers, botmod_factory, rate, duration)
+        report(summary)
+        healthy = summary["throughput"] >= 0.95 * rate and summary["lag_p99"] <= args.max_lag_ms
+        if healthy:
+            ceiling = rate
+        elif args.ramp:
+            print(f"\n⛔ Saturated at {rate:.0f} msg/s (throughput {summary['throughput']:.1f}, loop lag p99 {summary['lag_p99']:.0f}ms)")
+            break
+    if args.ramp:
+        print(f"\n📈 Throughput ceiling: {ceiling or 0:.0f} msg/s per worker (loop lag p99 <= {args.max_lag_ms}ms)")
+
+    await search.search_service.close()
+    await media.close_session()
+
+def main():
+    parser = argparse.ArgumentParser(description="Synthetic on_message load generator.")
+    parser.add_argument("--rate", type=float, default=10, help="messages per second")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--ramp", help="comma-separated rates to step through, e.g. 5,10,20,40")
+    parser.add_argument("--step", type=float, default=15, help="seconds per ramp step")
+    parser.add_argument("--corpus", help="text file, one message per line")
+    parser.add_argument("--guilds", type=int, default=3)
+    parser.add_argument("--standin", help="base URL of standin.py replay instead of in-process stubs")
+    parser.add_argument("--groq-ms", type=float, default=450)
+    parser.add_argument("--gemini-ms", type=float, default=2500)
+    parser.add_argument("--search-ms", type=float, default=300)
+    parser.add_argument("--max-lag-ms", type=float, default=100)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    prepare_environment(args)
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    main()
@@ -0,0 +1,762 @@
+import io
+import os
+import re
+import glob
+import tempfile
+import subprocess
+import asyncio
+import hashlib
+import shutil
+import mmap
+import weakref
+import time
+from urllib.parse import urlparse, parse_qs
+import logging
+import aiohttp
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cache import TTLCache
+from concurrency import SingleFlight
+from breakers import UpstreamError
+from database import db_manager
+from perceptual import dhash, near_dupes
+from prescreen import image_features
+
+logger = logging.getLogger('prime_media')
+
+# --- CONFIGURATION ---
+IMAGE_MAX_SIDE = int(os.getenv("IMAGE_MAX_SIDE", "1024"))   # Longest edge sent to vision/moderation models
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", "2"))        # Processes for decode/resize work
+IMAGE_CACHE_TTL = 600
+IMAGE_CACHE_SIZE = 128
+DOWNLOAD_TIMEOUT = 120      # Whole download
+DOWNLOAD_READ_TIMEOUT = 20  # Between chunks
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+SPOOL_MEMORY_BYTES = int(os.getenv("SPOOL_MEMORY_BYTES", str(1024 * 1024)))       # Larger downloads roll over to a temp file
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+VIDEO_MAX_BYTES = int(os.getenv("VIDEO_MAX_BYTES", str(50 * 1024 * 1024)))
+VERDICT_TTL = int(os.getenv("VERDICT_TTL", str(7 * 86400)))     # Moderation verdicts per image
+ANALYSIS_TTL = int(os.getenv("ANALYSIS_TTL", str(86400)))       # Vision/command answers per image + prompt
+VERDICT_CACHE_SIZE = 4096
+HEAD_BYTES = 64 * 1024  # Prefix hashed to recognise known-bad files mid-download
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "2"))
+YTDLP_WORKERS = int(os.getenv("YTDLP_WORKERS", "2"))
+CARD_WORKERS = int(os.getenv("CARD_WORKERS", "1"))         # Generated images: profile cards, captchas
+YTDLP_TIMEOUT = int(os.getenv("YTDLP_TIMEOUT", "45"))          # Per extraction job
+YTDLP_CACHE_TTL = int(os.getenv("YTDLP_CACHE_TTL", "1800"))    # For direct URLs that don't say when they expire
+YTDLP_EXPIRY_MARGIN = 120
+YTDLP_ERROR_TTL = 60
+VIDEO_INLINE_MAX_BYTES = int(os.getenv("VIDEO_INLINE_MAX_BYTES", str(3 * 1024 * 1024)))  # Smaller clips are uploaded whole
+VIDEO_MAX_FRAMES = int(os.getenv("VIDEO_MAX_FRAMES", "18"))
+VIDEO_SCENE_THRESHOLD = float(os.getenv("VIDEO_SCENE_THRESHOLD", "0.3"))
+VIDEO_AUDIO_SECONDS = int(os.getenv("VIDEO_AUDIO_SECONDS", "20"))
+VIDEO_SAMPLE_TIMEOUT = 90
+VIDEO_TILE_WIDTH = 320
+VIDEO_SHEET_COLUMNS = 3
+VIDEO_SHEET_ROWS = 3
+VIDEO_SCENE_SCAN_FRAMES = VIDEO_MAX_FRAMES * 20  # Scene frames kept before thinning; hitting it means the scan stopped early
+FFMPEG = shutil.which("ffmpeg")
+FFPROBE = shutil.which("ffprobe")
+
+_MISSING = object()
+_pools = {}
+POOL_SIZES = {"image": MEDIA_WORKERS, "video": VIDEO_WORKERS, "ytdlp": YTDLP_WORKERS, "cards": CARD_WORKERS}
+
+def pool(name="image"):
+    """Process pool for CPU-heavy media work, created on first use. Video gets its own so long samples don't stall images."""
+    if name not in _pools:
+        _pools[name] = ProcessPoolExecutor(max_workers=POOL_SIZES[name])
+    return _pools[name]
+
+async def run_in_pool(func, *args, pool_name="image"):
+    """Run func in a media process pool; rebuild the pool once if a worker died."""
+    loop = asyncio.get_running_loop()
+    executor = pool(pool_name)
+    try:
+        return await loop.run_in_executor(executor, func, *args)
+    except BrokenProcessPool:
+        if _pools.get(pool_name) is executor:
+            logger.warning(f"⚠️ Media pool '{pool_name}' broke, restarting it")
+            _pools.pop(pool_name, None)
+        return await loop.run_in_executor(pool(pool_name), func, *args)
+
+def _tracked_job(pid_path, func, *args):
+    """Runs in the worker: note which process took the job, so a hung one can be killed."""
+    try:
+        with open(pid_path, "w") as f:
+            f.write(str(os.getpid()))
+    except OSError:
+        pass
+    return func(*args)
+
+async def run_in_pool_with_deadline(func, *args, pool_name="image", timeout=None):
+    """
+    run_in_pool that gives up after timeout seconds and kills the worker stuck on the job.
+    Killing a worker breaks its pool: new jobs go to a fresh one, and jobs that were queued
+    or running beside the hung one are resubmitted there by run_in_pool.
+    """
+    fd, pid_path = tempfile.mkstemp(prefix="prime_job_", suffix=".pid")
+    os.close(fd)
+    executor = pool(pool_name)
+    try:
+        return await asyncio.wait_for(run_in_pool(_tracked_job, pid_path, func, *args, pool_name=pool_name), timeout)
+    except asyncio.TimeoutError:
+        _kill_worker(pool_name, executor, pid_path)
+        raise
+    finally:
+        _unlink(pid_path)
+
+def _kill_worker(pool_name, executor, pid_path):
+    try:
+        with open(pid_path) as f:
+            pid = int(f.read() or 0)
+    except (OSError, ValueError):
+        pid = 0
+    # Only processes of this pool, so a recycled pid can never hit anything else
+    process = (getattr(executor, "_processes", None) or {}).get(pid)
+    if process is None:
+        return  # Still queued behind other work; nothing of ours to kill
+    if _pools.get(pool_name) is executor:
+        _pools.pop(pool_name, None)
+    logger.warning(f"🔪 Killing hung '{pool_name}' worker (pid {pid})")
+    process.kill()
+
+def _digest(data):
+    return hashlib.sha1(data).hexdigest()
+
+def content_hash(data):
+    """Content address for verdicts; the same MD5 get_image_hash has always used."""
+    return hashlib.md5(data).hexdigest()
+
+def head_fingerprint(head, size):
+    """Identifies a file from its size and first HEAD_BYTES, so a download can stop early."""
+    return f"{size}:{_digest(bytes(head[:HEAD_BYTES]))}"
+
+class DownloadBlocked(Exception):
+    """The file being downloaded matches known-bad media."""
+    def __init__(self, fingerprint, verdict):
+        super().__init__(f"blocked media {fingerprint}")
+        self.fingerprint = fingerprint
+        self.verdict = verdict
+
+class DownloadTooLarge(Exception):
+    """The file is (or turned out to be) bigger than the caller's cap."""
+    def __init__(self, size, limit):
+        super().__init__(f"download of {size} bytes exceeds the {limit} byte cap")
+        self.size = size
+        self.limit = limit
+
+# --- DOWNLOADS ---
+_session = None
+
+def session():
+    """Shared session for media downloads."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=DOWNLOAD_TIMEOUT, sock_read=DOWNLOAD_READ_TIMEOUT))
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+class SpooledDownload:
+    """
+    Downloaded bytes held in memory while small and rolled over to a temp file past
+    SPOOL_MEMORY_BYTES. view() gives a zero-copy buffer (an mmap once on disk); the temp
+    file is removed on close() or when the object is garbage collected.
+    """
+    def __init__(self, memory_limit=SPOOL_MEMORY_BYTES):
+        self.memory_limit = memory_limit
+        self.size = 0
+        self.head = bytearray()
+        self.path = None
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._finalizer = None
+
+    @classmethod
+    def from_bytes(cls, data):
+        spool = cls()
+        spool.write(data)
+        return spool
+
+    def write(self, chunk):
+        if len(self.head) < HEAD_BYTES:
+            self.head.extend(chunk[:HEAD_BYTES - len(self.head)])
+        if self._file is None and self.size + len(chunk) > self.memory_limit:
+            self.ensure_file()
+        (self._file or self._buffer).write(chunk)
+        self.size += len(chunk)
+
+    def ensure_file(self):
+        """Roll over to disk (if still in memory) and return the file path."""
+        if self._file is None:
+            fd, self.path = tempfile.mkstemp(prefix="prime_dl_")
+            self._file = os.fdopen(fd, "w+b")
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+            self._finalizer = weakref.finalize(self, _unlink, self.path)
+        self._file.flush()
+        return self.path
+
+    def view(self):
+        """Read-only buffer over the content; use it as a context manager."""
+        if self._file is None:
+            return memoryview(self._buffer.getbuffer())
+        self._file.flush()
+        if not self.size:
+            return memoryview(b"")
+        return mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self):
+        with self.view() as buf:
+            return bytes(buf)
+
+    def digest(self):
+        with self.view() as buf:
+            return _digest(buf)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._finalizer()
+        self._buffer = None
+
+    def __len__(self):
+        return self.size
+
+    def __bool__(self):
+        return self.size > 0
+
+async def stream_download(url, max_bytes, expected_size=None, on_head=None, headers=None):
+    """
+    Stream url into a SpooledDownload, refusing anything over max_bytes: first by the caller's
+    expected_size (e.g. attachment.size), then Content-Length, then the bytes actually read.
+    on_head(head, size) is called once the first HEAD_BYTES are in and may raise to abort.
+    Memory use per download stays around SPOOL_MEMORY_BYTES plus one chunk.
+    """
+    if expected_size and expected_size > max_bytes:
+        raise DownloadTooLarge(expected_size, max_bytes)
+    spool = SpooledDownload()
+    try:
+        async with session().get(url, headers=headers) as response:
+            if response.status != 200:
+                raise UpstreamError(response.url.host, response.status)
+            size = response.content_length
+            if size and size > max_bytes:
+                raise DownloadTooLarge(size, max_bytes)
+            head_checked = False
+            async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_BYTES):
+                spool.write(chunk)
+                if spool.size > max_bytes:
+                    raise DownloadTooLarge(spool.size, max_bytes)
+                if on_head and not head_checked and size and spool.size >= min(size, HEAD_BYTES):
+                    head_checked = True
+                    on_head(bytes(spool.head), size)
+        if on_head and not head_checked:
+            on_head(bytes(spool.head), spool.size)
+    except BaseException:
+        spool.close()
+        raise
+    return spool
+
+_downloads = SingleFlight("downloads")
+
+async def download_media(url, max_bytes, expected_size=None, headers=None):
+    """stream_download with concurrent requests for the same URL (e.g. moderation and review) sharing one transfer."""
+    return await _downloads.do(f"{url}:{max_bytes}", lambda: stream_download(url, max_bytes, expected_size, headers=headers))
+
+# --- IMAGE NORMALIZATION (runs in worker processes) ---
+def normalize_image(data, max_side=IMAGE_MAX_SIDE, quality=IMAGE_JPEG_QUALITY):
+    """
+    Decode once at reduced size, apply EXIF rotation, downscale to max_side and re-encode
+    as a metadata-free RGB JPEG. Returns (jpeg_bytes, (width, height), meta) where meta holds
+    the dhash and the pre-screen features, computed while the image is already decoded.
+    """
+    from PIL import Image, ImageOps
+
+    img = Image.open(io.BytesIO(data))
+    # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale; other formats ignore this
+    img.draft("RGB", (max_side, max_side))
+    img = ImageOps.exif_transpose(img)
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    out = io.BytesIO()
+    img.save(out, format="JPEG", quality=quality, optimize=True)
+    return out.getvalue(), img.size, image_meta(img)
+
+def image_meta(img):
+    meta = {"dhash": dhash(img), "features": None}
+    try:
+        meta["features"] = image_features(img)
+    except Exception:
+        pass  # numpy missing or an odd image; the pre-screen escalates without features
+    return meta
+
+def compute_meta(data, max_side=IMAGE_MAX_SIDE):
+    from PIL import Image
+    img = Image.open(io.BytesIO(data))
+    img.draft("RGB", (max_side, max_side))
+    img = img.convert("RGB")
+    return image_meta(img)
+
+class ImagePipeline:
+    """
+    Turns uploaded images into one normalized buffer that moderation, chat and vision all share.
+    Results are cached by URL and by content hash, and a normalized buffer maps to itself,
+    so passing it through again is free.
+    """
+    def __init__(self):
+        self.by_url = TTLCache(maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL)
+        self.by_hash = TTLCache(maxsize=IMAGE_CACHE_SIZE, ttl=IMAGE_CACHE_TTL)
+        self.fingerprints = TTLCache(maxsize=IMAGE_CACHE_SIZE * 4, ttl=IMAGE_CACHE_TTL)
+        self.meta = TTLCache(maxsize=IMAGE_CACHE_SIZE * 4, ttl=IMAGE_CACHE_TTL)
+        self.flights = SingleFlight("media")
+        self.blocked_early = 0
+        self.processed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def prepare(self, data):
+        """Normalized JPEG bytes for raw image bytes, or None if they can't be decoded."""
+        if not data:
+            return None
+        key = _digest(data)
+        cached = self.by_hash.get(key)
+        if cached is not None:
+            return cached
+        return await self.flights.do(f"hash:{key}", lambda: self._prepare(key, data))
+
+    async def _prepare(self, key, data):
+        try:
+            prepared, size, meta = await run_in_pool(normalize_image, data)
+        except Exception as e:
+            logger.error(f"Error preparing image: {e}")
+            return None
+        self.processed += 1
+        self.bytes_in += len(data)
+        self.bytes_out += len(prepared)
+        self.by_hash.set(key, prepared)
+        self.by_hash.set(_digest(prepared), prepared)
+        self.meta.set(key, meta)
+        self.meta.set(_digest(prepared), meta)
+        logger.debug(f"🖼️ Image normalized to {size[0]}x{size[1]}: {len(data) // 1024}KB -> {len(prepared) // 1024}KB")
+        return prepared
+
+    async def download(self, url, expected_size=None):
+        """
+        Download and normalize an image URL once, however many consumers ask for it.
+        Raises DownloadBlocked as soon as the first HEAD_BYTES match known-bad media.
+        """
+        cached = self.by_url.get(url)
+        if cached is not None:
+            return cached
+        return await self.flights.do(f"url:{url}", lambda: self._download(url, expected_size))
+
+    async def _download(self, url, expected_size=None):
+        await verdicts.load()
+
+        def check_head(head, size):
+            fingerprint = head_fingerprint(head, size)
+            self.fingerprints.set(url, fingerprint)
+            verdict = verdicts.blocked(fingerprint)
+            if verdict:
+                self.blocked_early += 1
+                raise DownloadBlocked(fingerprint, verdict)
+
+        try:
+            spool = await stream_download(url, IMAGE_MAX_BYTES, expected_size, on_head=check_head)
+        except DownloadBlocked:
+            raise
+        except DownloadTooLarge as e:
+            logger.warning(f"⚠️ Image skipped: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"Error downloading image: {str(e)}")
+            return None
+        data = spool.read()
+        spool.close()
+        prepared = await self.prepare(data)
+        if prepared is not None:
+            self.by_url.set(url, prepared)
+        return prepared
+
+    def fingerprint_for(self, url):
+        return self.fingerprints.get(url)
+
+    async def meta_for(self, data):
+        """{"dhash", "features"} for image bytes; free for anything that went through prepare()."""
+        key = _digest(data)
+        value = self.meta.get(key)
+        if value is None:
+            try:
+                value = await run_in_pool(compute_meta, data)
+            except Exception as e:
+                logger.error(f"Error hashing image: {e}")
+                return None
+            self.meta.set(key, value)
+        return value
+
+    async def dhash_for(self, data):
+        """Perceptual hash of image bytes."""
+        meta = await self.meta_for(data)
+        return meta["dhash"] if meta else None
+
+    async def features_for(self, data):
+        """Pre-screen features of image bytes (see prescreen.image_features), or None."""
+        meta = await self.meta_for(data)
+        return meta["features"] if meta else None
+
+    def stats(self):
+        return {
+            "processed": self.processed,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "url_cache": self.by_url.stats(),
+            "hash_cache": self.by_hash.stats(),
+            "coalesced": self.flights.coalesced,
+            "blocked_early": self.blocked_early,
+        }
+
+# --- VIDEO SAMPLING (runs in worker processes) ---
+def _probe_duration(path):
+    if not FFPROBE:
+        return 0.0
+    proc = subprocess.run(
+        [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "default=nw=1:nk=1", path],
+        capture_output=True, timeout=30
+    )
+    try:
+        return float(proc.stdout.decode().strip())
+    except ValueError:
+        return 0.0
+
+def _extract_frames(path, workdir, prefix, select, limit=VIDEO_MAX_FRAMES):
+    """Run one ffmpeg frame-selection pass of at most `limit` frames; returns (jpeg paths, pts timestamps)."""
+    pattern = os.path.join(workdir, f"{prefix}_%03d.jpg")
+    proc = subprocess.run(
+        [FFMPEG, "-hide_banner", "-i", path,
+         "-vf", f"{select},scale={VIDEO_TILE_WIDTH}:-2,showinfo",
+         "-vsync", "vfr", "-frames:v", str(limit), "-q:v", "4", pattern],
+        capture_output=True, timeout=VIDEO_SAMPLE_TIMEOUT
+    )
+    times = [float(t) for t in re.findall(r"pts_time:\s*([\d.]+)", proc.stderr.decode("utf-8", "ignore"))]
+    frames = sorted(glob.glob(os.path.join(workdir, f"{prefix}_*.jpg")))
+    return frames, times
+
+def _spread(frames, times, count):
+    """Thin frames (and their timestamps) to `count` evenly spaced picks, keeping the first and last."""
+    if len(frames) <= count:
+        return frames, times
+    picks = [round(i * (len(frames) - 1) / max(count - 1, 1)) for i in range(count)]
+    return [frames[i] for i in picks], [times[i] for i in picks if i < len(times)]
+
+def _contact_sheets(frames, times):
+    """Tile frames into grids, time-stamped in the corner, as JPEG bytes."""
+    from PIL import Image, ImageDraw
+    per_sheet = VIDEO_SHEET_COLUMNS * VIDEO_SHEET_ROWS
+    sheets = []
+    for start in range(0, len(frames), per_sheet):
+        batch = [Image.open(f).convert("RGB") for f in frames[start:start + per_sheet]]
+        cell_w = VIDEO_TILE_WIDTH
+        cell_h = max(img.height for img in batch)
+        rows = (len(batch) + VIDEO_SHEET_COLUMNS - 1) // VIDEO_SHEET_COLUMNS
+        sheet = Image.new("RGB", (cell_w * min(len(batch), VIDEO_SHEET_COLUMNS), cell_h * rows), (0, 0, 0))
+        draw = ImageDraw.Draw(sheet)
+        for i, img in enumerate(batch):
+            x, y = (i % VIDEO_SHEET_COLUMNS) * cell_w, (i // VIDEO_SHEET_COLUMNS) * cell_h
+            sheet.paste(img, (x, y))
+            if start + i < len(times):
+                seconds = times[start + i]
+                label = f"{int(seconds // 60)}:{seconds % 60:04.1f}"
+                draw.rectangle((x, y, x + 7 * len(label) + 6, y + 14), fill=(0, 0, 0))
+                draw.text((x + 3, y + 2), label, fill=(255, 255, 0))
+        out = io.BytesIO()
+        sheet.save(out, format="JPEG", quality=80, optimize=True)
+        sheets.append(out.getvalue())
+    return sheets
+
+def _extract_audio(path, workdir, duration):
+    """A mono low-bitrate excerpt from the middle of the clip, or None if there is no audio."""
+    out_path = os.path.join(workdir, "excerpt.mp3")
+    start = max(0.0, duration / 2 - VIDEO_AUDIO_SECONDS / 2) if duration else 0.0
+    proc = subprocess.run(
+        [FFMPEG, "-hide_banner", "-loglevel", "error", "-ss", f"{start:.2f}", "-t", str(VIDEO_AUDIO_SECONDS),
+         "-i", path, "-vn", "-ac", "1", "-ar", "16000", "-b:a", "32k", out_path],
+        capture_output=True, timeout=VIDEO_SAMPLE_TIMEOUT
+    )
+    if proc.returncode != 0 or not os.path.exists(out_path):
+        return None
+    with open(out_path, "rb") as f:
+        return f.read() or None
+
+def sample_video(path):
+    """
+    Scene-change keyframes from across the whole clip, thinned to VIDEO_MAX_FRAMES and tiled
+    into contact sheets, plus a short audio excerpt. Falls back to evenly spaced frames when
+    the clip has too few cuts, or so many that the scene scan never reached the end.
+    """
+    with tempfile.TemporaryDirectory(prefix="prime_video_") as workdir:
+        duration = _probe_duration(path)
+        frames, times = _extract_frames(path, workdir, "scene", f"select='eq(n,0)+gt(scene,{VIDEO_SCENE_THRESHOLD})'",
+                                        limit=VIDEO_SCENE_SCAN_FRAMES)
+        if (len(frames) < 4 or len(frames) >= VIDEO_SCENE_SCAN_FRAMES) and duration:
+            frames, times = _extract_frames(path, workdir, "even", f"fps={VIDEO_MAX_FRAMES / duration:.4f}")
+        frames, times = _spread(frames, times, VIDEO_MAX_FRAMES)
+        if not frames:
+            return None
+        return {
+            "sheets": _contact_sheets(frames, times),
+            "audio": _extract_audio(path, workdir, duration),
+            "frames": len(frames),
+            "duration": duration,
+        }
+
+class VideoSampler:
+    """
+    Shrinks videos to what a model needs to judge or review them. Samples are cached by
+    content, so moderation and review of the same upload share one ffmpeg pass.
+    """
+    def __init__(self):
+        self.cache = TTLCache(maxsize=32, ttl=IMAGE_CACHE_TTL)
+        self.flights = SingleFlight("video")
+        self.sampled = 0
+        self.inline = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if not FFMPEG:
+            logger.warning("⚠️ ffmpeg not found; videos will be uploaded whole")
+
+    async def sample(self, video, filename=None):
+        """
+        The sample dict for video bytes or a SpooledDownload, or None when the clip should be
+        uploaded as-is (short, no ffmpeg, or sampling failed).
+        """
+        if not FFMPEG or len(video) <= VIDEO_INLINE_MAX_BYTES:
+            self.inline += 1
+            return None
+        key = video.digest() if isinstance(video, SpooledDownload) else _digest(video)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        return await self.flights.do(key, lambda: self._sample(key, video))
+
+    async def _sample(self, key, video):
+        spool = video if isinstance(video, SpooledDownload) else SpooledDownload.from_bytes(video)
+        try:
+            # Workers read the spooled file directly; the video never crosses the process boundary
+            sample = await run_in_pool(sample_video, spool.ensure_file(), pool_name="video")
+        except Exception as e:
+            logger.error(f"Error sampling video: {e}")
+            sample = None
+        finally:
+            if spool is not video:
+                spool.close()
+        if not sample:
+            self.inline += 1
+            return None
+        size = sum(len(s) for s in sample["sheets"]) + len(sample["audio"] or b"")
+        self.sampled += 1
+        self.bytes_in += len(video)
+        self.bytes_out += size
+        self.cache.set(key, sample)
+        logger.info(f"🎞️ Video sampled: {len(video) // 1024}KB -> {size // 1024}KB ({sample['frames']} frames, {sample['duration']:.0f}s)")
+        return sample
+
+    def stats(self):
+        return {"sampled": self.sampled, "inline": self.inline, "bytes_in": self.bytes_in, "bytes_out": self.bytes_out, "coalesced": self.flights.coalesced}
+
+# --- PLATFORM LINK EXTRACTION (yt-dlp, runs in worker processes) ---
+def extract_media_info(url, max_bytes):
+    """Resolve a platform link (Shorts, Streamable, ...) to a direct media URL without downloading it."""
+    import yt_dlp
+    opts = {
+        'format': 'best[ext=mp4]/best',
+        'quiet': True,
+        'no_warnings': True,
+        'noplaylist': True,
+        'socket_timeout': 15,
+        'max_filesize': max_bytes,
+    }
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False)
+    return {
+        "url": info.get("url"),
+        "ext": info.get("ext", "mp4"),
+        "filesize": info.get("filesize") or info.get("filesize_approx"),
+        "title": info.get("title"),
+        "duration": info.get("duration"),
+        "http_headers": info.get("http_headers") or {},
+    }
+
+def signed_url_ttl(direct_url, now=None):
+    """Seconds until a signed media URL expires (googlevideo 'expire', CloudFront 'Expires', ...), minus a margin."""
+    now = now or time.time()
+    query = parse_qs(urlparse(direct_url or "").query)
+    for name in ("expire", "expires", "Expires", "exp"):
+        value = (query.get(name) or [None])[0]
+        if value and value.isdigit():
+            return max(0, int(value) - now - YTDLP_EXPIRY_MARGIN)
+    return YTDLP_CACHE_TTL
+
+class MediaExtractor:
+    """
+    yt-dlp lookups in their own process pool, off the default executor the Gemini calls use.
+    Results are cached until their signed URL expires, failures briefly, and concurrent
+    lookups of one link share a job.
+    """
+    def __init__(self):
+        self.cache = TTLCache(maxsize=256)
+        self.flights = SingleFlight("ytdlp")
+        self.extracted = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def extract(self, url):
+        """Metadata dict with a direct 'url', or None if extraction failed."""
+        cached = self.cache.get(url, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        return await self.flights.do(url, lambda: self._extract(url))
+
+    async def _extract(self, url):
+        try:
+            info = await run_in_pool_with_deadline(extract_media_info, url, VIDEO_MAX_BYTES, pool_name="ytdlp", timeout=YTDLP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            logger.warning(f"⏱️ yt-dlp timed out after {YTDLP_TIMEOUT}s: {url}")
+            info = None
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"yt-dlp extraction failed for {url}: {e}")
+            info = None
+
+        if not info or not info.get("url"):
+            self.cache.set(url, None, YTDLP_ERROR_TTL)
+            return None
+        self.extracted += 1
+        ttl = signed_url_ttl(info["url"])
+        if ttl:
+            self.cache.set(url, info, ttl)
+        return info
+
+    def stats(self):
+        return {"extracted": self.extracted, "errors": self.errors, "timeouts": self.timeouts, "cache": self.cache.stats(), "coalesced": self.flights.coalesced}
+
+# --- VERDICT CACHE ---
+class VerdictCache:
+    """
+    Content-addressed answers about images, keyed by (content hash, prompt kind, model).
+    Memory first, then the api_cache table. Files judged bad are also recorded by download
+    fingerprint in blocked_media so reposts are stopped before they finish downloading, and by
+    perceptual hash (SEVERE verdicts only) so re-encoded or resized copies are caught too.
+    """
+    def __init__(self):
+        self.memory = TTLCache(maxsize=VERDICT_CACHE_SIZE)
+        self.flights = SingleFlight("verdicts")
+        self.blocklist = {}
+        self.bad_hashes = {}
+        self._loaded = False
+        self._load_lock = None
+        self.db_hits = 0
+
+    def key(self, digest, kind, model):
+        return f"verdict:{kind}:{model}:{digest}"
+
+    async def load(self):
+        """Pull the persisted blocklist into memory once."""
+        if self._loaded:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for row in await asyncio.to_thread(db_manager.get_blocked_media):
+                verdict = {"is_bad": True, "severity": row["severity"], "reason": row["reason"]}
+                self.blocklist[row["fingerprint"]] = verdict
+                if row["content_hash"]:
+                    self.bad_hashes[row["content_hash"]] = verdict
+                if row["dhash"] and row["severity"] == "SEVERE":
+                    near_dupes.block(int(row["dhash"], 16), verdict)
+            self._loaded = True
+            if self.blocklist:
+                logger.info(f"🚫 Loaded {len(self.blocklist)} blocked media fingerprints")
+
+    def blocked(self, fingerprint=None, digest=None):
+        """The stored verdict if this file is known-bad, else None."""
+        return self.blocklist.get(fingerprint) or self.bad_hashes.get(digest)
+
+    async def block(self, fingerprint, digest, verdict, perceptual=None):
+        severity = verdict.get("severity", "MEDIUM")
+        reason = verdict.get("reason", "Inappropriate content")
+        entry = {"is_bad": True, "severity": severity, "reason": reason}
+        if severity != "SEVERE":
+            # A near-duplicate match deletes without review; keep that for the clear-cut cases
+            perceptual = None
+        if fingerprint:
+            self.blocklist[fingerprint] = entry
+        if digest:
+            self.bad_hashes[digest] = entry
+        if perceptual is not None:
+            near_dupes.block(perceptual, entry)
+        await asyncio.to_thread(
+            db_manager.add_blocked_media, fingerprint or f"hash:{digest}", digest, reason, severity,
+            f"{perceptual:016x}" if perceptual is not None else None
+        )
+
+    async def get(self, digest, kind, models):
+        """First cached answer for this image and kind from any of the given models."""
+        for model in ([models] if isinstance(models, str) else models):
+            key = self.key(digest, kind, model)
+            value = self.memory.get(key)
+            if value is not None:
+                return value
+            stored = await asyncio.to_thread(db_manager.get_cached_payload, key)
+            if stored is not None:
+                self.db_hits += 1
+                self.memory.set(key, stored, self.ttl_for(kind))
+                return stored
+        return None
+
+    async def put(self, digest, kind, model, value):
+        key = self.key(digest, kind, model)
+        ttl = self.ttl_for(kind)
+        self.memory.set(key, value, ttl)
+        await asyncio.to_thread(db_manager.save_cached_payload, key, value, ttl)
+
+    async def remember(self, digest, kind, model, factory):
+        """Cached value for (digest, kind, model), computing it once if missing. None results aren't stored."""
+        cached = await self.get(digest, kind, model)
+        if cached is not None:
+            return cached
+
+        async def compute():
+            value = await factory()
+            if value is not None:
+                await self.put(digest, kind, model, value)
+            return value
+        return await self.flights.do(self.key(digest, kind, model), compute)
+
+    def ttl_for(self, kind):
+        return VERDICT_TTL if kind == "moderation" else ANALYSIS_TTL
+
+    def stats(self):
+        return {"cache": self.memory.stats(), "db_hits": self.db_hits, "blocked": len(self.blocklist), "coalesced": self.flights.coalesced}
+
+images = ImagePipeline()
+videos = VideoSampler()
+extractor = MediaExtractor()
+verdicts = VerdictCache()
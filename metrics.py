@@ -0,0 +1,59 @@
+import os
+import hmac
+import logging
+
+logger = logging.getLogger('prime_metrics')
+
+# --- CONFIGURATION ---
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) # 0 keeps the worker's metrics endpoint off
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")       # Scrapers send "Authorization: Bearer <token>"; unset = localhost only
+
+_sources = []
+_server = None
+
+def register(source):
+    """Register a callable yielding (metric_name, labels_dict, value) samples."""
+    _sources.append(source)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{str(v).replace(chr(34), chr(39))}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+def render():
+    """Prometheus text exposition of every registered source."""
+    lines = []
+    for source in _sources:
+        try:
+            for name, labels, value in source():
+                lines.append(f"{name}{_format_labels(labels)} {float(value)}")
+        except Exception as e:
+            logger.error(f"Metrics source failed: {e}")
+    return "\n".join(lines) + "\n"
+
+def authorized(authorization, client_host):
+    """Whether a /metrics request may read the metrics: the bearer token if one is set, else loopback only."""
+    if METRICS_TOKEN:
+        return hmac.compare_digest((authorization or "").encode(), f"Bearer {METRICS_TOKEN}".encode())
+    return client_host in ("127.0.0.1", "::1", "localhost")
+
+async def start_server(port=METRICS_PORT):
+    """Serve /metrics from the bot worker (the web dashboard exposes its own)."""
+    global _server
+    if not port or _server is not None:
+        return
+    from aiohttp import web
+
+    async def handle(request):
+        if not authorized(request.headers.get("Authorization"), request.remote):
+            return web.Response(status=401)
+        return web.Response(text=render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    _server = web.TCPSite(runner, "0.0.0.0", port)
+    await _server.start()
+    logger.info(f"📈 Metrics available on :{port}/metrics")
@@ -0,0 +1,163 @@
+import os
+import time
+import logging
+from collections import deque
+
+logger = logging.getLogger('prime_perceptual')
+
+# --- CONFIGURATION ---
+PHASH_SPAM_DISTANCE = int(os.getenv("PHASH_SPAM_DISTANCE", "8"))     # Max differing bits (of 64) to count as the same image
+PHASH_BLOCK_DISTANCE = int(os.getenv("PHASH_BLOCK_DISTANCE", "6"))   # Stricter, since a blocklist hit deletes without review
+PHASH_WINDOW_SECONDS = int(os.getenv("PHASH_WINDOW_SECONDS", "3600"))
+PHASH_WINDOW_SIZE = 2000  # Posts remembered per guild
+PHASH_MIN_BITS = 6        # Hashes with fewer set (or unset) bits come from flat or smooth images; too many look alike
+PHASH_MIN_STDDEV = 6.0    # Greyscale spread below which an image has too little detail to fingerprint
+
+def dhash(img, size=8):
+    """
+    64-bit difference hash of a PIL image: shrink to 9x8 greyscale and record whether each
+    pixel is brighter than its right-hand neighbour. Survives re-encoding, resizing and light edits.
+    None for near-flat images, whose hash is mostly noise and would match unrelated images.
+    """
+    from PIL import Image, ImageStat
+    grey = img.convert("L")
+    if ImageStat.Stat(grey).stddev[0] < PHASH_MIN_STDDEV:
+        return None
+    small = grey.resize((size + 1, size), Image.LANCZOS)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def informative(value):
+    """Whether a hash has enough detail to match on; all-dark, all-bright and plain gradients don't."""
+    return PHASH_MIN_BITS <= value.bit_count() <= 64 - PHASH_MIN_BITS
+
+class HammingIndex:
+    """
+    Multi-index hashing for radius search over 64-bit hashes. The hash is split into radius+1
+    chunks; by pigeonhole, anything within radius bits matches the query exactly on at least
+    one chunk, so only those buckets are checked. Removal isn't supported; owners rebuild
+    from their live items instead.
+    """
+    def __init__(self, radius, bits=64):
+        self.radius = radius
+        chunks = radius + 1
+        self.slices = []
+        start = 0
+        for i in range(chunks):
+            width = bits // chunks + (1 if i < bits % chunks else 0)
+            self.slices.append((start, (1 << width) - 1))
+            start += width
+        self.tables = [{} for _ in self.slices]
+        self.size = 0
+
+    def add(self, value, item):
+        entry = (value, item)
+        for table, (shift, mask) in zip(self.tables, self.slices):
+            table.setdefault((value >> shift) & mask, []).append(entry)
+        self.size += 1
+
+    def search(self, value, radius=None):
+        """Yield (distance, item) for every item within radius bits of value."""
+        radius = self.radius if radius is None else min(radius, self.radius)
+        seen = set()
+        for table, (shift, mask) in zip(self.tables, self.slices):
+            for entry in table.get((value >> shift) & mask, ()):
+                if id(entry) in seen:
+                    continue
+                seen.add(id(entry))
+                distance = (value ^ entry[0]).bit_count()
+                if distance <= radius:
+                    yield distance, entry[1]
+
+class GuildWindow:
+    """Sliding window of recent image posts in one guild, searchable by near-duplicate."""
+    def __init__(self):
+        self.posts = deque()  # (timestamp, hash, user_id), oldest first
+        self.tree = HammingIndex(PHASH_SPAM_DISTANCE)
+
+    def expire(self, now):
+        stale = 0
+        while self.posts and (now - self.posts[0][0] > PHASH_WINDOW_SECONDS or len(self.posts) > PHASH_WINDOW_SIZE):
+            self.posts.popleft()
+            stale += 1
+        # The tree still holds expired posts; rebuild once they are the majority
+        if stale and self.tree.size > 2 * len(self.posts):
+            self.tree = HammingIndex(PHASH_SPAM_DISTANCE)
+            for post in self.posts:
+                self.tree.add(post[1], post)
+
+    def observe(self, value, user_id, now):
+        """Record a post and return (near-duplicate count including this one, set of posting users)."""
+        self.expire(now)
+        # Anything older than the oldest live post has left the window
+        oldest = self.posts[0][0] if self.posts else now
+        count, users = 1, {user_id}
+        for _, (ts, _, uid) in self.tree.search(value):
+            if ts >= oldest:
+                count += 1
+                users.add(uid)
+        post = (now, value, user_id)
+        self.posts.append(post)
+        self.tree.add(value, post)
+        return count, users
+
+class NearDuplicateIndex:
+    """
+    Per-guild spam windows plus a global blocklist of images confirmed bad. Low-detail hashes
+    are ignored throughout: they collide across unrelated images and would ban innocent posters.
+    """
+    def __init__(self):
+        self.windows = {}
+        self.blocklist = HammingIndex(PHASH_BLOCK_DISTANCE)
+        self.blocklist_hits = 0
+        self._pruned_at = time.monotonic()
+
+    def observe(self, guild_id, value, user_id):
+        if not informative(value):
+            return 1, {user_id}
+        now = time.monotonic()
+        window = self.windows.get(guild_id)
+        if window is None:
+            window = self.windows[guild_id] = GuildWindow()
+        count, users = window.observe(value, user_id, now)
+        if now - self._pruned_at > 60:
+            self.prune(now)
+        return count, users
+
+    def prune(self, now):
+        self._pruned_at = now
+        for guild_id in list(self.windows):
+            window = self.windows[guild_id]
+            window.expire(now)
+            if not window.posts:
+                del self.windows[guild_id]
+
+    def block(self, value, verdict):
+        if informative(value):
+            self.blocklist.add(value, verdict)
+
+    def blocked(self, value):
+        """Verdict for the closest confirmed-bad image within PHASH_BLOCK_DISTANCE, else None."""
+        if not informative(value):
+            return None
+        best = min(self.blocklist.search(value), key=lambda hit: hit[0], default=None)
+        if best is None:
+            return None
+        self.blocklist_hits += 1
+        return best[1]
+
+    def stats(self):
+        return {
+            "guilds": len(self.windows),
+            "posts": sum(len(w.posts) for w in self.windows.values()),
+            "blocklist": self.blocklist.size,
+            "blocklist_hits": self.blocklist_hits,
+        }
+
+near_dupes = NearDuplicateIndex()
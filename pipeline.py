@@ -0,0 +1,127 @@
+import os
+import time
+import logging
+import discord
+from concurrency import Timings
+
+logger = logging.getLogger('prime_pipeline')
+
+# --- CONFIGURATION ---
+PIPELINE_SLOW_MS = int(os.getenv("PIPELINE_SLOW_MS", "2000"))  # Log the stage breakdown of messages slower than this
+
+_UNSET = object()
+
+class MessageContext:
+    """
+    Everything the stages need to know about one message, worked out once: flags, the
+    lowercased content, the referenced message and the command context are fetched at most
+    once however many stages ask. Stages can leave notes for later ones in `data`.
+    """
+    def __init__(self, bot, message):
+        self.bot = bot
+        self.message = message
+        self.content = message.content or ""
+        self.lower = self.content.lower()
+        self.user_id = message.author.id
+        self.guild_id = message.guild.id if message.guild else None
+        self.is_dm = isinstance(message.channel, discord.DMChannel)
+        self.is_self = message.author == bot.user
+        self.is_bot = message.author.bot
+        self.is_mentioned = bot.user.mentioned_in(message)
+        self.is_prefixed = self.content.startswith('!')
+        self.timings = Timings()
+        self.data = {}
+        self._referenced = _UNSET
+        self._command = _UNSET
+
+    async def referenced(self):
+        """The message this one replies to, or None."""
+        if self._referenced is _UNSET:
+            self._referenced = None
+            if self.message.reference:
+                try:
+                    self._referenced = await self.message.channel.fetch_message(self.message.reference.message_id)
+                except Exception:
+                    pass
+        return self._referenced
+
+    async def is_reply_to_bot(self):
+        ref = await self.referenced()
+        return ref is not None and ref.author == self.bot.user
+
+    async def command(self):
+        """commands.Context for the message (parsed once; check .valid)."""
+        if self._command is _UNSET:
+            self._command = await self.bot.get_context(self.message)
+        return self._command
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.stopped = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+class MessagePipeline:
+    """
+    Ordered stages run for every message. A stage is an async function taking a
+    MessageContext; returning True means the message was handled and later stages are
+    skipped. A stage that raises is logged and the pipeline carries on, unless it was added
+    with stop_on_error=True: gatekeeping stages fail closed so an error can't wave a
+    message through to the stages behind them.
+    """
+    def __init__(self, bot, name="messages"):
+        self.bot = bot
+        self.name = name
+        self.stages = []  # (name, func, stop_on_error)
+        self.stage_stats = {}
+        self.processed = 0
+
+    def add(self, name, func, stop_on_error=False):
+        """Append a stage; stages run in the order they were added."""
+        self.stages.append((name, func, stop_on_error))
+        self.stage_stats[name] = StageStats()
+
+    async def run(self, message):
+        ctx = MessageContext(self.bot, message)
+        self.processed += 1
+        stopped_at = None
+        for name, func, stop_on_error in self.stages:
+            stats = self.stage_stats[name]
+            started = time.perf_counter()
+            try:
+                stop = await func(ctx)
+            except Exception as e:
+                stats.errors += 1
+                logger.error(f"Error in message stage '{name}'{' (stopping)' if stop_on_error else ''}: {e}")
+                stop = stop_on_error
+            ctx.timings.mark(name, started)
+            elapsed = ctx.timings.segments[name]
+            stats.calls += 1
+            stats.total_ms += elapsed
+            stats.max_ms = max(stats.max_ms, elapsed)
+            if stop:
+                stats.stopped += 1
+                stopped_at = name
+                break
+        total_ms = (time.perf_counter() - ctx.timings.started) * 1000
+        if total_ms > PIPELINE_SLOW_MS:
+            logger.info(f"🐢 Slow message ({stopped_at or 'all stages'}): {ctx.timings.summary()}")
+        return ctx
+
+    def stats(self):
+        return {
+            name: {"calls": s.calls, "stopped": s.stopped, "errors": s.errors,
+                   "avg_ms": round(s.total_ms / s.calls, 2) if s.calls else 0.0, "max_ms": round(s.max_ms, 2)}
+            for name, s in self.stage_stats.items()
+        }
+
+    def samples(self):
+        for name, s in self.stage_stats.items():
+            labels = {"pipeline": self.name, "stage": name}
+            yield "prime_pipeline_stage_calls_total", labels, s.calls
+            yield "prime_pipeline_stage_stopped_total", labels, s.stopped
+            yield "prime_pipeline_stage_errors_total", labels, s.errors
+            yield "prime_pipeline_stage_seconds_sum", labels, s.total_ms / 1000
+        yield "prime_pipeline_messages_total", {"pipeline": self.name}, self.processed
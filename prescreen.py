@@ -0,0 +1,172 @@
+import os
+import re
+import logging
+import metrics
+from collections import Counter, deque
+from perceptual import HammingIndex, informative
+
+logger = logging.getLogger('prime_prescreen')
+
+# --- CONFIGURATION ---
+PRESCREEN_TINY_PX = int(os.getenv("PRESCREEN_TINY_PX", "160"))              # Emotes/stickers: both sides at or under this
+PRESCREEN_TINY_BYTES = int(os.getenv("PRESCREEN_TINY_BYTES", "2048"))       # Files this small can't carry much of anything
+PRESCREEN_ALLOW_DISTANCE = int(os.getenv("PRESCREEN_ALLOW_DISTANCE", "4"))  # dHash bits from an approved image
+PRESCREEN_SKIN_CLEAR = float(os.getenv("PRESCREEN_SKIN_CLEAR", "0.04"))     # Below this skin ratio an image can be cleared locally
+PRESCREEN_CHROMA_CLEAR = float(os.getenv("PRESCREEN_CHROMA_CLEAR", "0.25")) # Share of clearly coloured pixels needed to clear locally
+PRESCREEN_BLOOD_CLEAR = 0.01
+PRESCREEN_CHROMA_MIN = 32     # max(r,g,b) - min(r,g,b) for a pixel to count as coloured
+PRESCREEN_HUE_BINS_CLEAR = 3  # Distinct hue bins (of 12) a clearable image must spread over
+PRESCREEN_FLAT_CLEAR = 0.45  # Share of the two dominant colours; above it the image is text/graphic-like (possible scam)
+PRESCREEN_ALLOWLIST_SIZE = 20000
+
+# QR payloads that are scams on their own
+QR_SCAM_PATTERNS = re.compile(
+    r"(discord(app)?\.com/ra/|discord\.gift/|discord(app)?\.com/gifts/|"
+    r"^(bitcoin|ethereum|litecoin|solana|tron):|free.?nitro|steamcommunity\.com/tradeoffer)",
+    re.IGNORECASE
+)
+# Server invites: often raid bait, but a server's own invite QR is fine, so the model decides
+QR_INVITE_PATTERNS = re.compile(r"(discord\.gg/|discord(app)?\.com/invite/)", re.IGNORECASE)
+
+# --- FEATURES (runs in worker processes, on the already-decoded image) ---
+def image_features(img):
+    """Cheap content signals for a PIL image: skin/blood/flat-colour/chroma ratios, hue spread and any QR payload."""
+    import numpy as np
+
+    small = img.copy()
+    small.thumbnail((256, 256))
+    rgb = np.asarray(small.convert("RGB"), dtype=np.int16)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    ycbcr = np.asarray(small.convert("YCbCr"), dtype=np.int16)
+    cb, cr = ycbcr[..., 1], ycbcr[..., 2]
+
+    skin = (cb >= 77) & (cb <= 127) & (cr >= 133) & (cr <= 173)
+    blood = (r > 110) & (g < 50) & (b < 50) & (r > 2 * g)
+    quantized = ((r >> 4) << 8) | ((g >> 4) << 4) | (b >> 4)
+    counts = np.bincount(quantized.ravel(), minlength=4096)
+    top_two = np.sort(counts)[-2:].sum()
+
+    # Skin and blood tests are colour tests, so they say nothing about grayscale, washed-out
+    # or single-tint images; those need enough colour spread over several hues to be judged
+    rgb_max, rgb_min = rgb.max(axis=-1), rgb.min(axis=-1)
+    chromatic = (rgb_max - rgb_min) >= PRESCREEN_CHROMA_MIN
+    hue = np.asarray(small.convert("RGB").convert("HSV"), dtype=np.int16)[..., 0]
+    hue_counts = np.bincount((hue[chromatic] * 12) // 256, minlength=12)
+    hue_bins = int((hue_counts >= max(1, chromatic.sum() * 0.05)).sum()) if chromatic.any() else 0
+
+    return {
+        "width": img.width,
+        "height": img.height,
+        "skin_ratio": float(skin.mean()),
+        "blood_ratio": float(blood.mean()),
+        "flat_ratio": float(top_two / quantized.size),
+        "chroma_ratio": float(chromatic.mean()),
+        "hue_bins": hue_bins,
+        "qr": decode_qr(img),
+    }
+
+def decode_qr(img):
+    """QR payload in the image, if any. Needs OpenCV; without it this tier is skipped."""
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        return None
+    try:
+        gray = np.asarray(img.convert("L"))
+        text, points, _ = cv2.QRCodeDetector().detectAndDecode(gray)
+        if text:
+            return text
+        return "" if points is not None else None  # "" = a code was found but couldn't be read
+    except Exception:
+        return None
+
+class PreScreen:
+    """
+    Local tiers in front of LLM image moderation. Each returns allow, block or escalate:
+    allowlist (near-duplicates of images Gemini already passed), qr (decoded locally),
+    size (emotes/stickers), heuristics (skin/blood/flat-colour ratios on clearly colourful images).
+    Only escalations go to Gemini.
+    """
+    def __init__(self):
+        self.allowlist = HammingIndex(PRESCREEN_ALLOW_DISTANCE)
+        self._approved = deque()
+        self.decisions = Counter() # (tier, outcome) -> count
+
+    def record(self, tier, outcome):
+        self.decisions[(tier, outcome)] += 1
+        return outcome
+
+    def tiny(self, width, height, size=None):
+        """Whether attachment metadata marks an image as too small for the model (see screen's size tier)."""
+        small_image = width and height and width <= PRESCREEN_TINY_PX and height <= PRESCREEN_TINY_PX
+        return bool(small_image or (size and size <= PRESCREEN_TINY_BYTES))
+
+    def approve(self, perceptual):
+        """Remember an image the model passed so near-copies skip the model next time."""
+        if perceptual is None or not informative(perceptual):
+            return
+        self._approved.append(perceptual)
+        self.allowlist.add(perceptual, True)
+        if len(self._approved) > PRESCREEN_ALLOWLIST_SIZE:
+            # No removal in the index; rebuild from the newest half
+            while len(self._approved) > PRESCREEN_ALLOWLIST_SIZE // 2:
+                self._approved.popleft()
+            self.allowlist = HammingIndex(PRESCREEN_ALLOW_DISTANCE)
+            for value in self._approved:
+                self.allowlist.add(value, True)
+
+    def screen(self, perceptual, features, tiny=False):
+        """
+        Decision for a downloaded image: {"decision": "allow"|"block"|"escalate", "tier": ..., "reason": ...}.
+        Escalations may carry "hints" to pass on to the model. Blocks are local heuristics and
+        should not be persisted as if a model had confirmed them. `tiny` (from tiny()) clears an
+        image once the QR tier has run; hash and spam checks happen before this in the caller.
+        """
+        if perceptual is not None and informative(perceptual) and next(self.allowlist.search(perceptual), None):
+            self.record("allowlist", "allow")
+            return {"decision": "allow", "tier": "allowlist"}
+        if not features:
+            if tiny:
+                self.record("size", "allow")
+                return {"decision": "allow", "tier": "size"}
+            self.record("features", "escalate")
+            return {"decision": "escalate", "tier": "features"}
+
+        qr = features.get("qr")
+        if qr is not None:
+            if qr and QR_SCAM_PATTERNS.search(qr):
+                self.record("qr", "block")
+                return {"decision": "block", "tier": "qr", "reason": f"QR code scam ({qr[:80]})"}
+            self.record("qr", "escalate")
+            hint = f"The image contains a QR code that decodes to: {qr[:300]}" if qr else "The image contains a QR code that could not be decoded."
+            if qr and QR_INVITE_PATTERNS.search(qr):
+                hint += " (a Discord server invite; only flag it if the image presents it as a giveaway, nitro or verification lure)"
+            return {"decision": "escalate", "tier": "qr", "hints": [hint]}
+
+        if tiny:
+            self.record("size", "allow")
+            return {"decision": "allow", "tier": "size"}
+
+        # Clearing needs a positive sign too: a colourful image spread over several hues, where
+        # the colour-based tests are meaningful. Grayscale, desaturated and tinted images escalate.
+        if (features.get("chroma_ratio", 0.0) >= PRESCREEN_CHROMA_CLEAR
+                and features.get("hue_bins", 0) >= PRESCREEN_HUE_BINS_CLEAR
+                and features["skin_ratio"] < PRESCREEN_SKIN_CLEAR
+                and features["blood_ratio"] < PRESCREEN_BLOOD_CLEAR
+                and features["flat_ratio"] < PRESCREEN_FLAT_CLEAR):
+            self.record("heuristics", "allow")
+            return {"decision": "allow", "tier": "heuristics"}
+        self.record("heuristics", "escalate")
+        return {"decision": "escalate", "tier": "heuristics"}
+
+    def stats(self):
+        return {f"{tier}:{outcome}": count for (tier, outcome), count in sorted(self.decisions.items())}
+
+    def samples(self):
+        for (tier, outcome), count in self.decisions.items():
+            yield "prime_prescreen_decisions_total", {"tier": tier, "outcome": outcome}, count
+        yield "prime_prescreen_allowlist_size", {}, self.allowlist.size
+
+prescreen = PreScreen()
+metrics.register(prescreen.samples)
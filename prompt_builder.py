@@ -0,0 +1,102 @@
+import os
+import re
+import logging
+
+logger = logging.getLogger('prime_prompt')
+
+# --- CONFIGURATION ---
+# Token budgets per route. Groq's free tier is limited per minute, so it gets the tighter one.
+PROMPT_BUDGETS = {
+    "groq": int(os.getenv("PROMPT_BUDGET_GROQ", "6000")),
+    "gemini": int(os.getenv("PROMPT_BUDGET_GEMINI", "16000")),
+}
+CHARS_PER_TOKEN = 4
+MAX_TURN_TOKENS = int(os.getenv("PROMPT_MAX_TURN_TOKENS", "800"))
+CODE_STUB_LINES = 15 # Same threshold the chat handler uses to export code as a file
+
+CODE_BLOCK_RE = re.compile(r'```(\w*)\n([\s\S]*?)```')
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 chars per token) good enough for budgeting."""
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def truncate_to_tokens(text, max_tokens):
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text[:max(0, max_tokens * CHARS_PER_TOKEN - 3)].rstrip() + "..."
+
+def stub_code_blocks(text, max_lines=CODE_STUB_LINES):
+    """Replace large or JSON code blocks with a one-line stub; they were already delivered."""
+    def _stub(match):
+        lang, code = match.group(1), match.group(2)
+        lines = len(code.splitlines())
+        if lang.lower() == "json" or lines > max_lines:
+            return f"[{(lang or 'code').upper()} block, {lines} lines, already sent - omitted]"
+        return match.group(0)
+    return CODE_BLOCK_RE.sub(_stub, text)
+
+def compact_turn(text):
+    return truncate_to_tokens(stub_code_blocks(text), MAX_TURN_TOKENS)
+
+class PromptBuilder:
+    """
+    Assembles the system prompt from named segments under a token budget.
+    Required segments are always kept; optional ones are trimmed to whatever
+    is left, in the order they were added. History gets the remainder.
+    """
+    def __init__(self, route):
+        self.route = route
+        self.budget = PROMPT_BUDGETS.get(route, PROMPT_BUDGETS["gemini"])
+        self.segments = [] # (name, text, max_tokens, required)
+        self.reserved = 0
+        self.usage = {}
+
+    def add(self, name, text, max_tokens=None, required=False):
+        if text:
+            self.segments.append((name, text, max_tokens, required))
+        return self
+
+    def reserve(self, name, text):
+        """Account for text sent outside the system prompt (e.g. the user's question)."""
+        tokens = estimate_tokens(text)
+        self.reserved += tokens
+        self.usage[name] = tokens
+        return self
+
+    def build_system(self):
+        remaining = self.budget - self.reserved
+        remaining -= sum(estimate_tokens(text) for _, text, _, required in self.segments if required)
+
+        parts = []
+        for name, text, max_tokens, required in self.segments:
+            if not required:
+                cap = remaining if max_tokens is None else min(max_tokens, remaining)
+                if cap <= 0:
+                    self.usage[name] = 0
+                    continue
+                text = truncate_to_tokens(text, cap)
+                remaining -= estimate_tokens(text)
+            self.usage[name] = estimate_tokens(text)
+            parts.append(text)
+        return "".join(parts)
+
+    def fit_history(self, turns):
+        """Return the newest turns (oldest first) that fit in what is left of the budget."""
+        remaining = self.budget - sum(self.usage.values())
+        kept = []
+        for turn in reversed(turns):
+            text = compact_turn(turn['parts'][0]['text'])
+            cost = estimate_tokens(text)
+            if cost > remaining:
+                break
+            remaining -= cost
+            kept.append({"role": turn['role'], "parts": [{"text": text}]})
+        kept.reverse()
+        self.usage["history"] = sum(estimate_tokens(t['parts'][0]['text']) for t in kept)
+        logger.debug(f"🧮 PROMPT[{self.route}]: {self.used()}/{self.budget} tokens, history {len(kept)}/{len(turns)} turns")
+        return kept
+
+    def used(self):
+        return sum(self.usage.values())
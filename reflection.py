@@ -0,0 +1,105 @@
+import os
+import asyncio
+import logging
+import time
+from concurrency import Lane, LaneFull
+
+logger = logging.getLogger('prime_reflection')
+
+# --- CONFIGURATION ---
+REFLECT_AFTER_TURNS = int(os.getenv("REFLECT_AFTER_TURNS", "6"))      # Exchanges before a user is due
+REFLECT_IDLE_SECONDS = int(os.getenv("REFLECT_IDLE_SECONDS", "600"))  # ...or this long since their last one
+REFLECT_BATCH_SIZE = int(os.getenv("REFLECT_BATCH_SIZE", "6"))        # Users packed into one request
+REFLECT_TICK_SECONDS = 30
+REFLECT_SHED_INFLIGHT = int(os.getenv("REFLECT_SHED_INFLIGHT", "4"))  # Skip a tick while chat is this busy
+REFLECT_MAX_FAILURES = int(os.getenv("REFLECT_MAX_FAILURES", "3"))    # Give up on a user after this many failed attempts
+
+class ReflectionScheduler:
+    """
+    Collects users whose memory is due for a refresh and reflects on them in batches.
+    A user becomes due after REFLECT_AFTER_TURNS new exchanges, or once they go idle
+    with any unreflected exchanges. Batches run on a low-priority lane and are skipped
+    (not dropped) while foreground traffic is heavy. Users a batch fails for are retried
+    with exponential backoff and dropped after REFLECT_MAX_FAILURES attempts.
+    """
+    def __init__(self, handler, load=None):
+        self.handler = handler # async handler(list_of_contexts)
+        self.load = load or (lambda: 0)
+        self.lane = Lane("reflection", limit=1, max_waiting=0)
+        self._pending = {} # user_id -> [context, new_turns, last_turn_at, failures, retry_at]
+        self._task = None
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+
+    def note_turn(self, context):
+        entry = self._pending.get(context.user_id)
+        if entry is None:
+            entry = self._pending[context.user_id] = [context, 0, 0.0, 0, 0.0]
+        entry[0] = context
+        entry[1] += 1
+        entry[2] = time.monotonic()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def due(self):
+        now = time.monotonic()
+        ready = [e for e in self._pending.values()
+                 if e[4] <= now and (e[1] >= REFLECT_AFTER_TURNS or now - e[2] >= REFLECT_IDLE_SECONDS)]
+        ready.sort(key=lambda e: e[2])
+        return [e[0] for e in ready]
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(REFLECT_TICK_SECONDS)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Reflection tick failed: {e}")
+
+    async def flush(self, force=False):
+        contexts = list(e[0] for e in self._pending.values()) if force else self.due()
+        if not contexts:
+            return
+        if not force and self.load() >= REFLECT_SHED_INFLIGHT:
+            logger.debug(f"🪫 Reflection deferred, {self.load()} chat calls in flight")
+            return
+
+        for i in range(0, len(contexts), REFLECT_BATCH_SIZE):
+            batch = contexts[i:i + REFLECT_BATCH_SIZE]
+            seen = {c.user_id: self._pending[c.user_id][1] for c in batch}
+            try:
+                reflected = await self.lane.run(lambda b=batch: self.handler(b))
+            except LaneFull:
+                return
+            except Exception as e:
+                logger.error(f"Reflection batch failed: {e}")
+                reflected = set()
+            else:
+                self.batches += 1
+            # Only forget users the model actually answered for, and keep anyone who kept
+            # chatting while it ran; the rest back off before their next attempt
+            for user_id, turns in seen.items():
+                entry = self._pending.get(user_id)
+                if entry is None:
+                    continue
+                if user_id in reflected:
+                    entry[1] -= turns
+                    entry[3] = 0
+                    if entry[1] <= 0:
+                        del self._pending[user_id]
+                else:
+                    self._failed(user_id, entry)
+
+    def _failed(self, user_id, entry):
+        self.failures += 1
+        entry[3] += 1
+        if entry[3] >= REFLECT_MAX_FAILURES:
+            del self._pending[user_id]
+            self.dropped += 1
+            logger.warning(f"⚠️ Giving up on reflecting user {user_id} after {entry[3]} failed attempts")
+            return
+        entry[4] = time.monotonic() + REFLECT_TICK_SECONDS * 2 ** entry[3]
+
+    def stats(self):
+        return {"pending_users": len(self._pending), "batches": self.batches, "failures": self.failures, "dropped": self.dropped, **self.lane.stats()}
@@ -0,0 +1,143 @@
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+
+logger = logging.getLogger('prime_router')
+
+# --- CONFIGURATION ---
+ROUTER_WINDOW = 50                 # Samples kept per route
+ROUTER_WINDOW_SECONDS = 300        # Older samples are ignored so a recovered provider gets another chance
+ROUTER_MIN_SAMPLES = 5
+ROUTER_MAX_ERROR_RATE = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+ROUTER_HEDGE = os.getenv("ROUTER_HEDGE", "1") == "1"
+ROUTER_HEDGE_MIN = float(os.getenv("ROUTER_HEDGE_MIN", "1.5"))    # Never hedge sooner than this (seconds)
+ROUTER_HEDGE_MAX = float(os.getenv("ROUTER_HEDGE_MAX", "12"))     # ...or later than this
+
+class RouteStats:
+    """Rolling latency and error rate for one provider:model pair."""
+    def __init__(self, name, prior_latency):
+        self.name = name
+        self.prior_latency = prior_latency
+        self.samples = deque(maxlen=ROUTER_WINDOW) # (finished_at, latency_s, ok)
+
+    def record(self, latency, ok):
+        self.samples.append((time.monotonic(), latency, ok))
+
+    def recent(self):
+        cutoff = time.monotonic() - ROUTER_WINDOW_SECONDS
+        return [s for s in self.samples if s[0] >= cutoff]
+
+    def error_rate(self):
+        recent = self.recent()
+        if len(recent) < ROUTER_MIN_SAMPLES:
+            return 0.0
+        return sum(1 for s in recent if not s[2]) / len(recent)
+
+    def percentile(self, pct):
+        latencies = sorted(s[1] for s in self.recent() if s[2])
+        if not latencies:
+            return self.prior_latency
+        return latencies[min(len(latencies) - 1, int(len(latencies) * pct))]
+
+    def healthy(self):
+        return self.error_rate() < ROUTER_MAX_ERROR_RATE
+
+    def expected_cost(self):
+        # Median latency, inflated by how often this route fails and has to be retried elsewhere
+        return self.percentile(0.5) * (1 + 3 * self.error_rate())
+
+    def stats(self):
+        recent = self.recent()
+        return {
+            "samples": len(recent),
+            "p50": round(self.percentile(0.5), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "error_rate": round(self.error_rate(), 3),
+            "healthy": self.healthy(),
+        }
+
+class ProviderRouter:
+    """
+    Picks the fastest healthy route for a request and optionally hedges it: if the first
+    choice has not answered by its p95 latency, the runner-up is started as well and
+    whichever returns a usable answer first wins.
+    """
+    def __init__(self):
+        self.routes = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def register(self, name, prior_latency):
+        if name not in self.routes:
+            self.routes[name] = RouteStats(name, prior_latency)
+
+    def order(self, names):
+        return sorted(names, key=lambda n: (not self.routes[n].healthy(), self.routes[n].expected_cost()))
+
+    async def _attempt(self, name, factory):
+        started = time.monotonic()
+        try:
+            result = await factory()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.routes[name].record(time.monotonic() - started, False)
+            raise
+        self.routes[name].record(time.monotonic() - started, result is not None)
+        return result
+
+    async def run(self, request_class, candidates, hedge=ROUTER_HEDGE):
+        """
+        candidates: {route_name: async factory returning a result, or None on failure}.
+        Returns the first usable result; re-raises the last error if every route failed.
+        """
+        queue = self.order(list(candidates))
+        logger.debug(f"🧭 {request_class}: route order {queue}")
+        pending = {}
+        last_error = None
+
+        def launch():
+            name = queue.pop(0)
+            pending[asyncio.ensure_future(self._attempt(name, candidates[name]))] = name
+            return name
+
+        primary = launch()
+        hedged = False
+        try:
+            while pending:
+                timeout = None
+                if hedge and queue and len(pending) == 1:
+                    timeout = min(ROUTER_HEDGE_MAX, max(ROUTER_HEDGE_MIN, self.routes[primary].percentile(0.95)))
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    hedged = True
+                    logger.info(f"🪁 {request_class}: {primary} slower than {timeout:.1f}s, hedging with {queue[0]}")
+                    launch()
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        result = None
+                    if result is not None:
+                        if hedged and name != primary:
+                            self.hedge_wins += 1
+                        return result
+                if not pending and queue:
+                    # Everything in flight failed; fall through to the next route right away
+                    primary = launch()
+                    hedged = False
+        finally:
+            for task in pending:
+                task.cancel()
+        if last_error:
+            raise last_error
+        return None
+
+    def stats(self):
+        return {"hedges": self.hedges, "hedge_wins": self.hedge_wins, "routes": {n: r.stats() for n, r in self.routes.items()}}
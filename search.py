@@ -0,0 +1,217 @@
+import os
+import re
+import json
+import time
+import asyncio
+import logging
+import aiohttp
+from urllib.parse import urlparse
+from database import db_manager
+from config import SERPER_BASE_URL, YOUTUBE_API_BASE
+from cache import TTLCache
+from concurrency import SingleFlight, Lane, LaneFull, request_key
+from breakers import breakers, CircuitOpen, UpstreamError
+
+logger = logging.getLogger('prime_search')
+
+# --- CONFIGURATION ---
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "1800"))
+SEARCH_NEGATIVE_TTL = int(os.getenv("SEARCH_NEGATIVE_TTL", "300")) # Empty results are cached too, just not for as long
+SEARCH_CACHE_SIZE = 1024
+SEARCH_TIMEOUT = 10
+SEARCH_MAX_WAITING = 16
+
+# Per-provider concurrency cap and what one request costs
+PROVIDERS = {
+    "serper": {"host": urlparse(SERPER_BASE_URL).netloc, "limit": int(os.getenv("SERPER_CONCURRENCY", "4")), "usd_per_unit": float(os.getenv("SERPER_COST_PER_QUERY", "0.001"))},
+    "youtube": {"host": urlparse(YOUTUBE_API_BASE).netloc, "limit": int(os.getenv("YOUTUBE_CONCURRENCY", "4")), "usd_per_unit": 0.0}, # Free, but quota-limited (10k units/day)
+}
+
+# Phrases that actually need fresh data. Generic words like "get", "who" or "how to" are left to the model.
+WEB_SEARCH_PATTERNS = re.compile(
+    r"\b(latest|current(ly)?|recent(ly)?|today|tonight|yesterday|this (week|month|year)|right now|news|"
+    r"price[sd]?|cost of|weather|forecast|stocks?|release date|come out|came out|who won|score[sd]?|"
+    r"what happened|search (for|up)|look (it )?up|google( it)?|20[2-3]\d)\b",
+    re.IGNORECASE
+)
+PRICE_PATTERN = re.compile(r"[$€£]\s?\d")
+
+_MISSING = object()
+
+def needs_web_search(text):
+    """Cheap check for questions that need real-time results rather than model knowledge."""
+    if not text:
+        return False
+    return bool(WEB_SEARCH_PATTERNS.search(text) or PRICE_PATTERN.search(text))
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation so near-identical queries share a cache entry."""
+    query = re.sub(r"\s+", " ", (query or "").strip().lower())
+    return query.rstrip("?!. ")
+
+class SearchService:
+    """
+    One entry point for Serper and YouTube lookups.
+    Lookups go memory cache -> DB cache -> provider. Concurrent identical lookups share a
+    request, each provider has its own concurrency cap, and empty answers are cached briefly
+    so repeated misses don't keep spending quota.
+    """
+    def __init__(self):
+        self.memory = TTLCache(maxsize=SEARCH_CACHE_SIZE, ttl=SEARCH_CACHE_TTL)
+        self.flights = SingleFlight("search")
+        self.lanes = {name: Lane(f"search:{name}", cfg["limit"], max_waiting=SEARCH_MAX_WAITING) for name, cfg in PROVIDERS.items()}
+        self.provider_stats = {name: {"calls": 0, "errors": 0, "shed": 0, "units": 0, "usd": 0.0, "total_ms": 0.0} for name in PROVIDERS}
+        self.db_hits = 0
+        self._session = None
+
+    def session(self):
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT))
+        return self._session
+
+    async def close(self):
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    def cache_key(self, kind, query, *extra):
+        return f"search:{kind}:" + request_key(query, *extra)
+
+    async def lookup(self, kind, provider, units, query, fetch, *extra, empty=None):
+        query = normalize_query(query)
+        if not query:
+            return empty
+        key = self.cache_key(kind, query, *extra)
+        cached = self.memory.get(key, _MISSING)
+        if cached is not _MISSING:
+            return cached
+        return await self.flights.do(key, lambda: self._resolve(key, provider, units, query, fetch, extra, empty))
+
+    async def _resolve(self, key, provider, units, query, fetch, extra, empty):
+        stored = await asyncio.to_thread(db_manager.get_cached_payload, key)
+        if stored is not None:
+            self.db_hits += 1
+            value = stored.get("value")
+            self.memory.set(key, value, SEARCH_CACHE_TTL if value else SEARCH_NEGATIVE_TTL)
+            return value
+
+        stats = self.provider_stats[provider]
+        breaker = breakers.get(provider, host=PROVIDERS[provider]["host"])
+        started = time.perf_counter()
+        try:
+            value = await self.lanes[provider].run(lambda: breaker.call(lambda: fetch(self.session(), query, *extra)))
+        except (LaneFull, CircuitOpen) as e:
+            stats["shed"] += 1
+            logger.warning(f"🪫 {provider} search skipped ({type(e).__name__}): {query}")
+            return empty
+        except Exception as e:
+            # Errors are not cached; the next caller tries again
+            stats["errors"] += 1
+            stats["calls"] += 1
+            stats["total_ms"] += (time.perf_counter() - started) * 1000
+            logger.error(f"{provider} search error ({query}): {e}")
+            return empty
+        stats["calls"] += 1
+        stats["total_ms"] += (time.perf_counter() - started) * 1000
+        stats["units"] += units
+        stats["usd"] += units * PROVIDERS[provider]["usd_per_unit"]
+
+        ttl = SEARCH_CACHE_TTL if value else SEARCH_NEGATIVE_TTL
+        self.memory.set(key, value, ttl)
+        asyncio.create_task(asyncio.to_thread(db_manager.save_cached_payload, key, {"value": value}, ttl))
+        return value
+
+    # --- Public lookups ---
+    async def web(self, query):
+        """Top 5 organic Google results via Serper."""
+        if not os.getenv("SERPER_API_KEY"):
+            return []
+        return await self.lookup("web", "serper", 1, query, _fetch_serper_web, empty=[])
+
+    async def images(self, query):
+        """Top 10 image URLs via Serper."""
+        if not os.getenv("SERPER_API_KEY"):
+            return []
+        return await self.lookup("images", "serper", 1, query, _fetch_serper_images, empty=[])
+
+    async def youtube_videos(self, query, max_results=1):
+        if not os.getenv("YOUTUBE_API_KEY"):
+            return []
+        return await self.lookup("yt_videos", "youtube", 100, query, _fetch_youtube_videos, max_results, empty=[])
+
+    async def youtube_channel(self, channel_name):
+        if not os.getenv("YOUTUBE_API_KEY"):
+            logger.warning("No YOUTUBE_API_KEY found in environment.")
+            return None
+        return await self.lookup("yt_channel", "youtube", 101, channel_name, _fetch_youtube_channel)
+
+    def stats(self):
+        providers = {}
+        for name, s in self.provider_stats.items():
+            providers[name] = {**s, "avg_ms": round(s["total_ms"] / s["calls"], 1) if s["calls"] else 0.0, **self.lanes[name].stats()}
+        return {"cache": self.memory.stats(), "db_hits": self.db_hits, "coalesced": self.flights.coalesced, "providers": providers}
+
+# --- Provider fetchers (raise on failure, return an empty value when there is nothing to find) ---
+async def _fetch_serper_web(session, query):
+    headers = {'X-API-KEY': os.getenv("SERPER_API_KEY"), 'Content-Type': 'application/json'}
+    async with session.post(f"{SERPER_BASE_URL}/search", headers=headers, data=json.dumps({"q": query, "num": 5})) as response:
+        if response.status != 200:
+            raise UpstreamError(PROVIDERS["serper"]["host"], response.status)
+        res_data = await response.json()
+        return res_data.get('organic', [])[:5]
+
+async def _fetch_serper_images(session, query):
+    headers = {'X-API-KEY': os.getenv("SERPER_API_KEY"), 'Content-Type': 'application/json'}
+    async with session.post(f"{SERPER_BASE_URL}/images", headers=headers, data=json.dumps({"q": query})) as response:
+        if response.status != 200:
+            raise UpstreamError(PROVIDERS["serper"]["host"], response.status)
+        res_data = await response.json()
+        return [img.get('imageUrl') for img in res_data.get('images', [])[:10] if img.get('imageUrl')]
+
+async def _fetch_youtube_videos(session, query, max_results):
+    params = {'part': 'snippet', 'q': query, 'type': 'video', 'maxResults': max_results, 'key': os.getenv("YOUTUBE_API_KEY")}
+    async with session.get(f"{YOUTUBE_API_BASE}/search", params=params) as response:
+        if response.status != 200:
+            raise UpstreamError(PROVIDERS["youtube"]["host"], response.status)
+        data = await response.json()
+        return [{
+            'title': item['snippet']['title'],
+            'link': f"https://www.youtube.com/watch?v={item['id']['videoId']}",
+            'thumbnail': item['snippet']['thumbnails']['high']['url']
+        } for item in data.get('items', [])]
+
+async def _fetch_youtube_channel(session, channel_name):
+    api_key = os.getenv("YOUTUBE_API_KEY")
+    # 1. Search for the channel to get its ID
+    search_params = {'part': 'snippet', 'q': channel_name, 'type': 'channel', 'maxResults': 1, 'key': api_key}
+    async with session.get(f"{YOUTUBE_API_BASE}/search", params=search_params) as response:
+        if response.status != 200:
+            raise UpstreamError(PROVIDERS["youtube"]["host"], response.status)
+        items = (await response.json()).get('items', [])
+    if not items:
+        return None
+    channel_id = items[0]['id']['channelId']
+
+    # 2. Get detailed stats for this channel ID
+    stats_params = {'part': 'statistics,snippet', 'id': channel_id, 'key': api_key}
+    async with session.get(f"{YOUTUBE_API_BASE}/channels", params=stats_params) as response:
+        if response.status != 200:
+            raise UpstreamError(PROVIDERS["youtube"]["host"], response.status)
+        stats_data = await response.json()
+    if not stats_data.get('items'):
+        return None
+
+    full_data = stats_data['items'][0]
+    stats = full_data['statistics']
+    snippet = full_data['snippet']
+    return {
+        'name': snippet['title'],
+        'custom_url': snippet.get('customUrl', 'N/A'),
+        'pfp': snippet['thumbnails']['high']['url'],
+        'subs': stats.get('subscriberCount', '0'),
+        'views': stats.get('viewCount', '0'),
+        'videos': stats.get('videoCount', '0'),
+        'description': snippet.get('description', '')[:200] + "...",
+        'id': channel_id
+    }
+
+search_service = SearchService()
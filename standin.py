@@ -0,0 +1,254 @@
+"""
+Record/replay stand-in for the bot's upstream APIs (Groq, Gemini, Serper, YouTube, Discord REST).
+
+    # 1. Record real traffic (needs network + keys), proxying through the stand-in
+    python standin.py record --port 8765 --cassettes cassettes/
+
+    # 2. Replay offline with latency/error profiles
+    python standin.py replay --port 8765 --cassettes cassettes/ \
+        --latency groq=lognormal:450,1800 --latency gemini=lognormal:2500,9000 --errors gemini=0.02
+
+Point the bot at it with the env vars printed on startup (GROQ_BASE_URL, GEMINI_BASE_URL, ...).
+Requests with no recording get a canned response of the right shape, so replay also works with
+an empty cassette directory.
+"""
+import os
+import re
+import sys
+import json
+import math
+import time
+import base64
+import random
+import hashlib
+import asyncio
+import logging
+import argparse
+from collections import defaultdict
+from urllib.parse import urlencode, parse_qsl
+import aiohttp
+from aiohttp import web
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger('prime_standin')
+
+# Path prefix on the stand-in -> real upstream, and the env var that points the code at it
+UPSTREAMS = {
+    "groq": ("https://api.groq.com", "GROQ_BASE_URL", "/openai/v1"),
+    "gemini": ("https://generativelanguage.googleapis.com", "GEMINI_BASE_URL", "/"),
+    "serper": ("https://google.serper.dev", "SERPER_BASE_URL", ""),
+    "youtube": ("https://www.googleapis.com", "YOUTUBE_API_BASE", "/youtube/v3"),
+    "discord": ("https://discord.com", "DISCORD_API_BASE", "/api"),
+}
+SECRET_PARAMS = {"key", "api_key", "client_secret", "code"}
+SNOWFLAKE_RE = re.compile(r"/\d{15,21}(?=/|$)")
+
+def body_hash(raw):
+    return hashlib.sha1(raw or b"").hexdigest()[:16]
+
+def clean_query(query_string):
+    pairs = [(k, v) for k, v in parse_qsl(query_string, keep_blank_values=True) if k not in SECRET_PARAMS]
+    return urlencode(sorted(pairs))
+
+def path_template(path):
+    """Collapse Discord snowflakes so /guilds/123.../roles matches any guild."""
+    return SNOWFLAKE_RE.sub("/{id}", path)
+
+# --- LATENCY / ERROR PROFILES ---
+class Profile:
+    """Latency distribution and error rate for one upstream."""
+    def __init__(self, latency="recorded", error_rate=0.0, error_status=503):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def sample_latency(self, recorded_ms=None):
+        kind, _, args = self.latency.partition(":")
+        values = [float(v) for v in args.split(",") if v]
+        if kind == "fixed":
+            return values[0] / 1000
+        if kind == "uniform":
+            return random.uniform(values[0], values[1]) / 1000
+        if kind == "lognormal":
+            # median and p95 in ms; sigma follows from p95 = median * e^(1.645 * sigma)
+            median, p95 = values
+            sigma = max(1e-6, math.log(p95 / median) / 1.645)
+            return random.lognormvariate(math.log(median), sigma) / 1000
+        return (recorded_ms or 0) / 1000
+
+    def should_fail(self):
+        return self.error_rate > 0 and random.random() < self.error_rate
+
+# --- CASSETTES ---
+class Cassettes:
+    """JSONL recordings, one file per upstream."""
+    def __init__(self, directory):
+        self.directory = directory
+        self.exact = {}
+        self.by_template = defaultdict(list)
+        os.makedirs(directory, exist_ok=True)
+        for name in UPSTREAMS:
+            path = os.path.join(directory, f"{name}.jsonl")
+            if not os.path.exists(path):
+                continue
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._index(json.loads(line))
+        logger.info(f"📼 Loaded {len(self.exact)} recorded exchanges from {directory}")
+
+    def _index(self, entry):
+        self.exact[(entry["upstream"], entry["method"], entry["path"], entry["query"], entry["body_hash"])] = entry
+        self.by_template[(entry["upstream"], entry["method"], path_template(entry["path"]))].append(entry)
+
+    def find(self, upstream, method, path, query, digest):
+        entry = self.exact.get((upstream, method, path, query, digest))
+        if entry:
+            return entry, "exact"
+        candidates = self.by_template.get((upstream, method, path_template(path)))
+        if candidates:
+            return random.choice(candidates), "template"
+        return None, "synthetic"
+
+    def append(self, entry):
+        self._index(entry)
+        with open(os.path.join(self.directory, f"{entry['upstream']}.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+# --- SYNTHETIC RESPONSES ---
+def synthetic_response(upstream, method, path, raw_body):
+    """A plausible response shape for requests that were never recorded."""
+    try:
+        body = json.loads(raw_body) if raw_body else {}
+    except ValueError:
+        body = {}
+    text = "(stand-in) Here's a quick answer. What's next?"
+    if upstream == "groq":
+        return 200, {"choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}]}
+    if upstream == "gemini":
+        config = body.get("generationConfig") or body.get("generation_config") or {}
+        if (config.get("responseMimeType") or config.get("response_mime_type")) == "application/json":
+            text = "{}"
+        return 200, {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}, "finishReason": "STOP", "index": 0}]}
+    if upstream == "serper":
+        if path.endswith("/images"):
+            return 200, {"images": [{"title": "stand-in", "imageUrl": "https://example.com/standin.png"}]}
+        return 200, {"organic": [{"title": "Stand-in result", "link": "https://example.com", "snippet": "Recorded offline."}]}
+    if upstream == "youtube":
+        return 200, {"items": []}
+    if upstream == "discord":
+        return (200, []) if method == "GET" else (200, {"id": "100000000000000000"})
+    return 404, {"error": "unknown upstream"}
+
+# --- SERVER ---
+class StandIn:
+    def __init__(self, mode, cassettes, profiles):
+        self.mode = mode
+        self.cassettes = cassettes
+        self.profiles = profiles
+        self.session = None
+        self.counts = defaultdict(int)
+
+    async def handle(self, request):
+        upstream, _, rest = request.match_info["tail"].partition("/")
+        if upstream == "_stats":
+            return web.json_response(dict(self.counts))
+        if upstream not in UPSTREAMS:
+            return web.json_response({"error": f"unknown upstream '{upstream}'"}, status=404)
+        path = "/" + rest
+        raw = await request.read()
+        if self.mode == "record":
+            return await self.record(request, upstream, path, raw)
+        return await self.replay(request, upstream, path, raw)
+
+    async def record(self, request, upstream, path, raw):
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=120))
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in ("host", "content-length", "accept-encoding")}
+        url = UPSTREAMS[upstream][0] + path + (f"?{request.query_string}" if request.query_string else "")
+        started = time.perf_counter()
+        async with self.session.request(request.method, url, headers=headers, data=raw or None) as resp:
+            payload = await resp.read()
+            content_type = resp.headers.get("Content-Type", "application/json")
+            status = resp.status
+        latency_ms = (time.perf_counter() - started) * 1000
+        is_text = content_type.startswith(("application/json", "text/"))
+        self.cassettes.append({
+            "upstream": upstream,
+            "method": request.method,
+            "path": path,
+            "query": clean_query(request.query_string),
+            "body_hash": body_hash(raw),
+            "status": status,
+            "content_type": content_type,
+            "body": payload.decode("utf-8", "replace") if is_text else None,
+            "body_b64": None if is_text else base64.b64encode(payload).decode(),
+            "latency_ms": round(latency_ms, 1),
+            "recorded_at": time.time(),
+        })
+        self.counts[f"{upstream}:recorded"] += 1
+        logger.info(f"⏺️ {upstream} {request.method} {path} -> {status} ({latency_ms:.0f}ms)")
+        return web.Response(body=payload, status=status, content_type=content_type.split(";")[0])
+
+    async def replay(self, request, upstream, path, raw):
+        profile = self.profiles[upstream]
+        entry, match = self.cassettes.find(upstream, request.method, path, clean_query(request.query_string), body_hash(raw))
+        self.counts[f"{upstream}:{match}"] += 1
+        await asyncio.sleep(profile.sample_latency(entry.get("latency_ms") if entry else None))
+
+        if profile.should_fail():
+            self.counts[f"{upstream}:injected_error"] += 1
+            return web.json_response({"error": {"code": profile.error_status, "message": "stand-in injected error"}}, status=profile.error_status)
+        if entry is None:
+            status, payload = synthetic_response(upstream, request.method, path, raw)
+            return web.json_response(payload, status=status)
+        body = entry["body"].encode("utf-8") if entry.get("body") is not None else base64.b64decode(entry.get("body_b64") or "")
+        return web.Response(body=body, status=entry["status"], content_type=entry["content_type"].split(";")[0])
+
+    async def close(self, _app):
+        if self.session:
+            await self.session.close()
+
+def parse_profiles(latencies, errors):
+    """--latency NAME=SPEC and --errors NAME=RATE[:STATUS]; NAME '*' sets the default for every upstream."""
+    latency = dict(spec.partition("=")[::2] for spec in latencies or [])
+    failure = {}
+    for spec in errors or []:
+        name, _, rate = spec.partition("=")
+        rate, _, status = rate.partition(":")
+        failure[name] = (float(rate), int(status or 503))
+
+    default_latency = latency.get("*", "recorded")
+    default_failure = failure.get("*", (0.0, 503))
+    profiles = {}
+    for name in ["*", *UPSTREAMS]:
+        rate, status = failure.get(name, default_failure)
+        profiles[name] = Profile(latency.get(name, default_latency), rate, status)
+    return profiles
+
+def main():
+    parser = argparse.ArgumentParser(description="Record/replay stand-in for upstream APIs.")
+    parser.add_argument("mode", choices=["record", "replay"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cassettes", default="cassettes")
+    parser.add_argument("--latency", action="append", help="NAME=fixed:MS | uniform:MIN,MAX | lognormal:MEDIAN,P95 | recorded")
+    parser.add_argument("--errors", action="append", help="NAME=RATE[:STATUS], e.g. gemini=0.05:429")
+    args = parser.parse_args()
+
+    standin = StandIn(args.mode, Cassettes(args.cassettes), parse_profiles(args.latency, args.errors))
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_route("*", "/{tail:.*}", standin.handle)
+    app.on_cleanup.append(standin.close)
+
+    base = f"http://{args.host}:{args.port}"
+    print("\nPoint the bot / dashboard at the stand-in with:")
+    for name, (_, env_var, suffix) in UPSTREAMS.items():
+        print(f"  {env_var}={base}/{name}{suffix}")
+    print(f"Replay match counts: {base}/_stats\n")
+    web.run_app(app, host=args.host, port=args.port, print=None)
+
+if __name__ == "__main__":
+    if sys.platform == 'win32':
+        sys.stdout.reconfigure(encoding='utf-8')
+    main()
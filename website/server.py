@@ -1,5 +1,5 @@
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.responses import RedirectResponse, JSONResponse, FileResponse
+from fastapi.responses import RedirectResponse, JSONResponse, FileResponse, PlainTextResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 import httpx
@@ -17,7 +17,10 @@ BASE_DIR = Path(__file__).parent
 sys.path.append(str(BASE_DIR.parent))
 
 from database import db_manager
+from config import DISCORD_API_BASE
 import brain
+import metrics
+from breakers import breakers
 
 load_dotenv()
 
@@ -84,17 +87,23 @@ app.add_middleware(
 async def update_bot_guilds():
     """Fetch all guilds the bot is currently in."""
     global BOT_GUILDS
+    breaker = breakers.for_url(DISCORD_API_BASE)
+    if not breaker.allow():
+        return # Keep the last known list instead of stalling /api/me
     try:
         async with httpx.AsyncClient() as client:
             res = await client.get(
-                "https://discord.com/api/v10/users/@me/guilds",
-                headers={"Authorization": f"Bot {BOT_TOKEN}"}
+                f"{DISCORD_API_BASE}/v10/users/@me/guilds",
+                headers={"Authorization": f"Bot {BOT_TOKEN}"},
+                timeout=10.0
             )
+            breaker.record(res.status_code < 500 and res.status_code != 429)
             if res.status_code == 200:
                 guilds = res.json()
                 BOT_GUILDS = {str(g["id"]) for g in guilds}
                 logger.info(f"Bot is in {len(BOT_GUILDS)} servers.")
     except Exception as e:
+        breaker.record_failure()
         logger.error(f"Failed to fetch bot guilds: {e}")
 
 @app.on_event("startup")
@@ -116,7 +125,7 @@ async def callback(code: str = None):
     if not code: return RedirectResponse(url="/dashboard/index.html?error=no_code")
     
     async with httpx.AsyncClient() as client:
-        token_res = await client.post("https://discord.com/api/oauth2/token", data={
+        token_res = await client.post(f"{DISCORD_API_BASE}/oauth2/token", data={
             "client_id": CLIENT_ID, "client_secret": CLIENT_SECRET,
             "grant_type": "authorization_code", "code": code, "redirect_uri": REDIRECT_URI
         })
@@ -125,8 +134,8 @@ async def callback(code: str = None):
         token_data = token_res.json()
         access_token = token_data["access_token"]
         
-        user_res = await client.get("https://discord.com/api/users/@me", headers={"Authorization": f"Bearer {access_token}"})
-        guilds_res = await client.get("https://discord.com/api/users/@me/guilds", headers={"Authorization": f"Bearer {access_token}"})
+        user_res = await client.get(f"{DISCORD_API_BASE}/users/@me", headers={"Authorization": f"Bearer {access_token}"})
+        guilds_res = await client.get(f"{DISCORD_API_BASE}/users/@me/guilds", headers={"Authorization": f"Bearer {access_token}"})
         
         user_info = user_res.json()
         guilds = guilds_res.json()
@@ -206,7 +215,7 @@ async def get_roles(guild_id: str, request: Request):
     token = request.headers.get("X-Session-Token")
     if not token or token not in SESSIONS: raise HTTPException(status_code=401)
     async with httpx.AsyncClient() as client:
-        res = await client.get(f"https://discord.com/api/v10/guilds/{guild_id}/roles", headers={"Authorization": f"Bot {BOT_TOKEN}"})
+        res = await client.get(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/roles", headers={"Authorization": f"Bot {BOT_TOKEN}"})
         if res.status_code == 200: return res.json()
     return []
 
@@ -215,7 +224,7 @@ async def get_channels(guild_id: str, request: Request):
     token = request.headers.get("X-Session-Token")
     if not token or token not in SESSIONS: raise HTTPException(status_code=401)
     async with httpx.AsyncClient() as client:
-        res = await client.get(f"https://discord.com/api/v10/guilds/{guild_id}/channels", headers={"Authorization": f"Bot {BOT_TOKEN}"})
+        res = await client.get(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/channels", headers={"Authorization": f"Bot {BOT_TOKEN}"})
         if res.status_code == 200: return res.json()
     return []
 
@@ -230,9 +239,9 @@ async def ai_suggest_config(guild_id: str, request: Request):
     # Fetch context: Channels and Roles
     async with httpx.AsyncClient() as client:
         # Get roles
-        r_res = await client.get(f"https://discord.com/api/v10/guilds/{guild_id}/roles", headers={"Authorization": f"Bot {BOT_TOKEN}"})
+        r_res = await client.get(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/roles", headers={"Authorization": f"Bot {BOT_TOKEN}"})
         # Get channels
-        c_res = await client.get(f"https://discord.com/api/v10/guilds/{guild_id}/channels", headers={"Authorization": f"Bot {BOT_TOKEN}"})
+        c_res = await client.get(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/channels", headers={"Authorization": f"Bot {BOT_TOKEN}"})
         
         roles = r_res.json() if r_res.status_code == 200 else []
         channels = c_res.json() if c_res.status_code == 200 else []
@@ -292,7 +301,7 @@ async def apply_suggestions(guild_id: str, request: Request):
                     color_int = int(hex_color, 16)
                     # PATCH role color
                     await client.patch(
-                        f"https://discord.com/api/v10/guilds/{guild_id}/roles/{role_id}",
+                        f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/roles/{role_id}",
                         headers={"Authorization": f"Bot {BOT_TOKEN}"},
                         json={"color": color_int}
                     )
@@ -372,14 +381,14 @@ async def ai_execute(guild_id: str, request: Request):
             action = task.get("action")
             name = task.get("name")
             if action == "create_category":
-                res = await client.post(f"https://discord.com/api/v10/guilds/{guild_id}/channels", headers=headers, json={"name": name, "type": 4})
+                res = await client.post(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/channels", headers=headers, json={"name": name, "type": 4})
                 if res.status_code == 201: categories[name] = res.json()["id"]; results.append(f"Created category: {name}")
             elif action == "create_channel":
                 c_type = 0 if task.get("type") == "text" else 2
                 payload = {"name": name, "type": c_type}
                 cat_name = task.get("category"); 
                 if cat_name in categories: payload["parent_id"] = categories[cat_name]
-                res = await client.post(f"https://discord.com/api/v10/guilds/{guild_id}/channels", headers=headers, json=payload)
+                res = await client.post(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/channels", headers=headers, json=payload)
                 if res.status_code == 201: results.append(f"Created channel: {name}")
             elif action == "create_role":
                 name = task.get("name")
@@ -387,7 +396,7 @@ async def ai_execute(guild_id: str, request: Request):
                 full_name = f"{icon} {name}".strip() if icon else name
                 color_hex = task.get("color", "0").replace("#", "")
                 color_int = int(color_hex, 16) if color_hex != "0" else 0
-                res = await client.post(f"https://discord.com/api/v10/guilds/{guild_id}/roles", headers=headers, json={"name": full_name, "color": color_int})
+                res = await client.post(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/roles", headers=headers, json={"name": full_name, "color": color_int})
                 if res.status_code in [200, 201]: results.append(f"Created role: {full_name}")
     return {"status": "success", "results": results}
 
@@ -432,7 +441,7 @@ async def trigger_action(guild_id: str, request: Request, token: str = None):
                     }]
                 }]
             }
-            res = await client.post(f"https://discord.com/api/v10/channels/{chan_id}/messages", 
+            res = await client.post(f"{DISCORD_API_BASE}/v10/channels/{chan_id}/messages", 
                                    headers={"Authorization": f"Bot {BOT_TOKEN}"}, json=payload)
             return {"status": "success", "message": "DONE!"} if res.status_code == 200 else {"status": "failed"}
 
@@ -442,7 +451,7 @@ async def trigger_action(guild_id: str, request: Request, token: str = None):
             
             async with httpx.AsyncClient() as client:
                 # Fetch REAL roles from Discord to make it dynamic
-                r_res = await client.get(f"https://discord.com/api/v10/guilds/{guild_id}/roles", headers={"Authorization": f"Bot {BOT_TOKEN}"})
+                r_res = await client.get(f"{DISCORD_API_BASE}/v10/guilds/{guild_id}/roles", headers={"Authorization": f"Bot {BOT_TOKEN}"})
                 if r_res.status_code != 200: return {"error": "Failed to fetch guild roles"}
                 
                 all_roles = r_res.json()
@@ -473,7 +482,7 @@ async def trigger_action(guild_id: str, request: Request, token: str = None):
                         }
                     ]
                 }
-                res = await client.post(f"https://discord.com/api/v10/channels/{chan_id}/messages", 
+                res = await client.post(f"{DISCORD_API_BASE}/v10/channels/{chan_id}/messages", 
                                        headers={"Authorization": f"Bot {BOT_TOKEN}"}, json=payload)
                 return {"status": "success", "message": "DONE!"} if res.status_code == 200 else {"status": "failed"}
 
@@ -490,6 +499,13 @@ async def get_invite(guild_id: str = None):
         base_url += f"&guild_id={guild_id}&disable_guild_select=true"
     return {"url": base_url}
 
+@app.get("/metrics")
+async def get_metrics(request: Request):
+    """Prometheus metrics for this process (upstream circuit breakers). Needs METRICS_TOKEN, or a local scraper."""
+    if not metrics.authorized(request.headers.get("authorization"), request.client.host if request.client else None):
+        raise HTTPException(status_code=401)
+    return PlainTextResponse(metrics.render())
+
 app.mount("/dashboard", StaticFiles(directory=BASE_DIR / "dashboard"), name="dashboard")
 @app.get("/{path:path}")
 async def catch_all(path: str):